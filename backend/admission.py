@@ -0,0 +1,226 @@
+# admission.py
+# Admission control: who gets a worker thread when the API is saturated.
+#
+# Every sync endpoint runs in the same threadpool (ADMISSION_CAPACITY ~ its 40 threads).
+# During an event, citizen uploads and refresh triggers used to queue up next to officials
+# reading /hotspots and /reports until everything timed out. Here, before a request takes
+# a thread (middleware, on the event loop):
+#   - priority from the token's role: ADMIN/OFFICIAL high, ANALYST normal, CITIZEN/anonymous low
+#   - endpoint class from method + path (read / write / auth / bulk / refresh), each with its
+#     own concurrency limit
+#   - low priority may only use part of the pool (ADMISSION_SHARE_LOW); past that, or when
+#     its class is full, it gets 503 + Retry-After immediately instead of waiting
+#   - high/normal requests wait up to ADMISSION_WAIT_* seconds for a slot, then 503
+# Slots are counted per worker process. SingleFlight keeps at most one /social/refresh
+# fetch running at a time, across the uvicorn workers of a host too: a run holds a flock
+# on SINGLE_FLIGHT_LOCK_DIR/.<name>.lock, which the OS drops if the worker dies.
+# Decisions are counted in stats() (/admin/admission).
+import os, time, asyncio, threading
+try:
+    import fcntl   # cross-process lock; not available on Windows (in-process only there)
+except ImportError:
+    fcntl = None
+
+CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "40"))
+LIMITS = {
+    "read": int(os.getenv("ADMISSION_LIMIT_READ", "32")),
+    "write": int(os.getenv("ADMISSION_LIMIT_WRITE", "12")),       # report uploads, ingest
+    "auth": int(os.getenv("ADMISSION_LIMIT_AUTH", "6")),          # bcrypt is CPU heavy
+    "bulk": int(os.getenv("ADMISSION_LIMIT_BULK", "2")),          # exports, archiving
+    "refresh": int(os.getenv("ADMISSION_LIMIT_REFRESH", "1")),
+}
+PRIORITIES = ("high", "normal", "low")
+ROLE_PRIORITY = {"ADMIN": "high", "OFFICIAL": "high", "ANALYST": "normal", "CITIZEN": "low"}
+SHARE = {   # fraction of CAPACITY a priority may fill
+    "high": 1.0,
+    "normal": float(os.getenv("ADMISSION_SHARE_NORMAL", "0.8")),
+    "low": float(os.getenv("ADMISSION_SHARE_LOW", "0.5")),
+}
+WAIT = {    # seconds to wait for a slot before shedding
+    "high": float(os.getenv("ADMISSION_WAIT_HIGH", "10")),
+    "normal": float(os.getenv("ADMISSION_WAIT_NORMAL", "2")),
+    "low": 0.0,
+}
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+STALE_SECONDS = float(os.getenv("SINGLE_FLIGHT_STALE_SECONDS", "900"))   # a run older than this is presumed dead
+LOCK_DIR = os.getenv("SINGLE_FLIGHT_LOCK_DIR", ".")   # shared by the workers; empty = per-process only
+# (method or None, path prefix, class); first match wins, else GET -> read, others -> write
+ROUTES = (
+    ("POST", "/social/refresh", "refresh"),
+    ("POST", "/auth/", "auth"),
+    (None, "/export/", "bulk"),
+    ("POST", "/admin/partitions/archive", "bulk"),
+)
+
+
+def endpoint_class(method: str, path: str) -> str:
+    for m, prefix, cls in ROUTES:
+        if (m is None or m == method) and path.startswith(prefix):
+            return cls
+    return "read" if method in ("GET", "HEAD", "OPTIONS") else "write"
+
+
+# ================== Admission ==================
+class Admission:
+    def __init__(self, capacity: int = CAPACITY, limits: dict = LIMITS):
+        self.capacity = capacity
+        self.limits = dict(limits)
+        self.inflight = {cls: 0 for cls in self.limits}
+        self.total = 0
+        self._cond = None   # asyncio.Condition, created on the serving loop
+        self.counts = {cls: {p: {"admitted": 0, "waited": 0, "shed": 0} for p in PRIORITIES} for cls in self.limits}
+        self.max_wait_ms = {p: 0.0 for p in PRIORITIES}
+
+    def _fits(self, cls: str, priority: str) -> bool:
+        return (self.inflight[cls] < self.limits[cls]
+                and self.total < max(1, int(self.capacity * SHARE[priority])))
+
+    async def acquire(self, cls: str, priority: str) -> bool:
+        """True once a slot is taken; False = shed (no slot within WAIT[priority])."""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        counts = self.counts[cls][priority]
+        if not self._fits(cls, priority):
+            if WAIT[priority] <= 0:
+                counts["shed"] += 1
+                return False
+            t0 = time.monotonic()
+            async with self._cond:
+                try:
+                    await asyncio.wait_for(self._cond.wait_for(lambda: self._fits(cls, priority)), WAIT[priority])
+                except asyncio.TimeoutError:
+                    counts["shed"] += 1
+                    return False
+            waited = (time.monotonic() - t0) * 1000
+            self.max_wait_ms[priority] = max(self.max_wait_ms[priority], waited)
+            counts["waited"] += 1
+        # single event loop: nothing runs between the check above and these increments
+        counts["admitted"] += 1
+        self.inflight[cls] += 1
+        self.total += 1
+        return True
+
+    async def release(self, cls: str):
+        self.inflight[cls] -= 1
+        self.total -= 1
+        async with self._cond:
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.total,
+            "classes": {cls: {"limit": self.limits[cls], "in_flight": self.inflight[cls], **self.counts[cls]}
+                        for cls in self.limits},
+            "max_wait_ms": {p: round(v, 1) for p, v in self.max_wait_ms.items()},
+            "single_flight": {name: f.stats() for name, f in flights.items()},
+        }
+
+
+admission = Admission()
+
+
+async def _release_after(body, cls):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        await admission.release(cls)
+
+
+async def handle(request, call_next, role_of):
+    """Middleware body: role_of(request) -> role or None (no DB access, runs on the loop)."""
+    cls = endpoint_class(request.method, request.url.path)
+    role = role_of(request)
+    # logins carry no token yet; an official logging in during an event must not be shed as "low"
+    priority = ROLE_PRIORITY.get(role, "normal" if cls == "auth" else "low")
+    if not await admission.acquire(cls, priority):
+        from starlette.responses import JSONResponse
+        return JSONResponse(status_code=503, headers={"Retry-After": str(RETRY_AFTER)},
+                            content={"detail": f"Server busy ({cls}), retry in {RETRY_AFTER}s", "priority": priority})
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await admission.release(cls)
+        raise
+    # streamed bodies (exports) keep their slot until the last chunk is sent
+    response.body_iterator = _release_after(response.body_iterator, cls)
+    return response
+
+
+# ================== Single flight ==================
+class SingleFlight:
+    """At most one run of a job at a time; callers arriving meanwhile just get told it is running.
+
+    try_start() returns a token for finish(). A run that never finishes (its background task
+    was never scheduled, the worker died) is treated as stale after `stale_seconds` and
+    the next caller takes over; the abandoned run's late finish() is then ignored.
+    With `lock_dir`, a run also holds a flock there, so other processes dedupe against it."""
+
+    def __init__(self, name: str, stale_seconds: float = STALE_SECONDS, lock_dir: str = None):
+        self.name = name
+        self.stale_seconds = stale_seconds
+        self.lock_path = os.path.join(lock_dir, f".{name}.lock") if lock_dir and fcntl else None
+        self._fd = None   # lock file held while a run is in progress
+        self._lock = threading.Lock()
+        self._token = 0
+        self.started_at = None
+        self.runs = 0
+        self.deduped = 0
+        self.stale = 0
+        self.last_result = None
+        self.last_finished_at = None
+
+    def try_start(self):
+        """Token for finish(), or None if a (non-stale) run is in progress."""
+        with self._lock:
+            if self.started_at is not None:
+                if time.time() - self.started_at < self.stale_seconds:
+                    self.deduped += 1
+                    return None
+                self.stale += 1   # the abandoned run's file lock is ours already
+            elif not self._lock_file():
+                self.deduped += 1   # running in another worker process
+                return None
+            self._token += 1
+            self.started_at = time.time()
+            self.runs += 1
+            return self._token
+
+    def finish(self, token, result=None):
+        with self._lock:
+            if token != self._token:
+                return   # superseded after going stale
+            self.last_result = result
+            self.last_finished_at = time.time()
+            self.started_at = None
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+
+    def _lock_file(self) -> bool:
+        if self.lock_path is None:
+            return True
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def stats(self) -> dict:
+        return {"running": self.started_at is not None, "started_at": self.started_at, "runs": self.runs,
+                "deduped": self.deduped, "stale": self.stale, "last_result": self.last_result,
+                "last_finished_at": self.last_finished_at}
+
+
+flights = {}
+
+
+def single_flight(name: str) -> SingleFlight:
+    if name not in flights:
+        flights[name] = SingleFlight(name, lock_dir=LOCK_DIR)
+    return flights[name]
@@ -0,0 +1,294 @@
+# analytics_cube.py
+# Pre-aggregated rollup cube for analyst dashboards:
+#   count of reports + posts per (hazard, source, urgency, hour, grid cell)
+#
+# Analysts used to pull /reports and /social/list into pandas just to group and count.
+# The cube keeps one row per distinct combination (far fewer than raw rows) in NumPy
+# columns, is filled once from coastal.db + archived partitions and then only folds in
+# rows with a new id, so a group-by is a mask + np.unique + bincount over the cube.
+# Every CUBE_RELOAD_SECONDS it is rebuilt in the background (incremental.py), so rows
+# changed in place (update_urgency.py) reach the urgency dimension.
+#
+#   cube.query(group_by=["hazard", "day"], filters={"source": ["Twitter"]}, since="2025-09-01")
+import os, math, threading, time
+from datetime import datetime, timezone
+import numpy as np
+
+from incremental import IncrementalLoader
+
+CELL_DEG = float(os.getenv("CUBE_CELL_DEG", "0.5"))
+REFRESH_SECONDS = 5.0
+RELOAD_SECONDS = float(os.getenv("CUBE_RELOAD_SECONDS", "900"))   # 0 = never reload
+DIMENSIONS = ("hazard", "source", "urgency", "hour", "day", "cell")
+_TEXT_DIMS = ("hazard", "source", "urgency")
+_NO_CELL = np.iinfo(np.int32).min   # rows without coordinates
+_NO_HOUR = -1                        # rows without a parsable timestamp
+# (table, hazard column, source expression)
+_TABLES = (("reports", "hazard_type", "'Citizen'"), ("social_media", "hazard", "source"))
+
+
+class _Codes:
+    """String <-> small int dictionary for one dimension."""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def encode(self, values) -> np.ndarray:
+        # dictionary lookups only for the distinct values of the batch
+        uniq, inv = np.unique(np.array(["Unknown" if v is None else str(v) for v in values]), return_inverse=True)
+        codes = np.empty(len(uniq), dtype=np.int32)
+        for i, v in enumerate(uniq.tolist()):
+            code = self.index.get(v)
+            if code is None:
+                code = self.index[v] = len(self.values)
+                self.values.append(v)
+            codes[i] = code
+        return codes[inv.ravel()]
+
+
+def _dense(p: np.ndarray):
+    """(codes 0..card-1, card) for one int column."""
+    lo, hi = int(p.min()), int(p.max())
+    if hi - lo < 4 * len(p) + 1024:
+        return p.astype(np.int64) - lo, hi - lo + 1   # small range: offset is dense enough
+    uniq, inv = np.unique(p, return_inverse=True)       # e.g. _NO_CELL next to real cells
+    return inv.ravel().astype(np.int64), len(uniq)
+
+
+def _group(parts):
+    """Group ids for rows of several int columns: (first row of each group, inverse)."""
+    # mixed-radix pack of dense codes into one int64, so grouping is a 1-D unique instead of
+    # unique(axis=0); the key is re-densified whenever the next column could overflow it
+    key, card = np.zeros(len(parts[0]), dtype=np.int64), 1
+    for p in parts:
+        codes, c = _dense(p)
+        if card * c >= 1 << 62:
+            uniq, key = np.unique(key, return_inverse=True)
+            key, card = key.ravel().astype(np.int64), len(uniq)
+        key = key * c + codes
+        card *= c
+    _, first, inv = np.unique(key, return_index=True, return_inverse=True)
+    return first, inv.ravel()
+
+
+def _hour(ts: str) -> int:
+    """'2025-09-14' / '2025-09-14T10:00' -> hours since epoch (UTC)."""
+    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() // 3600)
+
+
+class RollupCube:
+    # everything a full reload replaces
+    _STATE = ("codes", "size", "cols", "_rows")
+
+    def __init__(self, cell_deg: float = CELL_DEG, capacity: int = 1024, reload_seconds: float = RELOAD_SECONDS):
+        self.cell_deg = cell_deg
+        self.reload_seconds = reload_seconds
+        self.codes = {d: _Codes() for d in _TEXT_DIMS}
+        self.size = 0
+        self.cols = {
+            "hazard": np.empty(capacity, dtype=np.int32),
+            "source": np.empty(capacity, dtype=np.int32),
+            "urgency": np.empty(capacity, dtype=np.int32),
+            "hour": np.empty(capacity, dtype=np.int64),
+            "cell_lat": np.empty(capacity, dtype=np.int32),
+            "cell_lon": np.empty(capacity, dtype=np.int32),
+            "count": np.empty(capacity, dtype=np.int64),
+        }
+        self._rows = {}          # (hazard, source, urgency, hour, cell_lat, cell_lon) -> row
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self.loader = IncrementalLoader([t for t, _, _ in _TABLES], reload_seconds, "cube")
+
+    # ---------- ingest ----------
+    def _grow(self, extra: int):
+        need = self.size + extra
+        if need <= len(self.cols["count"]):
+            return
+        cap = max(need, 2 * len(self.cols["count"]))
+        for name, arr in self.cols.items():
+            new = np.empty(cap, dtype=arr.dtype)
+            new[:self.size] = arr[:self.size]
+            self.cols[name] = new
+
+    def add(self, hazards, sources, urgencies, ts, lats, lons) -> int:
+        """Fold a batch of raw rows in (ts = epoch seconds or NaN, lat/lon may be NaN)."""
+        n = len(ts)
+        if n == 0:
+            return 0
+        ts = np.asarray(ts, dtype=np.float64)
+        lat = np.asarray(lats, dtype=np.float64)
+        lon = np.asarray(lons, dtype=np.float64)
+        hour = np.where(np.isfinite(ts), np.floor(np.nan_to_num(ts) / 3600), _NO_HOUR).astype(np.int64)
+        has_cell = np.isfinite(lat) & np.isfinite(lon)
+        clat = np.where(has_cell, np.floor(np.nan_to_num(lat) / self.cell_deg), _NO_CELL).astype(np.int32)
+        clon = np.where(has_cell, np.floor(np.nan_to_num(lon) / self.cell_deg), _NO_CELL).astype(np.int32)
+        with self._lock:
+            parts = [self.codes["hazard"].encode(hazards), self.codes["source"].encode(sources),
+                     self.codes["urgency"].encode(urgencies), hour, clat, clon]
+            # collapse the batch first: the Python loop below runs once per distinct combination
+            first, inv = _group(parts)
+            counts = np.bincount(inv, minlength=len(first))
+            uniq = np.stack([p[first] for p in parts], axis=1).tolist()
+            new_rows = []
+            for key, c in zip(map(tuple, uniq), counts.tolist()):
+                row = self._rows.get(key)
+                if row is None:
+                    new_rows.append((key, c))
+                else:
+                    self.cols["count"][row] += c
+            self._grow(len(new_rows))
+            for key, c in new_rows:
+                row = self.size
+                for name, v in zip(("hazard", "source", "urgency", "hour", "cell_lat", "cell_lon"), key):
+                    self.cols[name][row] = v
+                self.cols["count"][row] = c
+                self._rows[key] = row
+                self.size += 1
+        return n
+
+    # ---------- queries ----------
+    def query(self, group_by=("hazard",), filters: dict = None, since: str = None, until: str = None,
+              bbox=None, top: int = None):
+        """
+        Counts grouped by any of DIMENSIONS.
+        filters: {"hazard"|"source"|"urgency": [values]}; since/until: ISO timestamps (hour
+        resolution); bbox: (min_lat, min_lon, max_lat, max_lon) on cell centres.
+        """
+        for d in group_by:
+            if d not in DIMENSIONS:
+                raise ValueError(f"unknown dimension {d!r}; use {', '.join(DIMENSIONS)}")
+        with self._lock:
+            n = self.size
+            c = {k: v[:n] for k, v in self.cols.items()}
+            mask = np.ones(n, dtype=bool)
+            for dim, values in (filters or {}).items():
+                if dim not in _TEXT_DIMS:
+                    raise ValueError(f"can only filter on {', '.join(_TEXT_DIMS)}")
+                wanted = [self.codes[dim].index[v] for v in values if v in self.codes[dim].index]
+                mask &= np.isin(c[dim], wanted)
+            if since:
+                mask &= c["hour"] >= _hour(since)
+            if until:
+                mask &= (c["hour"] < _hour(until)) & (c["hour"] != _NO_HOUR)
+            if bbox:
+                has_cell = c["cell_lat"] != _NO_CELL
+                lat = (c["cell_lat"] + 0.5) * self.cell_deg
+                lon = (c["cell_lon"] + 0.5) * self.cell_deg
+                mask &= has_cell & (lat >= bbox[0]) & (lat <= bbox[2]) & (lon >= bbox[1]) & (lon <= bbox[3])
+
+            count = c["count"][mask]
+            if not group_by:
+                return [{"count": int(count.sum())}]
+            parts = []
+            for d in group_by:
+                if d == "day":
+                    parts.append(np.where(c["hour"][mask] == _NO_HOUR, _NO_HOUR, c["hour"][mask] // 24))
+                elif d == "cell":
+                    parts += [c["cell_lat"][mask], c["cell_lon"][mask]]
+                else:
+                    parts.append(c[d][mask])
+            if not len(count):
+                return []
+            first, inv = _group(parts)
+            totals = np.bincount(inv, weights=count, minlength=len(first))
+            order = np.argsort(-totals, kind="stable")
+            if top:
+                order = order[:top]
+            return [self._decode(group_by, [int(p[first[i]]) for p in parts], int(totals[i])) for i in order]
+
+    def _decode(self, group_by, key, count):
+        out, k = {}, 0
+        for d in group_by:
+            if d in _TEXT_DIMS:
+                out[d] = self.codes[d].values[key[k]]
+            elif d == "hour":
+                out[d] = None if key[k] == _NO_HOUR else datetime.fromtimestamp(key[k] * 3600, tz=timezone.utc).isoformat()
+            elif d == "day":
+                out[d] = None if key[k] == _NO_HOUR else datetime.fromtimestamp(key[k] * 86400, tz=timezone.utc).date().isoformat()
+            else:   # cell -> centre coordinates
+                if key[k] == _NO_CELL:
+                    out["cell"] = None
+                else:
+                    out["cell"] = [round((key[k] + 0.5) * self.cell_deg, 4), round((key[k + 1] + 0.5) * self.cell_deg, 4)]
+                k += 1
+            k += 1
+        out["count"] = count
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cube_rows": self.size, "raw_rows": int(self.cols["count"][:self.size].sum()),
+                    "cell_deg": self.cell_deg, "last_ids": dict(self.loader.last_ids or {}),
+                    "reloads": self.loader.reloads}
+
+    # ---------- sqlite loader ----------
+    def fold_rows(self, cur, table: str, source: str, where: str, params) -> int:
+        hazard_col, source_expr = next((h, e) for t, h, e in _TABLES if t == table)
+        cur.execute(f"PRAGMA table_info({source})")
+        cols = {r[1] for r in cur.fetchall()}
+        if not cols:
+            return 0
+        urgency = "urgency" if "urgency" in cols else "NULL"
+        cur.execute(f"""
+            SELECT {hazard_col}, {source_expr}, {urgency}, CAST(strftime('%s', timestamp) AS REAL),
+                   CASE WHEN typeof(latitude) IN ('real', 'integer') THEN latitude END,
+                   CASE WHEN typeof(longitude) IN ('real', 'integer') THEN longitude END
+            FROM {source} WHERE {where}
+        """, params)
+        added = 0
+        while True:
+            rows = cur.fetchmany(100_000)
+            if not rows:
+                return added
+            h, s, u, ts, lat, lon = zip(*rows)
+            added += self.add(h, s, u, [math.nan if t is None else t for t in ts],
+                              [math.nan if v is None else v for v in lat], [math.nan if v is None else v for v in lon])
+
+    def empty(self):
+        return RollupCube(self.cell_deg, reload_seconds=self.reload_seconds)
+
+    def swap(self, fresh):
+        with self._lock:
+            for name in self._STATE:
+                setattr(self, name, getattr(fresh, name))
+
+    def refresh_from_db(self, conn) -> int:
+        """First call: every row incl. archived partitions; afterwards rows with a new id, plus
+        a background rebuild every reload_seconds."""
+        return self.loader.refresh(self, conn)
+
+    def refresh(self, get_db, force: bool = False):
+        """refresh_from_db with its own connection, at most every REFRESH_SECONDS unless forced."""
+        now = time.monotonic()
+        if force or self.loader.last_ids is None or now - self._last_refresh >= REFRESH_SECONDS:
+            self._last_refresh = now
+            conn = get_db()
+            try:
+                self.refresh_from_db(conn)
+            finally:
+                conn.close()
+
+
+if __name__ == "__main__":
+    # quick benchmark: python analytics_cube.py [n_rows]
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    hazards = np.array(["Flood", "Cyclone", "Tsunami", "High Wave", "Other"], dtype=object)[rng.integers(0, 5, n)]
+    sources = np.array(["Twitter", "Reddit", "YouTube", "Citizen"], dtype=object)[rng.integers(0, 4, n)]
+    urg = np.array(["High", "Medium", "Low"], dtype=object)[rng.integers(0, 3, n)]
+    ts = time.time() - rng.uniform(0, 90 * 86400, n)
+    centres = rng.uniform([8, 68], [23, 90], size=(40, 2))   # events cluster around a few places
+    pick = rng.integers(0, len(centres), n)
+    lat, lon = centres[pick, 0] + rng.normal(0, 0.3, n), centres[pick, 1] + rng.normal(0, 0.3, n)
+    cube = RollupCube()
+    t0 = time.perf_counter(); cube.add(hazards, sources, urg, ts, lat, lon); t1 = time.perf_counter()
+    print(f"load {n} rows -> {cube.size} cube rows in {(t1 - t0) * 1e3:.0f} ms")
+    for group_by, kw in ((["hazard"], {}), (["hazard", "source", "urgency"], {}), (["day"], {"filters": {"hazard": ["Flood"]}}),
+                         (["cell"], {"since": datetime.fromtimestamp(time.time() - 86400 * 7, tz=timezone.utc).isoformat()})):
+        t0 = time.perf_counter(); res = cube.query(group_by, **kw); dt = time.perf_counter() - t0
+        print(f"group by {'+'.join(group_by):<24} {len(res):5d} groups  {dt * 1e3:6.1f} ms")
@@ -0,0 +1,209 @@
+# exporter.py
+# Streaming table exports for analysts: /export/{table}?format=csv|ndjson|arrow|parquet
+#
+# Instead of pulling /reports or /social/list as one big JSON list, rows are read with
+# fetchmany() from a server-side cursor and written out chunk by chunk, so memory stays
+# at one chunk whatever the table size. Partitioned tables read through the monthly
+# files covering [since, until] (partitions.iter_connections).
+#
+# Arrow / Parquet need pyarrow (optional, imported on first use); the schema comes from
+# the declared SQLite column types.
+#
+#   for chunk in exporter.stream("social_media", "csv", since="2025-09-01"): out.write(chunk)
+import os, io, csv, json, sqlite3
+import importlib.util
+
+import partitions
+
+DATABASE = partitions.DATABASE
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+TABLES = {"reports": "hazard_type", "social_media": "hazard"}   # table -> hazard column
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "arrow": "arrows", "parquet": "parquet"}
+
+
+def check(table: str, fmt: str, db_path: str = DATABASE) -> list:
+    """Columns of `table` (see columns()), validated before any response byte is sent.
+
+    ValueError: unknown table/format; ImportError: format needs pyarrow and it is missing;
+    LookupError: the table does not exist (yet) in db_path."""
+    if table not in TABLES:
+        raise ValueError(f"table must be one of {', '.join(TABLES)}")
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"format must be one of {', '.join(MEDIA_TYPES)}")
+    if fmt in ("arrow", "parquet") and importlib.util.find_spec("pyarrow") is None:
+        raise ImportError("pyarrow is not installed")
+    cols = columns(db_path, table)
+    if not cols:
+        raise LookupError(f"table {table} does not exist")
+    return cols
+
+
+# ================== Reading ==================
+def columns(db_path: str, table: str) -> list:
+    """[(name, declared type)] of the hot table."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return [(r[1], r[2] or "") for r in conn.execute(f"PRAGMA table_info({table})")]
+    finally:
+        conn.close()
+
+
+def _batches(db_path, table, cols, since, until, hazard, factory):
+    where, params = [], []
+    if hazard is not None:
+        where.append(f"{TABLES[table]} = ?"); params.append(hazard)
+    if since is not None:
+        where.append("timestamp >= ?"); params.append(since)
+    if until is not None:
+        where.append("timestamp < ?"); params.append(until)
+    sql = f"SELECT {', '.join(cols)} FROM {{table}}" + (f" WHERE {' AND '.join(where)}" if where else "")
+    # the generator is advanced from whichever threadpool worker serves the next chunk
+    if table in partitions.PARTITIONED_TABLES:
+        conns = partitions.iter_connections(db_path, since, until, tables=(table,), factory=factory,
+                                            check_same_thread=False)
+        source = f"{table}_all"
+    else:
+        conns = iter([sqlite3.connect(db_path, factory=factory, check_same_thread=False)])
+        source = table
+    for conn in conns:
+        try:
+            cur = conn.cursor()
+            cur.execute(sql.format(table=source), params)
+            while True:
+                rows = cur.fetchmany(CHUNK_ROWS)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+
+# ================== Writers ==================
+def _csv(names, batches):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(names)
+    for rows in batches:
+        w.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0); buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _ndjson(names, batches):
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(names, r)), ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+
+
+def _arrow_type(pa, decl: str):
+    # SQLite type affinity rules (https://sqlite.org/datatype3.html#determination_of_column_affinity)
+    decl = decl.upper()
+    if "INT" in decl:
+        return pa.int64()
+    if any(t in decl for t in ("CHAR", "CLOB", "TEXT", "DATE", "TIME")) or not decl:   # timestamps are ISO text here
+        return pa.string()
+    if "BLOB" in decl:
+        return pa.binary()
+    return pa.float64()   # REAL / FLOA / DOUB / NUMERIC
+
+
+def _coerce(values, typ, pa):
+    """Values SQLite let into a column of another affinity -> the column's type (None if impossible)."""
+    if pa.types.is_string(typ):
+        return [None if v is None else v.decode("utf-8", "replace") if isinstance(v, bytes) else str(v) for v in values]
+    conv = {"int64": int, "double": float, "binary": lambda v: v if isinstance(v, bytes) else str(v).encode("utf-8")}[str(typ)]
+    out = []
+    for v in values:
+        try:
+            out.append(None if v is None else conv(v))
+        except (TypeError, ValueError):
+            out.append(None)
+    return out
+
+
+class _Chunks:
+    """Write-only file object collecting what pyarrow writes, drained after every batch."""
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+
+def _pyarrow(fmt, cols, batches):
+    import pyarrow as pa
+    schema = pa.schema([(name, _arrow_type(pa, decl)) for name, decl in cols])
+    sink = _Chunks()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        write = writer.write_table
+        to = pa.Table
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+        to = pa.RecordBatch
+    try:
+        for rows in batches:
+            arrays = []
+            for i, field in enumerate(schema):
+                values = [r[i] for r in rows]
+                try:
+                    arrays.append(pa.array(values, type=field.type))
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    arrays.append(pa.array(_coerce(values, field.type, pa), type=field.type))
+            write(to.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()   # stream end marker / parquet footer
+
+
+def stream(table: str, fmt: str, since: str = None, until: str = None, hazard: str = None,
+           db_path: str = DATABASE, factory=sqlite3.Connection, cols: list = None):
+    """Iterator of encoded byte chunks; call check() first and pass its columns."""
+    cols = cols or columns(db_path, table)
+    names = [c[0] for c in cols]
+    batches = _batches(db_path, table, names, since, until, hazard, factory)
+    if fmt == "csv":
+        return _csv(names, batches)
+    if fmt == "ndjson":
+        return _ndjson(names, batches)
+    return _pyarrow(fmt, cols, batches)
+
+
+if __name__ == "__main__":
+    # quick benchmark: python exporter.py [db] [table]
+    import sys, time
+    db = sys.argv[1] if len(sys.argv) > 1 else DATABASE
+    table = sys.argv[2] if len(sys.argv) > 2 else "social_media"
+    for fmt in MEDIA_TYPES:
+        try:
+            check(table, fmt, db)
+        except ImportError:
+            print(f"{fmt:<8} skipped (pyarrow not installed)")
+            continue
+        t0 = time.perf_counter()
+        size = sum(len(c) for c in stream(table, fmt, db_path=db))
+        print(f"{fmt:<8} {size / 1024:10,.0f} KB in {(time.perf_counter() - t0) * 1e3:7.0f} ms")
@@ -0,0 +1,140 @@
+# geoparser.py
+# Offline geoparser: finds place names from a local coastal gazetteer in post text and
+# resolves them to coordinates, no network / Google API needed.
+#
+#   geoparser.parse("Heavy flooding near Velachery, Chennai")
+#   -> {"location_name": "Velachery", "latitude": 12.9815, "longitude": 80.218, "confidence": 1.0}
+#
+# The gazetteer (data/gazetteer_in.tsv: names;aliases, lat, lon, kind, state) is loaded
+# once per process into a token trie. A post is tokenized once and scanned left to right
+# taking the longest match at each position, so cost is linear in the post length
+# (a few microseconds per post).
+import os, re, threading
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(os.path.dirname(__file__), "data", "gazetteer_in.tsv"))
+MIN_CONFIDENCE = float(os.getenv("GEO_MIN_CONFIDENCE", "0.5"))
+
+# more specific places are better pins for a hotspot
+KIND_CONFIDENCE = {"locality": 0.8, "city": 0.75, "district": 0.6, "region": 0.5, "state": 0.35}
+_PREPOSITIONS = {"in", "at", "near", "off", "from", "around", "across", "of"}
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_LEAF = ""   # trie key holding the entry ids of a complete name (tokens are never empty)
+
+
+class Gazetteer:
+    def __init__(self, entries):
+        self.entries = entries   # [(names, lat, lon, kind, state)]
+        self.trie = {}
+        for i, (names, *_rest) in enumerate(entries):
+            for name in names:
+                node = self.trie
+                for tok in _TOKEN_RE.findall(name.lower()):
+                    node = node.setdefault(tok, {})
+                node.setdefault(_LEAF, []).append(i)
+
+    @classmethod
+    def load(cls, path: str):
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                names, lat, lon, kind, state = (line.rstrip("\n").split("\t") + [""])[:5]
+                entries.append((names.split(";"), float(lat), float(lon), kind, state))
+        return cls(entries)
+
+    def find(self, text: str):
+        """All non-overlapping (leftmost-longest) matches: [(entry ids, start token, surface text, prev token)]."""
+        tokens = [(m.group(), m.start(), m.end()) for m in _TOKEN_RE.finditer(text)]
+        lowered = [t[0].lower() for t in tokens]
+        out = []
+        i, n = 0, len(tokens)
+        while i < n:
+            node, j, best = self.trie, i, None
+            while j < n and lowered[j] in node:
+                node = node[lowered[j]]
+                j += 1
+                if _LEAF in node:
+                    best = (j, node[_LEAF])
+            if best is None:
+                i += 1
+                continue
+            end, ids = best
+            out.append((ids, i, text[tokens[i][1]:tokens[end - 1][2]], lowered[i - 1] if i else ""))
+            i = end
+        return out
+
+    def resolve(self, text: str):
+        """Best place in the text with a confidence score, or None."""
+        best = None
+        for ids, _start, surface, prev in self.find(text):
+            for i in ids:
+                names, lat, lon, kind, _state = self.entries[i]
+                conf = KIND_CONFIDENCE.get(kind, 0.4)
+                if surface[:1].isupper():
+                    conf += 0.1    # written as a proper noun
+                if prev in _PREPOSITIONS:
+                    conf += 0.1    # "flooding in Puri"
+                if len(surface) <= 4 and " " not in surface:
+                    conf -= 0.15   # short names collide with ordinary words ("Sion", "Diu")
+                if len(ids) > 1:
+                    conf *= 0.7    # same name, several places
+                conf = round(max(0.0, min(1.0, conf)), 3)
+                if best is None or conf > best["confidence"]:
+                    best = {"location_name": names[0], "latitude": lat, "longitude": lon, "confidence": conf}
+        return best
+
+
+# ================== Lazy, process-wide gazetteer ==================
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                try:
+                    _gazetteer = Gazetteer.load(GAZETTEER_PATH)
+                except OSError as e:
+                    print("gazetteer load error:", e)
+                    _gazetteer = Gazetteer([])
+    return _gazetteer
+
+
+def parse(text: str, min_confidence: float = MIN_CONFIDENCE):
+    place = get_gazetteer().resolve(text or "")
+    return place if place and place["confidence"] >= min_confidence else None
+
+
+def fill_location(post: dict, text_key: str = "text") -> bool:
+    """Set location_name / latitude / longitude from the text if the post has no coordinates."""
+    if post.get("latitude") is not None and post.get("longitude") is not None:
+        return False
+    place = parse(post.get(text_key))
+    if place is None:
+        return False
+    post["latitude"], post["longitude"] = place["latitude"], place["longitude"]
+    post["location_name"] = post.get("location_name") or place["location_name"]
+    post["geo_confidence"] = place["confidence"]
+    return True
+
+
+if __name__ == "__main__":
+    # quick benchmark: python geoparser.py
+    import time
+    samples = [
+        "Heavy flooding near Velachery, Chennai, roads under water",
+        "Tsunami warning issued for Andaman and Nicobar islands after 7.9 quake",
+        "Cyclone expected to make landfall near Nellore tonight",
+        "Just some random post about football and music with no places at all in it",
+    ]
+    for s in samples:
+        print(parse(s, 0.0), "<-", s)
+    get_gazetteer()
+    n = 100_000
+    t0 = time.perf_counter()
+    for i in range(n):
+        parse(samples[i % len(samples)])
+    print(f"{(time.perf_counter() - t0) / n * 1e6:.1f} µs/post")
@@ -0,0 +1,254 @@
+# hotspot_engine.py
+# NumPy hotspot engine: columnar points + time-decayed grid accumulators +
+# DBSCAN-style merging of neighbouring cells (a cluster on a cell boundary is
+# not split any more).
+#
+#   engine = HotspotEngine()
+#   engine.add(lats, lons, weights, epoch_seconds)   # incremental, any batch size
+#   engine.clusters(top=50)                          # ranked clusters
+#
+# Scores decay exponentially with age (half life HOTSPOT_HALF_LIFE_HOURS), so a
+# burst from the last hour outranks the same number of reports from last week;
+# half_life_hours=0 turns decay off (plain weight sums).
+#
+# refresh_from_db() only reads rows past its id high-water mark; rows updated or deleted
+# in place (urgency re-classified, location geocoded later) are picked up by a full
+# reload every HOTSPOT_RELOAD_SECONDS, built in the background (incremental.py).
+import os, math, threading, time
+import numpy as np
+
+from incremental import IncrementalLoader
+
+URGENCY_WEIGHTS = {"High": 3.0, "Medium": 2.0}   # everything else -> 1.0
+CELL_DEG = 0.02                                  # same grid size as the old SQL query
+HALF_LIFE_HOURS = float(os.getenv("HOTSPOT_HALF_LIFE_HOURS", "6"))
+RELOAD_SECONDS = float(os.getenv("HOTSPOT_RELOAD_SECONDS", "900"))   # 0 = never reload
+KM_PER_DEG = 111.32
+
+_KEY_OFFSET = 1 << 19   # cell index shift so keys are non-negative
+_KEY_SPAN = 1 << 20     # 0.02 deg grid needs ~18000 columns, plenty of room
+
+# neighbour offsets (half of the 8-neighbourhood; edges are undirected)
+_NEIGHBOURS = (1, _KEY_SPAN, _KEY_SPAN + 1, _KEY_SPAN - 1)
+
+
+def urgency_weights(urgencies) -> np.ndarray:
+    return np.fromiter((URGENCY_WEIGHTS.get(u, 1.0) for u in urgencies), dtype=np.float64)
+
+
+class HotspotEngine:
+    # everything a full reload replaces
+    _STATE = ("size", "lat", "lon", "weight", "ts", "t_ref", "cell_keys", "_acc")
+
+    def __init__(self, cell_deg: float = CELL_DEG, half_life_hours: float = HALF_LIFE_HOURS, capacity: int = 1024,
+                 reload_seconds: float = RELOAD_SECONDS):
+        self.cell_deg = cell_deg
+        self.half_life_hours = half_life_hours
+        self.decay_rate = math.log(2) / (half_life_hours * 3600.0) if half_life_hours > 0 else 0.0
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+
+        # columnar point store (kept so the grid can be rebuilt with other params)
+        self.size = 0
+        self.lat = np.empty(capacity, dtype=np.float64)
+        self.lon = np.empty(capacity, dtype=np.float64)
+        self.weight = np.empty(capacity, dtype=np.float64)
+        self.ts = np.empty(capacity, dtype=np.float64)
+
+        # per-cell accumulators, all decayed to self.t_ref; cell_keys is sorted
+        self.t_ref = None
+        self.cell_keys = np.empty(0, dtype=np.int64)
+        self._acc = np.empty((6, 0), dtype=np.float64)   # rows: w, w*lat, w*lon, w*lat^2, w*lon^2, count
+        self.generation = 0   # bumped on every change of the points (add or reload); tiles key on it
+
+        self.loader = IncrementalLoader(("reports", "social_media"), reload_seconds, "hotspots")
+
+    # ---------- ingest ----------
+    def _grow(self, extra: int):
+        need = self.size + extra
+        if need <= len(self.lat):
+            return
+        cap = max(need, 2 * len(self.lat))
+        for name in ("lat", "lon", "weight", "ts"):
+            arr = getattr(self, name)
+            new = np.empty(cap, dtype=np.float64)
+            new[:self.size] = arr[:self.size]
+            setattr(self, name, new)
+
+    def _keys(self, lat, lon) -> np.ndarray:
+        ix = np.floor(lat / self.cell_deg).astype(np.int64) + _KEY_OFFSET
+        iy = np.floor(lon / self.cell_deg).astype(np.int64) + _KEY_OFFSET
+        return ix * _KEY_SPAN + iy
+
+    def add(self, lat, lon, weight, ts):
+        """Append a batch of points and fold them into the decayed grid."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        weight = np.broadcast_to(np.asarray(weight, dtype=np.float64), lat.shape)
+        ts = np.asarray(ts, dtype=np.float64)
+        ok = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(ts)
+        lat, lon, weight, ts = lat[ok], lon[ok], weight[ok], ts[ok]
+        n = len(lat)
+        if n == 0:
+            return 0
+
+        with self._lock:
+            self._grow(n)
+            s = slice(self.size, self.size + n)
+            self.lat[s], self.lon[s], self.weight[s], self.ts[s] = lat, lon, weight, ts
+            self.size += n
+            self.generation += 1
+
+            # move the reference time forward; existing sums decay in O(cells)
+            newest = float(ts.max())
+            if self.t_ref is None:
+                self.t_ref = newest
+            elif newest > self.t_ref:
+                self._acc[:5] *= math.exp(-self.decay_rate * (newest - self.t_ref))
+                self.t_ref = newest
+
+            w = weight * np.exp(-self.decay_rate * (self.t_ref - ts))
+            keys, inv = np.unique(self._keys(lat, lon), return_inverse=True)
+            batch = np.vstack([
+                np.bincount(inv, weights=w),
+                np.bincount(inv, weights=w * lat),
+                np.bincount(inv, weights=w * lon),
+                np.bincount(inv, weights=w * lat * lat),
+                np.bincount(inv, weights=w * lon * lon),
+                np.bincount(inv).astype(np.float64),
+            ])
+
+            pos = np.searchsorted(self.cell_keys, keys)
+            found = pos < len(self.cell_keys)
+            found[found] = self.cell_keys[pos[found]] == keys[found]
+            self._acc[:, pos[found]] += batch[:, found]
+            if not found.all():
+                merged_keys = np.concatenate([self.cell_keys, keys[~found]])
+                order = np.argsort(merged_keys, kind="stable")
+                self.cell_keys = merged_keys[order]
+                self._acc = np.concatenate([self._acc, batch[:, ~found]], axis=1)[:, order]
+        return n
+
+    # ---------- query ----------
+    def clusters(self, now: float | None = None, top: int = 50, min_cell_score: float = 0.05, min_score: float = 1.0):
+        """Ranked clusters: [{latitude, longitude, radius_km, score, count, cells}]"""
+        with self._lock:
+            if self.t_ref is None or len(self.cell_keys) == 0:
+                return []
+            now = self.t_ref if now is None else max(now, self.t_ref)
+            scale = math.exp(-self.decay_rate * (now - self.t_ref))
+            active = self._acc[0] * scale >= min_cell_score
+            keys = self.cell_keys[active]
+            acc = self._acc[:, active]
+        m = len(keys)
+        if m == 0:
+            return []
+
+        # DBSCAN-style: occupied cells touching each other (8-neighbourhood) form one cluster
+        src, dst = [], []
+        for off in _NEIGHBOURS:
+            pos = np.searchsorted(keys, keys + off)
+            hit = pos < m
+            hit[hit] = keys[pos[hit]] == keys[hit] + off
+            src.append(np.nonzero(hit)[0])
+            dst.append(pos[hit])
+        src, dst = np.concatenate(src), np.concatenate(dst)
+
+        labels = np.arange(m)
+        while len(src):
+            low = np.minimum(labels[src], labels[dst])
+            new = labels.copy()
+            np.minimum.at(new, src, low)
+            np.minimum.at(new, dst, low)
+            new = new[new]   # pointer jumping -> converges in a few rounds
+            if np.array_equal(new, labels):
+                break
+            labels = new
+        _, comp = np.unique(labels, return_inverse=True)
+
+        sums = np.vstack([np.bincount(comp, weights=row) for row in acc])
+        cells = np.bincount(comp)
+        w = sums[0]
+        c_lat, c_lon = sums[1] / w, sums[2] / w
+        var_lat = np.maximum(sums[3] / w - c_lat ** 2, 0.0)
+        var_lon = np.maximum(sums[4] / w - c_lon ** 2, 0.0)
+        spread = np.sqrt(var_lat + var_lon * np.cos(np.radians(c_lat)) ** 2)
+        radius_km = np.maximum(2 * spread, self.cell_deg / 2) * KM_PER_DEG
+        score = w * scale
+
+        order = np.argsort(-score)
+        order = order[score[order] >= min_score][:top]
+        return [
+            {
+                "latitude": round(float(c_lat[i]), 5),
+                "longitude": round(float(c_lon[i]), 5),
+                "radius_km": round(float(radius_km[i]), 3),
+                "score": round(float(score[i]), 3),
+                "count": int(sums[5][i]),
+                "cells": int(cells[i]),
+            }
+            for i in order
+        ]
+
+    # ---------- sqlite loader ----------
+    def refresh_from_db(self, conn) -> int:
+        """Pull rows added since the last call (by id) from reports + social_media; a full
+        reload is started in the background every reload_seconds."""
+        return self.loader.refresh(self, conn)
+
+    def empty(self):
+        return HotspotEngine(self.cell_deg, self.half_life_hours, max(self.size, 1024), self.reload_seconds)
+
+    def swap(self, fresh):
+        with self._lock:
+            for name in self._STATE:
+                setattr(self, name, getattr(fresh, name))
+            self.generation += 1   # same size or smaller after a reload is still new data
+
+    def points(self):
+        """(generation, lat, lon, weight) copies, consistent with each other."""
+        with self._lock:
+            n = self.size
+            return self.generation, self.lat[:n].copy(), self.lon[:n].copy(), self.weight[:n].copy()
+
+    def fold_rows(self, cur, table: str, source: str, where: str, params) -> int:
+        cur.execute(f"PRAGMA table_info({source})")
+        cols = {r[1] for r in cur.fetchall()}
+        if not cols:
+            return 0
+        urgency = "urgency" if "urgency" in cols else "NULL"
+        cur.execute(f"""
+            SELECT latitude, longitude, {urgency}, CAST(strftime('%s', timestamp) AS REAL)
+            FROM {source}
+            WHERE {where} AND latitude IS NOT NULL AND longitude IS NOT NULL
+        """, params)
+        added = 0
+        while True:
+            rows = cur.fetchmany(100_000)
+            if not rows:
+                return added
+            lat, lon, urg, ts = zip(*rows)
+            ts = np.array([time.time() if t is None else t for t in ts], dtype=np.float64)
+            added += self.add(lat, lon, urgency_weights(urg), ts)
+
+if __name__ == "__main__":
+    # quick benchmark: python hotspot_engine.py [n_points]
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    centres = rng.uniform([8, 68], [23, 90], size=(40, 2))   # roughly the Indian coastline box
+    pick = rng.integers(0, len(centres), n)
+    lat = centres[pick, 0] + rng.normal(0, 0.05, n)
+    lon = centres[pick, 1] + rng.normal(0, 0.05, n)
+    w = rng.choice([1.0, 2.0, 3.0], n)
+    ts = time.time() - rng.uniform(0, 7 * 86400, n)
+
+    engine = HotspotEngine()
+    t0 = time.perf_counter(); engine.add(lat, lon, w, ts); t1 = time.perf_counter()
+    top = engine.clusters(top=20); t2 = time.perf_counter()
+    engine.add(lat[:1000] + 0.001, lon[:1000], w[:1000], ts[:1000] + 60); t3 = time.perf_counter()
+    print(f"load {n} points: {(t1 - t0) * 1000:.1f} ms")
+    print(f"clusters: {(t2 - t1) * 1000:.1f} ms ({len(engine.cell_keys)} cells)")
+    print(f"incremental add 1000: {(t3 - t2) * 1000:.1f} ms")
+    for c in top[:5]:
+        print(c)
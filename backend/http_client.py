@@ -0,0 +1,259 @@
+# http_client.py
+# Shared outbound HTTP layer: every fetcher / geocoder goes through here instead of bare requests.get().
+#
+#   r = http_client.get("https://maps.googleapis.com/maps/api/geocode/json", params={...}, cache=True)
+#
+# - one pooled requests.Session per process: keep-alive connections per host, so repeat
+#   calls skip DNS + TCP + TLS setup
+# - strict (connect, read) timeouts on every call, a hung upstream can't block a worker
+# - retries with exponential backoff on idempotent methods only; a Retry-After is honoured
+#   up to HTTP_MAX_RETRY_AFTER seconds, so a rate-limited upstream can't park a worker
+# - gzip/deflate (+ br when brotli is installed) response compression
+# - optional on-disk cache (HTTP_CACHE_DIR) honouring Cache-Control / Expires, with
+#   ETag / Last-Modified revalidation; credential query params (API keys, tokens) are
+#   blanked out of the cache key and never written to disk
+import os, json, time, hashlib, threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util import Retry, make_headers
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))              # 0.5s, 1s, 2s ...
+MAX_RETRY_AFTER = float(os.getenv("HTTP_MAX_RETRY_AFTER", "5"))  # longest Retry-After we sleep for
+POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "16"))            # hosts with a pool kept open
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))              # keep-alive connections per host
+CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "")                     # empty = disk cache off
+CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "200"))
+USER_AGENT = os.getenv("HTTP_USER_AGENT", "coastal-hazard-backend")
+
+CREDENTIAL_PARAMS = frozenset(p.strip().lower() for p in os.getenv(
+    "HTTP_CACHE_CREDENTIAL_PARAMS", "key,api_key,apikey,access_token,token,client_secret,signature,sig").split(","))
+
+IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS"})
+_DROP_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection")
+
+
+# ================== Session ==================
+_session = None
+_session_lock = threading.Lock()
+_counts = {"requests": 0, "cache_hits": 0, "cache_revalidated": 0, "cache_stores": 0, "errors": 0}
+_counts_lock = threading.Lock()
+
+
+def _count(key: str):
+    with _counts_lock:
+        _counts[key] += 1
+
+
+class _CappedRetry(Retry):
+    def get_retry_after(self, response):
+        seconds = super().get_retry_after(response)
+        return None if seconds is None else min(seconds, MAX_RETRY_AFTER)
+
+
+def session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                retry = _CappedRetry(
+                    total=RETRIES, connect=RETRIES, read=RETRIES, status=RETRIES,
+                    backoff_factor=BACKOFF,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=IDEMPOTENT,
+                    respect_retry_after_header=True,
+                    raise_on_status=False,   # hand the last response back instead of raising
+                )
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE, max_retries=retry)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers.update(make_headers(accept_encoding=True))   # includes br if brotli is installed
+                s.headers["User-Agent"] = USER_AGENT
+                _session = s
+    return _session
+
+
+def request(method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+    """session().request() with the default timeouts; retries only apply to idempotent methods."""
+    _count("requests")
+    try:
+        return session().request(method, url, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+    except requests.RequestException:
+        _count("errors")
+        raise
+
+
+def cache_key(url: str) -> str:
+    """url with the values of CREDENTIAL_PARAMS blanked; what the disk cache keys and stores."""
+    parts = urlsplit(url)
+    query = [(k, "REDACTED" if k.lower() in CREDENTIAL_PARAMS else v)
+             for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def get(url: str, params=None, headers=None, timeout=None, cache: bool = False) -> requests.Response:
+    """GET through the pool; with cache=True (and HTTP_CACHE_DIR set) through the disk cache."""
+    store = disk_cache() if cache else None
+    if store is None:
+        return request("GET", url, params=params, headers=headers, timeout=timeout)
+
+    full_url = requests.Request("GET", url, params=params).prepare().url
+    key = cache_key(full_url)
+    entry = store.lookup(key)
+    if entry is not None and entry["expires"] > time.time():
+        _count("cache_hits")
+        return store.response(key, entry)
+
+    headers = dict(headers or {})
+    if entry is not None:
+        if entry["headers"].get("etag"):
+            headers["If-None-Match"] = entry["headers"]["etag"]
+        if entry["headers"].get("last-modified"):
+            headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+    r = request("GET", full_url, headers=headers, timeout=timeout)
+    if r.status_code == 304 and entry is not None:
+        _count("cache_revalidated")
+        entry["headers"].update({k.lower(): v for k, v in r.headers.items() if k.lower() not in _DROP_HEADERS})
+        entry["expires"] = _expires(r.headers) or time.time()
+        try:
+            store.save(key, entry)
+        except OSError as e:
+            print("http cache write error:", e)
+        return store.response(key, entry)
+    if r.status_code == 200 and store.cacheable(r.headers):
+        store.store(key, r)
+        _count("cache_stores")
+    return r
+
+
+def stats() -> dict:
+    with _counts_lock:
+        return dict(_counts)
+
+
+# ================== Disk cache ==================
+def _expires(headers):
+    """Expiry timestamp from Cache-Control max-age / Expires, or None."""
+    cc = {}
+    for part in headers.get("Cache-Control", "").lower().split(","):
+        k, _, v = part.strip().partition("=")
+        cc[k] = v.strip('"')
+    if "no-cache" in cc:
+        return None
+    if cc.get("max-age", "").isdigit():
+        return time.time() + int(cc["max-age"]) - int(headers.get("Age", "0") or 0)
+    if headers.get("Expires"):
+        try:
+            return parsedate_to_datetime(headers["Expires"]).timestamp()
+        except (TypeError, ValueError):
+            return None   # "Expires: 0" etc. = already expired
+    return None
+
+
+class DiskCache:
+    """One file per URL: a JSON header line (headers, expiry) followed by the decoded body.
+
+    Callers pass cache_key(url), never a URL carrying credentials."""
+
+    def __init__(self, root: str, max_mb: float = CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._stores = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        h = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, h[:2], h[2:])
+
+    @staticmethod
+    def cacheable(headers) -> bool:
+        cc = headers.get("Cache-Control", "").lower()
+        if "no-store" in cc:
+            return False
+        return _expires(headers) is not None or "ETag" in headers or "Last-Modified" in headers
+
+    def lookup(self, url: str):
+        try:
+            with open(self._path(url), "rb") as f:
+                entry = json.loads(f.readline())
+                entry["body"] = f.read()
+            return entry if entry.get("url") == url else None
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url: str, entry: dict):
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {k: v for k, v in entry.items() if k != "body"}
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(meta).encode("utf-8") + b"\n")
+            f.write(entry["body"])
+        os.replace(tmp, path)
+
+    def store(self, url: str, r: requests.Response):
+        entry = {
+            "url": url,
+            "headers": {k.lower(): v for k, v in r.headers.items() if k.lower() not in _DROP_HEADERS},
+            "expires": _expires(r.headers) or time.time(),   # validators only -> revalidate every time
+            "body": r.content,
+        }
+        try:
+            self.save(url, entry)
+        except OSError as e:
+            print("http cache write error:", e)
+            return
+        self._stores += 1
+        if self._stores % 100 == 0:
+            self.trim()
+
+    def response(self, url: str, entry: dict) -> requests.Response:
+        r = requests.Response()
+        r.status_code = 200
+        r.url = url
+        r.headers = CaseInsensitiveDict(entry["headers"])
+        r._content = entry["body"]
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        r.from_cache = True
+        return r
+
+    def trim(self):
+        """Drop least recently written entries once the cache is over its size limit."""
+        files = []
+        for d, _, names in os.walk(self.root):
+            for n in names:
+                p = os.path.join(d, n)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+        total = sum(f[1] for f in files)
+        for _, size, p in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+
+
+_cache = None
+
+
+def disk_cache():
+    """Process-wide DiskCache, or None when HTTP_CACHE_DIR is not set."""
+    global _cache
+    if _cache is None and CACHE_DIR:
+        with _session_lock:
+            if _cache is None:
+                _cache = DiskCache(CACHE_DIR)
+    return _cache
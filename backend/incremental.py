@@ -0,0 +1,116 @@
+# incremental.py
+# Incremental DB loading for the in-memory read models (hotspot engine, analytics cube).
+#
+# refresh() folds rows with an id past the per-table high-water marks into the live
+# model. Rows updated or deleted in place (urgency re-classified, a location geocoded
+# later) never get a new id, so every reload_seconds a complete replacement is built in
+# a background thread on its own connection and swapped in; readers keep using the
+# current model until the swap. Full loads include the archived monthly partitions
+# (partitions.py); new rows only ever land in the hot file.
+#
+# A model provides:
+#   empty()                                   -> new, empty model with the same settings
+#   fold_rows(cur, table, source, where, params) -> rows folded from `source` (table or view)
+#   swap(fresh)                               -> take over fresh's state (under its own data lock)
+import sqlite3, threading, time
+
+import partitions
+
+
+def db_path_of(conn) -> str:
+    """File behind `conn` ("" for an in-memory database)."""
+    return conn.execute("PRAGMA database_list").fetchone()[2] or ""
+
+
+def max_id(cur, table: str) -> int:
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    if cur.fetchone() is None:
+        return 0   # table not created yet
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+    return cur.fetchone()[0]
+
+
+def _max_archived_id(db_path: str, table: str) -> int:
+    top = 0
+    for part in partitions.iter_connections(db_path, tables=(table,)):
+        cur = part.cursor()
+        cur.execute(f"PRAGMA table_info({table}_all)")
+        if cur.fetchall():
+            top = max(top, cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}_all").fetchone()[0])
+    return top
+
+
+class IncrementalLoader:
+    def __init__(self, tables, reload_seconds: float, name: str):
+        self.tables = tuple(tables)
+        self.reload_seconds = reload_seconds   # 0 = never reload
+        self.name = name
+        self.last_ids = None    # {table: id}, None until the first load
+        self.loaded_at = None   # time.time() of the last full load
+        self.reloads = 0
+        self._lock = threading.Lock()   # folds and swaps one at a time: a row is never folded twice
+        self._reloading = False
+
+    def load_all(self, model, conn, db_path: str = "") -> tuple:
+        """Fold every row into `model` (archived ones too if db_path is a file): (rows folded, high-water marks)."""
+        cur = conn.cursor()
+        last_ids = {table: max_id(cur, table) for table in self.tables}
+        added = 0
+        for table in self.tables:
+            if not (db_path and table in partitions.PARTITIONED_TABLES):
+                added += model.fold_rows(cur, table, table, "id <= ?", (last_ids[table],))
+                continue
+            # archived rows keep their ids, all below the hot file's; the bound only holds back
+            # hot rows inserted while loading (they are folded by the next refresh)
+            bound = last_ids[table] or _max_archived_id(db_path, table)
+            for part in partitions.iter_connections(db_path, tables=(table,)):
+                added += model.fold_rows(part.cursor(), table, f"{table}_all", "id <= ?", (bound,))
+            last_ids[table] = max(last_ids[table], bound)
+        return added, last_ids
+
+    def refresh(self, model, conn) -> int:
+        """Fold new rows in; the first call loads everything, later calls start a due reload."""
+        with self._lock:
+            if self.last_ids is None:   # nothing to serve yet: first load in line
+                added, self.last_ids = self.load_all(model, conn, db_path_of(conn))
+                self.loaded_at = time.time()
+                return added
+            if not self._reloading and 0 < self.reload_seconds <= time.time() - self.loaded_at:
+                db_path = db_path_of(conn)
+                if not db_path:   # in-memory database: no second connection, reload in line
+                    fresh = model.empty()
+                    added, last_ids = self.load_all(fresh, conn)
+                    model.swap(fresh)
+                    self.last_ids, self.loaded_at = last_ids, time.time()
+                    self.reloads += 1
+                    return added
+                self._reloading = True
+                threading.Thread(target=self._reload, args=(model, db_path), name=f"{self.name}-reload",
+                                 daemon=True).start()
+            cur = conn.cursor()
+            added = 0
+            for table in self.tables:
+                top = max_id(cur, table)
+                if top > self.last_ids.get(table, 0):
+                    added += model.fold_rows(cur, table, table, "id > ? AND id <= ?", (self.last_ids.get(table, 0), top))
+                    self.last_ids[table] = top
+            return added
+
+    def _reload(self, model, db_path: str):
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                fresh = model.empty()
+                _, last_ids = self.load_all(fresh, conn, db_path)
+            finally:
+                conn.close()
+            # rows inserted while loading are past fresh's marks: the next refresh folds them in
+            with self._lock:
+                model.swap(fresh)
+                self.last_ids = last_ids
+                self.reloads += 1
+        except (sqlite3.Error, OSError) as e:
+            print(f"{self.name} reload error:", e)
+        finally:
+            self.loaded_at = time.time()   # after a failure too: retry next period, not on every request
+            self._reloading = False
@@ -5,7 +5,18 @@ from pydantic import BaseModel
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-import sqlite3, os, shutil
+from fastapi import Request, Query
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+import sqlite3, os, shutil, time, json, threading
+import profiler
+from hotspot_engine import HotspotEngine
+from rolling_aggregates import RollingAggregates, WINDOWS
+from tiles import TileService, valid_tile
+from recent_posts import RecentPosts
+import partitions
+import exporter
+import admission
+from analytics_cube import RollupCube
 
 # ================== App & CORS ==================
 app = FastAPI(title="Coastal Hazard Reporting API")
@@ -22,9 +33,10 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 12
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 def get_db():
-    return sqlite3.connect(DATABASE)
+    return sqlite3.connect(DATABASE, factory=profiler.TracedConnection)
 
 def ensure_uploads_dir():
     os.makedirs("uploads", exist_ok=True)
@@ -69,10 +81,12 @@ def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_M
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def _user_from_token(token: str | None):
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                           detail="Could not validate credentials",
                                           headers={"WWW-Authenticate": "Bearer"})
+    if not token:
+        raise credentials_exception
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str | None = payload.get("sub")
@@ -86,6 +100,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
     return user
 
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return _user_from_token(token)
+
 def require_roles(*roles):
     def _dep(user=Depends(get_current_user)):
         if user["role"] not in roles:
@@ -93,6 +110,15 @@ def require_roles(*roles):
         return user
     return _dep
 
+def require_roles_or_query_token(*roles):
+    # map tile layers load tiles as plain <img> requests and cannot send headers -> also accept ?token=
+    def _dep(token: str | None = Depends(oauth2_scheme_optional), query_token: str | None = Query(None, alias="token")):
+        user = _user_from_token(token or query_token)
+        if user["role"] not in roles:
+            raise HTTPException(status_code=403, detail="Insufficient permissions")
+        return user
+    return _dep
+
 # ================== Auth Endpoints ==================
 @app.post("/auth/register", status_code=201)
 def register(user: UserCreate):
@@ -112,6 +138,64 @@ def login(form: OAuth2PasswordRequestForm = Depends()):
     token = create_access_token({"sub": user["username"], "role": user["role"]})
     return {"access_token": token, "token_type": "bearer"}
 
+# ================== Profiling / slow-request capture ==================
+def _request_role(request: Request):
+    # role claim of the (signed) token, no DB lookup: this runs on the event loop for every request
+    auth = request.headers.get("authorization", "")
+    token = auth[7:] if auth.lower().startswith("bearer ") else request.query_params.get("token")
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("role")
+    except JWTError:
+        return None
+
+def _is_admin_request(request: Request) -> bool:
+    return _request_role(request) == "ADMIN"
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # ADMIN: send header `X-Profile: 1` -> response carries `X-Profile-Capture: <id>`
+    return await profiler.handle(request, call_next, _is_admin_request)
+
+# ================== Admission control ==================
+@app.middleware("http")
+async def admit_requests(request: Request, call_next):
+    # per-role priority + per-endpoint-class limits; low priority is shed early with 503 + Retry-After
+    return await admission.handle(request, call_next, _request_role)
+
+@app.get("/admin/admission")
+def admission_stats(_user = Depends(require_roles("ADMIN","OFFICIAL"))):
+    return admission.admission.stats()
+
+@app.get("/admin/profiles")
+def list_profiles(_user = Depends(require_roles("ADMIN"))):
+    return profiler.ring.list()
+
+@app.get("/admin/profiles/{capture_id}")
+def get_profile(capture_id: int, _user = Depends(require_roles("ADMIN"))):
+    capture = profiler.ring.get(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="Capture not found (may have been overwritten)")
+    return capture
+
+@app.get("/admin/profiles/{capture_id}/flamegraph", response_class=PlainTextResponse)
+def get_profile_flamegraph(capture_id: int, _user = Depends(require_roles("ADMIN"))):
+    # folded stacks: feed to flamegraph.pl or drop into speedscope.app
+    capture = profiler.ring.get(capture_id)
+    if capture is None or capture.get("kind") != "profile":
+        raise HTTPException(status_code=404, detail="Profile capture not found")
+    return capture["folded"]
+
+@app.get("/admin/partitions")
+def list_partitions(_user = Depends(require_roles("ADMIN"))):
+    return partitions.info()
+
+@app.post("/admin/partitions/archive")
+def archive_partitions(_user = Depends(require_roles("ADMIN"))):
+    # move months older than PARTITION_HOT_MONTHS out of coastal.db into sealed monthly files
+    return partitions.archive(DATABASE)
+
 # ================== Reports ==================
 # NOTE: username is taken from token now (auth), not from form
 @app.post("/report")
@@ -170,43 +254,81 @@ def social_media_feed(_user = Depends(require_roles("OFFICIAL","ANALYST"))):
         {"platform": "YouTube", "post": "Video of sea flooding in Chennai", "sentiment": "critical"},
     ]
 
+hotspots = HotspotEngine()
+hotspots_all_time = HotspotEngine(half_life_hours=0)   # decay=false; only filled once asked for
+rolling = RollingAggregates()
+
+def _check_window(window: str):
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {', '.join(WINDOWS)}")
+
 @app.get("/hotspots")
-def get_hotspots(_user = Depends(require_roles("OFFICIAL","ANALYST"))):
+def get_hotspots(top: int = 50, min_score: float = 1.0, window: str | None = None, sort: str = "weight",
+                 decay: bool = True, _user = Depends(require_roles("OFFICIAL","ANALYST"))):
+    # window=1h|6h|24h -> served from rolling time-bucket aggregates (with spike score)
+    # no window        -> all-time clusters from the hotspot engine; scores decay with a
+    #                     HOTSPOT_HALF_LIFE_HOURS half life (min_score applies to the decayed
+    #                     score), decay=false -> plain urgency weight sums
     conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT 
-            ROUND(latitude/0.02, 0)*0.02 as cell_lat,
-            ROUND(longitude/0.02, 0)*0.02 as cell_lon,
-            SUM(
-                CASE urgency
-                    WHEN 'High' THEN 3
-                    WHEN 'Medium' THEN 2
-                    ELSE 1
-                END
-            ) as weight
-        FROM (
-            SELECT latitude, longitude, urgency FROM reports
-            UNION ALL
-            SELECT latitude, longitude, urgency FROM social_media
-        )
-        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
-        GROUP BY cell_lat, cell_lon
-        HAVING weight > 1
-        ORDER BY weight DESC
-    """)
+    if window is not None:
+        _check_window(window)
+        rolling.refresh_from_db(conn)
+        conn.close()
+        return rolling.hotspots(window, top=top, sort=sort)
 
-    rows = cur.fetchall()
+    # engine keeps the grid in memory; only rows newer than its last seen id are read
+    engine = hotspots if decay else hotspots_all_time
+    engine.refresh_from_db(conn)
     conn.close()
 
     return [
-        {"latitude": r[0], "longitude": r[1], "weight": r[2]}
-        for r in rows
+        {**c, "weight": c["score"]}
+        for c in engine.clusters(now=time.time(), top=top, min_score=min_score)
     ]
 
+@app.get("/trends")
+def get_trends(window: str = "6h", _user = Depends(require_roles("OFFICIAL","ANALYST"))):
+    _check_window(window)
+    conn = get_db()
+    rolling.refresh_from_db(conn)
+    conn.close()
+    return rolling.trends(window)
+
+# ================== Map tiles ==================
+tile_service = TileService(hotspots)
+
+def _tile_response(request: Request, body: bytes, media_type: str, version: str, v: str | None):
+    etag = f'"{version}"'
+    # URLs carrying the current ?v= never change -> browser may keep them; anything else revalidates
+    cache = "private, max-age=86400, immutable" if v == version else "private, no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+@app.get("/tiles/version")
+def tiles_version(_user = Depends(require_roles_or_query_token("OFFICIAL","ANALYST"))):
+    # frontend appends ?v=<version> to tile URLs; a new version invalidates every cached tile
+    return {"version": tile_service.refresh(get_db, force=True)}
+
+@app.get("/tiles/heat/{z}/{x}/{y}.png")
+def heat_tile(z: int, x: int, y: int, request: Request, v: str | None = None,
+              _user = Depends(require_roles_or_query_token("OFFICIAL","ANALYST"))):
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    # the version refresh() returned picks the snapshot; the one actually rendered is the ETag
+    version, body = tile_service.heat_tile(z, x, y, tile_service.refresh(get_db))
+    return _tile_response(request, body, "image/png", version, v)
+
+@app.get("/tiles/clusters/{z}/{x}/{y}.json")
+def cluster_tile(z: int, x: int, y: int, request: Request, v: str | None = None,
+                 _user = Depends(require_roles_or_query_token("OFFICIAL","ANALYST"))):
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    version, geojson = tile_service.cluster_tile(z, x, y, tile_service.refresh(get_db))
+    body = json.dumps(geojson).encode()
+    return _tile_response(request, body, "application/geo+json", version, v)
 
-from rule_classifier import classify_post
 from pydantic import BaseModel
 
 class SocialPost(BaseModel):
@@ -217,16 +339,26 @@ class SocialPost(BaseModel):
 
 @app.post("/social/ingest")
 def ingest_social_post(post: SocialPost):
+    import prefilter, geoparser   # loaded on first ingest, not at worker start
+    from rule_classifier import classify_post
+    # cheap relevance / language gate first; noise is not classified or stored
+    keep, reason, score = prefilter.check(post.text)
+    prefilter.record(keep, reason)
+    if not keep:
+        return {"status": "skipped", "reason": reason, "relevance": round(score, 3)}
     hazard, urgency = classify_post(post.text)
+    place = geoparser.parse(post.text) or {}
     conn = get_db()
     cur = conn.cursor()
     cur.execute(
-        "INSERT INTO social_media (source, text, timestamp, url, hazard, urgency) VALUES (?, ?, ?, ?, ?, ?)",
-        (post.source, post.text, post.timestamp, post.url, hazard, urgency)
+        "INSERT INTO social_media (source, text, timestamp, url, hazard, urgency, latitude, longitude, location_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (post.source, post.text, post.timestamp, post.url, hazard, urgency,
+         place.get("latitude"), place.get("longitude"), place.get("location_name"))
     )
     conn.commit()
     conn.close()
-    return {"status": "ok", "hazard": hazard, "urgency": urgency}
+    recent_posts.refresh(get_db, force=True)
+    return {"status": "ok", "hazard": hazard, "urgency": urgency, "location": place or None}
 
 app.add_middleware(
     CORSMiddleware,
@@ -239,66 +371,199 @@ app.add_middleware(
 from fastapi import BackgroundTasks
 import social_fetcher  # new module
 
+refresh_flight = admission.single_flight("social_refresh")
+
 @app.post("/social/refresh")
 def api_social_refresh(q: str = "flood,tsunami,cyclone", limit: int = 20, background_tasks: BackgroundTasks = None, _user = Depends(require_roles("OFFICIAL","ANALYST","CITIZEN"))):
     """
     Fetch posts from social_fetcher and insert into social_media table.
     By default runs in background; set background_tasks=None to run synchronously.
     """
+    # one fetch at a time: while one runs, further triggers (any role) just get its status
+    token = refresh_flight.try_start()
+    if token is None:
+        return {"status": "running", "message": "a refresh is already in progress",
+                "started_at": refresh_flight.started_at}
+
     def do_refresh(query, lim):
-        conn = get_db()
-        cur = conn.cursor()
-        # ensure urgency column exists (safe)
+        inserted = None
         try:
-            cur.execute("ALTER TABLE social_media ADD COLUMN urgency TEXT")
-        except Exception:
-            pass
-
-        posts = social_fetcher.fetch_all_social(query, lim)
-        inserted = 0
-        for p in posts:
-            url = p.get("url")
-            # dedupe by URL if available, else by text+timestamp
-            if url:
-                cur.execute("SELECT 1 FROM social_media WHERE url=? LIMIT 1", (url,))
-                if cur.fetchone():
-                    continue
-            else:
-                cur.execute("SELECT 1 FROM social_media WHERE text=? AND timestamp=? LIMIT 1", (p.get("text"), p.get("timestamp")))
-                if cur.fetchone():
-                    continue
-
-            cur.execute("""
-                INSERT INTO social_media (source, text, timestamp, url, hazard, urgency, latitude, longitude, location_name)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                p.get("source"),
-                p.get("text"),
-                p.get("timestamp"),
-                p.get("url"),
-                p.get("hazard"),
-                p.get("urgency"),
-                p.get("latitude"),
-                p.get("longitude"),
-                p.get("location_name")
-            ))
-            inserted += 1
-        conn.commit()
-        conn.close()
-        return inserted
+            inserted = _refresh_social(query, lim)
+            return inserted
+        finally:
+            refresh_flight.finish(token, {"inserted": inserted})
 
     # run in background if FastAPI background available
+    # (if the task never runs, the flight goes stale after SINGLE_FLIGHT_STALE_SECONDS)
     if background_tasks is not None:
-        background_tasks.add_task(do_refresh, q, limit)
+        try:
+            background_tasks.add_task(do_refresh, q, limit)
+        except BaseException:
+            refresh_flight.finish(token)
+            raise
         return {"status":"started", "message":"background refresh queued"}
     else:
         count = do_refresh(q, limit)
         return {"status":"ok", "inserted": count}
 
+def _refresh_social(query, lim):
+    conn = get_db()
+    cur = conn.cursor()
+    # ensure urgency column exists (safe)
+    try:
+        cur.execute("ALTER TABLE social_media ADD COLUMN urgency TEXT")
+    except Exception:
+        pass
+
+    posts = social_fetcher.fetch_all_social(query, lim)
+    inserted = 0
+    for p in posts:
+        url = p.get("url")
+        # dedupe by URL if available, else by text+timestamp
+        if url:
+            cur.execute("SELECT 1 FROM social_media WHERE url=? LIMIT 1", (url,))
+            if cur.fetchone():
+                continue
+        else:
+            cur.execute("SELECT 1 FROM social_media WHERE text=? AND timestamp=? LIMIT 1", (p.get("text"), p.get("timestamp")))
+            if cur.fetchone():
+                continue
+        # searches have no time filter: old posts come back after their month was archived
+        if partitions.is_archived(cur, "social_media", partitions.dedupe_key(url, p.get("text"), p.get("timestamp"))):
+            continue
+
+        cur.execute("""
+            INSERT INTO social_media (source, text, timestamp, url, hazard, urgency, latitude, longitude, location_name)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            p.get("source"),
+            p.get("text"),
+            p.get("timestamp"),
+            p.get("url"),
+            p.get("hazard"),
+            p.get("urgency"),
+            p.get("latitude"),
+            p.get("longitude"),
+            p.get("location_name")
+        ))
+        inserted += 1
+    conn.commit()
+    conn.close()
+    recent_posts.refresh(get_db, force=True)
+    return inserted
+
+@app.on_event("startup")
+def prewarm_social_clients():
+    # SOCIAL_PREWARM=1: build the SDK clients in a background thread instead of on the first refresh
+    if social_fetcher.prewarm_enabled():
+        social_fetcher.prewarm()
+
+@app.on_event("startup")
+def warm_recent_posts():
+    try:
+        recent_posts.refresh(get_db, force=True)
+    except sqlite3.Error as e:
+        print("recent posts warm-up error:", e)   # e.g. fresh DB without tables; first read retries
+
+@app.get("/social/clients")
+def social_clients(_user = Depends(require_roles("ADMIN"))):
+    return social_fetcher.clients.health()
+
+@app.get("/social/prefilter/stats")
+def social_prefilter_stats(_user = Depends(require_roles("OFFICIAL","ANALYST","ADMIN"))):
+    import prefilter
+    return prefilter.stats()
+
+recent_posts = RecentPosts()
+
 @app.get("/social/list")
-def list_social(limit: int = 100, _user = Depends(require_roles("OFFICIAL","ANALYST"))):
-    conn = get_db(); cur = conn.cursor()
-    cur.execute("SELECT id, source, text, timestamp, url, hazard, urgency, latitude, longitude, location_name FROM social_media ORDER BY timestamp DESC LIMIT ?", (limit,))
-    cols = [d[0] for d in cur.description]
-    rows = cur.fetchall(); conn.close()
-    return [dict(zip(cols, r)) for r in rows]
+def list_social(limit: int = 100, hazard: str | None = None, urgency: str | None = None,
+                since: str | None = None, until: str | None = None,
+                _user = Depends(require_roles("OFFICIAL","ANALYST"))):
+    # newest posts come from the in-memory ring (pre-serialised rows); DB only if it can't answer
+    if since is None and until is None:
+        recent_posts.refresh(get_db)
+        body = recent_posts.list_json(limit, hazard, urgency)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+    where, params = [], []
+    if hazard is not None:
+        where.append("hazard = ?"); params.append(hazard)
+    if urgency is not None:
+        where.append("urgency = ?"); params.append(urgency)
+    if since is not None:
+        where.append("timestamp >= ?"); params.append(since)
+    if until is not None:
+        where.append("timestamp < ?"); params.append(until)
+    sql = ("SELECT id, source, text, timestamp, url, hazard, urgency, latitude, longitude, location_name FROM {table} "
+           + (f"WHERE {' AND '.join(where)} " if where else "") + "ORDER BY timestamp DESC LIMIT ?")
+    if since is None and until is None:
+        conn = get_db(); cur = conn.cursor()
+        cur.execute(sql.format(table="social_media"), (*params, limit))
+        cols = [d[0] for d in cur.description]
+        rows = cur.fetchall(); conn.close()
+        return [dict(zip(cols, r)) for r in rows]
+    # time-bounded: only the monthly partitions overlapping [since, until] are attached
+    rows = []
+    for conn in partitions.iter_connections(DATABASE, since, until, factory=profiler.TracedConnection):
+        cur = conn.cursor()
+        cur.execute(sql.format(table="social_media_all"), (*params, limit))
+        cols = [d[0] for d in cur.description]
+        rows += [dict(zip(cols, r)) for r in cur.fetchall()]
+    rows.sort(key=lambda r: r["timestamp"] or "", reverse=True)
+    return rows[:limit]
+
+# ================== Analytics: exports + rollup cube ==================
+@app.get("/export/{table}")
+def export_table(table: str, format: str = "csv", since: str | None = None, until: str | None = None,
+                 hazard: str | None = None, _user = Depends(require_roles("OFFICIAL","ANALYST"))):
+    # streamed chunk by chunk from a fetchmany() cursor; arrow/parquet need pyarrow installed
+    # everything that can fail is checked here, before StreamingResponse commits to a 200
+    try:
+        cols = exporter.check(table, format, DATABASE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportError:
+        raise HTTPException(status_code=501, detail=f"{format} export needs pyarrow (pip install pyarrow)")
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    body = exporter.stream(table, format, since=since, until=until, hazard=hazard,
+                           db_path=DATABASE, factory=profiler.TracedConnection, cols=cols)
+    filename = f"{table}.{exporter.EXTENSIONS[format]}"
+    return StreamingResponse(body, media_type=exporter.MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+cube = RollupCube()
+
+@app.on_event("startup")
+def warm_cube():
+    # first load reads every row (archived partitions too) -> background thread, queries wait for it
+    def load():
+        try:
+            cube.refresh(get_db, force=True)
+        except sqlite3.Error as e:
+            print("cube warm-up error:", e)
+    threading.Thread(target=load, name="cube-warm", daemon=True).start()
+
+def _csv_param(value: str | None):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+@app.get("/analytics/cube")
+def query_cube(group_by: str = "hazard", hazard: str | None = None, source: str | None = None,
+               urgency: str | None = None, since: str | None = None, until: str | None = None,
+               bbox: str | None = None, top: int | None = None,
+               _user = Depends(require_roles("OFFICIAL","ANALYST"))):
+    # e.g. ?group_by=hazard,day&source=Twitter,Reddit&since=2025-09-01&bbox=8,68,23,90
+    filters = {d: _csv_param(v) for d, v in (("hazard", hazard), ("source", source), ("urgency", urgency)) if v}
+    try:
+        box = [float(v) for v in _csv_param(bbox)] or None
+        if box is not None and len(box) != 4:
+            raise ValueError("bbox must be min_lat,min_lon,max_lat,max_lon")
+        cube.refresh(get_db)
+        return cube.query(_csv_param(group_by), filters=filters, since=since, until=until, bbox=box, top=top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analytics/cube/stats")
+def cube_stats(_user = Depends(require_roles("OFFICIAL","ANALYST","ADMIN"))):
+    return cube.stats()
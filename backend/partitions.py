@@ -0,0 +1,317 @@
+# partitions.py
+# Monthly partition files for social_media (and optionally reports).
+#
+# coastal.db stays the hot file: the current month (+ PARTITION_HOT_MONTHS - 1 before it)
+# and every writer keep using it as before. `archive` moves older months into one file
+# per month, partitions/<table>_YYYY_MM.db, which is then sealed read-only (and gzipped
+# with PARTITION_COMPRESS=1). Retention = deleting old files (`drop`).
+#
+# Reads that need older data go through connect()/iter_connections(): only the months a
+# [since, until] range touches are ATTACHed, behind a temp view <table>_all
+# (hot rows UNION ALL the partitions), so a "last 24h" query never opens an old file.
+#
+#   python partitions.py archive          # cron this (daily is plenty)
+#   python partitions.py list
+#   python partitions.py drop 2024-01     # delete partitions older than Jan 2024
+import os, sys, gzip, shutil, sqlite3, threading
+from datetime import datetime, timezone
+
+DATABASE = "coastal.db"
+PARTITION_DIR = os.getenv("PARTITION_DIR", "partitions")
+PARTITIONED_TABLES = tuple(t for t in os.getenv("PARTITION_TABLES", "social_media").split(",") if t)
+HOT_MONTHS = int(os.getenv("PARTITION_HOT_MONTHS", "2"))
+COMPRESS = os.getenv("PARTITION_COMPRESS", "0") == "1"
+CACHE_DIR = os.getenv("PARTITION_CACHE_DIR", os.path.join(PARTITION_DIR, ".cache"))   # unpacked .gz files
+MAX_ATTACH = 9   # SQLite allows 10 attached databases per connection; keep one spare
+# dedupe key of a row (same as the fetchers' url, else text+timestamp); archived keys stay in
+# the hot file (archived_keys) so a re-fetched old post is still recognised after archiving
+DEDUPE_KEYS = {"social_media": "COALESCE(NULLIF(url, ''), text || char(31) || timestamp)"}
+
+_lock = threading.Lock()
+
+
+# ================== Months & files ==================
+def _month(ts: str) -> str:
+    """'2025-09-14T10:00:00Z' / '2025-09-14 10:00:00' / '2025-09' -> '2025_09'."""
+    return ts[:7].replace("-", "_")
+
+
+def _next_month(month: str) -> str:
+    y, m = int(month[:4]), int(month[5:7])
+    return f"{y + m // 12:04d}_{m % 12 + 1:02d}"
+
+
+def _hot_cutoff(now: datetime = None) -> str:
+    """First month that stays in the hot file."""
+    now = now or datetime.now(timezone.utc)
+    y, m = now.year, now.month - (HOT_MONTHS - 1)
+    while m < 1:
+        y, m = y - 1, m + 12
+    return f"{y:04d}_{m:02d}"
+
+
+def _path(table: str, month: str) -> str:
+    return os.path.join(PARTITION_DIR, f"{table}_{month}.db")
+
+
+def partitions(table: str) -> dict:
+    """{month: file path (.db or .db.gz)} for the partitions on disk, oldest first."""
+    out = {}
+    prefix = f"{table}_"
+    try:
+        names = sorted(os.listdir(PARTITION_DIR))
+    except FileNotFoundError:
+        return out
+    for name in names:
+        base = name[:-3] if name.endswith(".gz") else name
+        month = base[len(prefix):-3]
+        if base.startswith(prefix) and base.endswith(".db") and len(month) == 7 and month[4] == "_":
+            out[month] = os.path.join(PARTITION_DIR, name)
+    return out
+
+
+def _seal(path: str) -> str:
+    """Make a finished partition read-only (and gzip it if configured)."""
+    if COMPRESS:
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+        path += ".gz"
+    os.chmod(path, 0o444)
+    return path
+
+
+def _unseal(path: str) -> str:
+    """Writable .db for a (possibly gzipped) sealed partition."""
+    os.chmod(path, 0o644)
+    if path.endswith(".gz"):
+        db = path[:-3]
+        with gzip.open(path, "rb") as src, open(db + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(db + ".tmp", db)
+        os.remove(path)
+        path = db
+    return path
+
+
+def _readable(path: str) -> str:
+    """Attachable file for a partition; .gz ones are unpacked once into CACHE_DIR."""
+    if not path.endswith(".gz"):
+        return path
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    db = os.path.join(CACHE_DIR, os.path.basename(path)[:-3])
+    src_mtime = os.stat(path).st_mtime
+    if not os.path.exists(db) or os.stat(db).st_mtime < src_mtime:
+        tmp = f"{db}.{os.getpid()}.{threading.get_ident()}.tmp"   # concurrent readers unpack side by side
+        with gzip.open(path, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp, db)
+    return db
+
+
+def _columns(conn, schema: str, table: str) -> list:
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def dedupe_key(url, text, timestamp):
+    """Python side of DEDUPE_KEYS."""
+    if url:
+        return url
+    return None if text is None or timestamp is None else f"{text}\x1f{timestamp}"
+
+
+def is_archived(cur, table: str, key) -> bool:
+    """True if a row with this dedupe key was moved out of the hot file."""
+    if key is None:
+        return False
+    try:
+        cur.execute("SELECT 1 FROM archived_keys WHERE tbl = ? AND key = ?", (table, key))
+    except sqlite3.OperationalError:
+        return False   # nothing archived yet
+    return cur.fetchone() is not None
+
+
+def _record_keys(conn, table: str, source: str, where: str = "1", params=()):
+    conn.execute("CREATE TABLE IF NOT EXISTS main.archived_keys (tbl TEXT, key TEXT, PRIMARY KEY (tbl, key)) WITHOUT ROWID")
+    conn.execute(f"INSERT OR IGNORE INTO main.archived_keys (tbl, key) SELECT ?, k FROM "
+                 f"(SELECT {DEDUPE_KEYS[table]} AS k FROM {source} WHERE {where}) WHERE k IS NOT NULL", (table, *params))
+
+
+def _backfill_keys(conn, table: str):
+    """Keys of partitions archived before archived_keys existed (runs once per table)."""
+    have = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='archived_keys'").fetchone()
+    if have and conn.execute("SELECT 1 FROM archived_keys WHERE tbl = ? LIMIT 1", (table,)).fetchone():
+        return
+    for month, path in partitions(table).items():
+        uri = "file:" + os.path.abspath(_readable(path)) + "?mode=ro"
+        conn.execute("ATTACH DATABASE ? AS old", (uri,))
+        try:
+            _record_keys(conn, table, f"old.{table}")
+            conn.commit()
+        finally:
+            conn.execute("DETACH DATABASE old")
+
+
+# ================== Archiving ==================
+def archive(db_path: str = DATABASE, tables=PARTITIONED_TABLES, now: datetime = None) -> dict:
+    """Move rows of months before the hot cutoff out of the hot file; {table: {month: rows}}."""
+    cutoff = _hot_cutoff(now)
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    moved = {}
+    with _lock:
+        conn = sqlite3.connect(db_path)
+        try:
+            for table in tables:
+                schema_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+                if not schema_sql:
+                    continue
+                hot_cols = _columns(conn, "main", table)
+                if table in DEDUPE_KEYS:
+                    _backfill_keys(conn, table)
+                months = [r[0] for r in conn.execute(
+                    f"SELECT DISTINCT replace(substr(timestamp, 1, 7), '-', '_') FROM {table} "
+                    f"WHERE timestamp IS NOT NULL AND timestamp < ? AND timestamp GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*'",
+                    (cutoff.replace("_", "-"),))]
+                for month in sorted(months):
+                    moved.setdefault(table, {})[month] = _archive_month(conn, table, month, schema_sql[0], hot_cols)
+        finally:
+            conn.close()
+    return moved
+
+
+def _archive_month(conn, table: str, month: str, schema_sql: str, hot_cols: list) -> int:
+    existing = partitions(table).get(month)
+    path = _unseal(existing) if existing else _path(table, month)
+    if not existing:
+        new = sqlite3.connect(path)
+        new.execute(schema_sql)
+        new.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table}(timestamp)")
+        new.commit()
+        new.close()
+    start, end = month.replace("_", "-"), _next_month(month).replace("_", "-")
+    conn.execute("ATTACH DATABASE ? AS part", (path,))
+    try:
+        part_cols = _columns(conn, "part", table)
+        for col in hot_cols:
+            if col not in part_cols:   # hot table gained a column (ALTER TABLE) since this file was made
+                conn.execute(f"ALTER TABLE part.{table} ADD COLUMN {col}")
+        cols = ", ".join(hot_cols)
+        where = "timestamp >= ? AND timestamp < ?"
+        # one transaction over both files: rows are either in the hot file or in the partition
+        cur = conn.execute(f"INSERT INTO part.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE {where}", (start, end))
+        n = cur.rowcount
+        if table in DEDUPE_KEYS:
+            _record_keys(conn, table, f"main.{table}", where, (start, end))
+        conn.execute(f"DELETE FROM main.{table} WHERE {where}", (start, end))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE part")
+    v = sqlite3.connect(path)
+    v.execute("VACUUM")
+    v.close()
+    _seal(path)
+    print(f"archived {n} {table} rows of {start} -> {path}")
+    return n
+
+
+def drop(before: str, tables=PARTITIONED_TABLES) -> list:
+    """Delete partitions for months before `before` (e.g. '2024-01'): retention without DELETE/VACUUM."""
+    limit = _month(before)
+    removed = []
+    with _lock:
+        for table in tables:
+            for month, path in partitions(table).items():
+                if month < limit:
+                    os.chmod(path, 0o644)
+                    os.remove(path)
+                    cached = os.path.join(CACHE_DIR, os.path.basename(path)[:-3])
+                    if path.endswith(".gz") and os.path.exists(cached):
+                        os.remove(cached)
+                    removed.append(path)
+    return removed
+
+
+def info(tables=PARTITIONED_TABLES) -> dict:
+    return {
+        table: [{"month": m.replace("_", "-"), "file": p, "bytes": os.path.getsize(p), "compressed": p.endswith(".gz")}
+                for m, p in partitions(table).items()]
+        for table in tables
+    }
+
+
+# ================== Query fan-out ==================
+def _months_for(table: str, since: str = None, until: str = None) -> list:
+    """Partition months overlapping [since, until], newest first."""
+    lo = _month(since) if since else None
+    hi = _month(until) if until else None
+    return [m for m in sorted(partitions(table), reverse=True) if (lo is None or m >= lo) and (hi is None or m <= hi)]
+
+
+def _connect(db_path, months_by_table: dict, include_hot: bool, factory, **kwargs):
+    conn = sqlite3.connect(db_path, uri=True, factory=factory, **kwargs)
+    for table, months in months_by_table.items():
+        hot_cols = _columns(conn, "main", table)
+        if not hot_cols:
+            continue
+        selects = [f"SELECT {', '.join(hot_cols)} FROM main.{table}"] if include_hot else []
+        for month in months:
+            alias = f"p_{table}_{month}"   # one file per (table, month)
+            uri = "file:" + os.path.abspath(_readable(partitions(table)[month])) + "?mode=ro"
+            conn.execute("ATTACH DATABASE ? AS " + alias, (uri,))
+            have = set(_columns(conn, alias, table))
+            cols = ", ".join(c if c in have else f"NULL AS {c}" for c in hot_cols)
+            selects.append(f"SELECT {cols} FROM {alias}.{table}")
+        if not selects:   # chunk without this table's partitions
+            selects = [f"SELECT {', '.join(hot_cols)} FROM main.{table} WHERE 0"]
+        conn.execute(f"CREATE TEMP VIEW {table}_all AS " + " UNION ALL ".join(selects))
+    return conn
+
+
+def connect(db_path: str = DATABASE, since: str = None, until: str = None,
+            tables=PARTITIONED_TABLES, factory=sqlite3.Connection, **kwargs):
+    """
+    Connection to the hot file with `<table>_all` views covering [since, until]
+    (ISO date/timestamp text, either may be None). Still filter on timestamp in the
+    query itself; the range only decides which monthly files get attached.
+    Raises ValueError if the range needs more files than one connection can attach;
+    use iter_connections() for those. Extra kwargs go to sqlite3.connect().
+    """
+    months = {t: _months_for(t, since, until) for t in tables}
+    if sum(len(ms) for ms in months.values()) > MAX_ATTACH:
+        raise ValueError(f"range spans more than {MAX_ATTACH} partition files; use iter_connections()")
+    return _connect(db_path, months, True, factory, **kwargs)
+
+
+def iter_connections(db_path: str = DATABASE, since: str = None, until: str = None,
+                     tables=PARTITIONED_TABLES, factory=sqlite3.Connection, **kwargs):
+    """Like connect() for any range: yields connections newest first, each attaching at
+    most MAX_ATTACH files; hot rows are only in the first one. Each is closed after use."""
+    files = sorted(((m, t) for t in tables for m in _months_for(t, since, until)), reverse=True)
+    chunks = [files[i:i + MAX_ATTACH] for i in range(0, len(files), MAX_ATTACH)] or [[]]
+    for i, chunk in enumerate(chunks):
+        wanted = {t: [m for m, tt in chunk if tt == t] for t in tables}
+        conn = _connect(db_path, wanted, i == 0, factory, **kwargs)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "archive":
+        moved = archive(sys.argv[2] if len(sys.argv) > 2 else DATABASE)
+        print(moved or "nothing to archive")
+    elif cmd == "list":
+        for table, parts in info().items():
+            for p in parts:
+                print(f"{table:<14} {p['month']}  {p['bytes'] / 1024:10,.0f} KB  {p['file']}")
+    elif cmd == "drop" and len(sys.argv) > 2:
+        print("\n".join(drop(sys.argv[2])) or "nothing to drop")
+    else:
+        print("usage: python partitions.py archive [db] | list | drop YYYY-MM")
+        sys.exit(1)
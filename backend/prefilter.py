@@ -0,0 +1,202 @@
+# prefilter.py
+# Cheap relevance / language pre-filter in front of classification, storage and geocoding.
+#
+# Most fetched posts are noise (football banter, K-pop, "Tsunami Remix!"), but every
+# one of them used to be classified, stored, counted in hotspots and maybe geocoded.
+# Cascade, cheapest first:
+#   1. retweet-only shells ("RT @user: ...") and posts with no words left -> drop
+#   2. language id (Unicode script counts + stop-word votes) -> drop languages we don't serve
+#   3. hazard keyword gate (one compiled regex)               -> drop if no hazard term at all
+#   4. a hazard term passes by default; only posts that also hit noise terms (or hashtag
+#      soup) must reach PREFILTER_MIN_SCORE on context / place (gazetteer) / urgency signals
+#   5. noisy borderline posts only: learned classifier (if trained) decides
+# Counters in `stats()` show how much downstream work was skipped.
+import os, re, threading
+from collections import Counter
+
+import geoparser
+import text_classifier
+
+ALLOWED_LANGS = set(os.getenv("PREFILTER_LANGS", "en,hi,bn,pa,gu,or,ta,te,kn,ml,und").split(","))
+MIN_SCORE = float(os.getenv("PREFILTER_MIN_SCORE", "0.35"))
+BORDERLINE = (0.2, 0.5)   # noisy posts scoring in this range are checked by the learned model when available
+
+# ================== Language id ==================
+_SCRIPTS = (
+    (0x0900, 0x097F, "hi"), (0x0980, 0x09FF, "bn"), (0x0A00, 0x0A7F, "pa"), (0x0A80, 0x0AFF, "gu"),
+    (0x0B00, 0x0B7F, "or"), (0x0B80, 0x0BFF, "ta"), (0x0C00, 0x0C7F, "te"), (0x0C80, 0x0CFF, "kn"),
+    (0x0D00, 0x0D7F, "ml"), (0x0600, 0x06FF, "ar"), (0x0400, 0x04FF, "ru"), (0x0E00, 0x0E7F, "th"),
+    (0x3040, 0x30FF, "ja"), (0x4E00, 0x9FFF, "zh"), (0x1100, 0x11FF, "ko"), (0xAC00, 0xD7AF, "ko"),
+)
+_STOPWORDS = {
+    "en": {"the", "and", "is", "are", "in", "of", "to", "for", "on", "with", "near", "this", "was", "at", "from", "now"},
+    "hi": {"hai", "hain", "ke", "ki", "ka", "ko", "se", "mein", "main", "nahi", "aur", "bhi", "saath", "kya", "ho"},
+    "fr": {"le", "la", "les", "des", "est", "et", "une", "que", "pas", "pour", "dans", "qui", "ça", "mais", "du", "je", "j"},
+    "es": {"el", "los", "las", "del", "que", "por", "para", "una", "con", "muy", "pero", "como", "está", "y"},
+    "pt": {"não", "uma", "com", "para", "mais", "muito", "você", "isso", "os", "das", "dos", "ao", "em"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "ein", "eine", "mit", "auf", "ich", "sie", "es"},
+    "id": {"yang", "dan", "di", "ini", "itu", "dengan", "untuk", "tidak", "ada", "dari", "akan", "saya"},
+}
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+_STRIP_RE = re.compile(r"https?://\S+|[@#]\w+|^RT\b", re.UNICODE)
+_MENTION_URL_RE = re.compile(r"https?://\S+|@\w+", re.UNICODE)
+
+
+def detect_language(text: str) -> str:
+    letters = Counter()
+    for ch in text:
+        if ch.isalpha():
+            cp = ord(ch)
+            if cp < 0x0250:
+                letters["latin"] += 1
+                continue
+            for lo, hi, lang in _SCRIPTS:
+                if lo <= cp <= hi:
+                    letters[lang] += 1
+                    break
+    total = sum(letters.values())
+    if not total:
+        return "und"
+    script, n = letters.most_common(1)[0]
+    if script != "latin" and n >= 0.3 * total:
+        return script
+    words = _WORD_RE.findall(text.lower())
+    votes = Counter({lang: sum(w in sw for w in words) for lang, sw in _STOPWORDS.items()})
+    lang, best = votes.most_common(1)[0]
+    if best == 0 or list(votes.values()).count(best) > 1:
+        return "und"   # too short / ambiguous -> let the relevance stages decide
+    return lang
+
+
+# ================== Relevance ==================
+_HAZARD_TERMS = (
+    "flood", "inundat", "waterlog", "cyclone", "cyclonic", "hurricane", "typhoon", "storm surge", "tsunami",
+    "high tide", "tidal", "wave", "swell", "rip current", "sea erosion", "kallakkadal", "earthquake", "tremor",
+    "baadh", "toofan", "तूफान", "बाढ़", "चक्रवात", "सुनामी", "வெள்ளம்", "புயல்", "சுனாமி",
+    "വെള്ളപ്പൊക്ക", "ചുഴലിക്കാറ്റ", "സുനാമി", "বন্যা", "ঘূর্ণিঝড়", "వరద", "తుఫాను",
+)
+_CONTEXT_TERMS = (
+    "rescue", "evacuat", "stranded", "warning", "alert", "imd", "incois", "ndrf", "landfall", "coast",
+    "fishermen", "sea", "beach", "rain", "water level", "relief", "shelter", "damage", "submerged", "boats",
+    "landslide", "overflow", "dam",
+)
+_NOISE_TERMS = (
+    "remix", "song", "album", "concert", "box office", "occupancy", "movie", "trailer", "crypto", "token",
+    "airdrop", "stock", "match", "goal", "football", "political", "election", "vote", "fans", "fanfic",
+    "kpop", "k-pop", "giveaway", "meme", "emotional", "inbox", "roller coaster", "gamesir", "controller",
+    "cyclone 2", "tmr",
+)
+# figurative uses of a hazard word ("political waves", "a wave of support", "tsunami de haine");
+# a post whose only hazard terms are these is noise
+_FIGURATIVE_RE = re.compile(r"\b(?:political|election|electoral|poll|saffron|modi)\s+waves?\b"
+                            r"|\bwaves?\s+of\b|\b(?:tsunami|flood)s?\s+(?:of|de|d')\s")
+
+
+def _terms_re(terms):
+    # leading word boundary only, so stems still match ("flood" -> "flooding", not "bloodflood")
+    return re.compile(r"\b(?:" + "|".join(re.escape(t) for t in terms) + ")")
+
+
+_HAZARD_RE = _terms_re(_HAZARD_TERMS)
+_CONTEXT_RE = _terms_re(_CONTEXT_TERMS)
+_NOISE_RE = _terms_re(_NOISE_TERMS)
+_URGENT_RE = _terms_re(("urgent", "danger", "emergency", "critical", "immediately", "now ", "breaking", "live"))
+
+
+def figurative(text: str) -> bool:
+    """True if the post's hazard terms are all figurative uses ("political waves are rising")."""
+    t = _MENTION_URL_RE.sub(" ", (text or "").lower()) + " "
+    return bool(_HAZARD_RE.search(t)) and not _HAZARD_RE.search(_FIGURATIVE_RE.sub(" ", t))
+
+
+def _signals(text: str):
+    """(relevance score, noisy) for one post; score 0.0 = no hazard term."""
+    t = _MENTION_URL_RE.sub(" ", text.lower()) + " "
+    if not _HAZARD_RE.search(t):
+        return 0.0, False
+    if figurative(text):
+        return 0.0, True
+    noise = len(set(_NOISE_RE.findall(t)))
+    soup = t.count("#") > 5
+    score = 0.3
+    score += min(0.3, 0.15 * len(set(_CONTEXT_RE.findall(t))))
+    score += 0.15 if geoparser.parse(text) else 0.0   # same gazetteer the ingest geoparser uses
+    score += 0.1 if _URGENT_RE.search(t) or "🚨" in t else 0.0
+    score -= 0.25 * noise
+    if soup:
+        score -= 0.1
+    return max(0.0, min(1.0, score)), bool(noise or soup)
+
+
+def relevance_score(text: str) -> float:
+    return _signals(text)[0]
+
+
+# ================== Pipeline stage ==================
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def check(text: str):
+    """(keep, reason, score) for one post, without the model stage."""
+    text = text or ""
+    if text.startswith("RT @") or not _WORD_RE.search(_STRIP_RE.sub(" ", text)):
+        return False, "retweet_or_empty", 0.0
+    lang = detect_language(_STRIP_RE.sub(" ", text))
+    if lang not in ALLOWED_LANGS:
+        return False, f"language:{lang}", 0.0
+    score, noisy = _signals(text)
+    if score == 0.0 and not noisy:
+        return False, "no_hazard_term", score
+    # a hazard term alone is enough ("Flooding in Velachery, help needed"); the threshold
+    # only decides posts that also look like noise ("Tsunami Remix!", "flood of fans")
+    if noisy and score < MIN_SCORE:
+        return False, "noise", score
+    return True, "relevant", score
+
+
+def filter_posts(posts, text_key: str = "text"):
+    """Keep only likely hazard posts; each kept post gets a `relevance` score."""
+    results = [check(p.get(text_key)) for p in posts]
+
+    # model stage: only noise-flagged posts with borderline scores, in one batch
+    border = [i for i, (_, reason, s) in enumerate(results)
+              if reason == "noise" and BORDERLINE[0] <= s < BORDERLINE[1]]
+    if border and text_classifier.get_model() is not None:
+        preds = text_classifier.classify_batch([posts[i].get(text_key) for i in border])
+        for i, (hazard, _) in zip(border, preds):
+            if hazard == "Uncategorized":
+                results[i] = (False, "model_noise", results[i][2])
+            elif hazard:
+                results[i] = (True, "model_relevant", results[i][2])
+        _count({"model_checks": len(border)})
+
+    kept = []
+    reasons = Counter()
+    for p, (keep, reason, score) in zip(posts, results):
+        reasons[reason.split(":")[0]] += 1
+        if keep:
+            p["relevance"] = round(score, 3)
+            kept.append(p)
+    _count({"seen": len(posts), "passed": len(kept), "dropped": len(posts) - len(kept),
+            **{f"reason_{r}": n for r, n in reasons.items()}})
+    return kept
+
+
+def record(keep: bool, reason: str):
+    """Count a single-post decision made with check() (e.g. /social/ingest)."""
+    _count({"seen": 1, "passed" if keep else "dropped": 1, f"reason_{reason.split(':')[0]}": 1})
+
+
+def _count(values: dict):
+    with _counts_lock:
+        _counts.update(values)
+
+
+def stats():
+    with _counts_lock:
+        c = dict(_counts)
+    seen = c.get("seen", 0)
+    # every dropped post is one classification + one insert + one possible geocode call not made
+    return {**c, "drop_rate": round(c.get("dropped", 0) / seen, 3) if seen else 0.0,
+            "downstream_calls_saved": c.get("dropped", 0)}
@@ -0,0 +1,306 @@
+# profiler.py
+# Opt-in request profiling + automatic slow-request capture.
+#
+# - ADMIN sends `X-Profile: 1` header (or `?profile=1`) -> that single request is
+#   run under a sampling profiler and a folded-stack flamegraph is stored.
+# - Every request is traced cheaply (SQL text, rows, timings). If it takes longer
+#   than SLOW_REQUEST_MS, the trace is written to the capture ring.
+# - Captures live in a fixed number of slots on disk (ring), so it is safe to
+#   leave this enabled in production.
+# - Timings cover the whole response, streamed bodies included; captures are written
+#   from a worker thread after the last chunk, never on the event loop.
+import os, sys, json, time, asyncio, threading, sqlite3, contextvars
+from collections import Counter
+from datetime import datetime, timezone
+
+# ================== Config ==================
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "50"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+MAX_QUERIES_PER_TRACE = 200   # a runaway loop should not blow up memory
+MAX_SQL_CHARS = 2000
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+# ================== Request trace ==================
+class RequestTrace:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.queries = []
+        self.dropped_queries = 0
+        self.sql_ms = 0.0
+        # the event loop thread is shared with every other request: its samples are labelled
+        self.loop_thread = threading.get_ident()
+        self.thread_ids = {self.loop_thread}
+        self.closed = False
+
+    def thread_labels(self) -> dict:
+        return {tid: "event-loop" if tid == self.loop_thread else "worker" for tid in self.thread_ids}
+
+    def add_query(self, sql: str, ms: float):
+        if self.closed:
+            return None
+        self.sql_ms += ms
+        if len(self.queries) >= MAX_QUERIES_PER_TRACE:
+            self.dropped_queries += 1
+            return None
+        q = {"sql": " ".join(sql.split())[:MAX_SQL_CHARS], "ms": round(ms, 3), "rows": 0}
+        self.queries.append(q)
+        return q
+
+    def summary(self, total_ms: float, status_code: int):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": status_code,
+            "timings_ms": {
+                "total": round(total_ms, 3),
+                "sql": round(self.sql_ms, 3),
+                "app": round(max(total_ms - self.sql_ms, 0.0), 3),
+            },
+            "query_count": len(self.queries) + self.dropped_queries,
+            "rows_total": sum(q["rows"] for q in self.queries),
+            "queries": self.queries,
+        }
+
+
+class TracedCursor(sqlite3.Cursor):
+    """sqlite3 cursor that reports SQL text, time and fetched rows to the active trace."""
+
+    _q = None
+
+    def execute(self, sql, parameters=()):
+        trace = _current_trace.get()
+        if trace is None:
+            return super().execute(sql, parameters)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._q = trace.add_query(sql, (time.perf_counter() - t0) * 1000)
+
+    def executemany(self, sql, seq_of_parameters):
+        trace = _current_trace.get()
+        if trace is None:
+            return super().executemany(sql, seq_of_parameters)
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._q = trace.add_query(sql, (time.perf_counter() - t0) * 1000)
+            if self._q is not None and self.rowcount > 0:
+                self._q["rows"] = self.rowcount
+
+    def _count(self, n):
+        if self._q is not None:
+            self._q["rows"] += n
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class TracedConnection(sqlite3.Connection):
+    """Use as `sqlite3.connect(..., factory=TracedConnection)`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        trace = _current_trace.get()
+        if trace is not None:
+            # sync endpoints run in the threadpool; remember the worker so the sampler follows it
+            trace.thread_ids.add(threading.get_ident())
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# ================== Sampling profiler ==================
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class StackSampler(threading.Thread):
+    """Samples Python stacks of all threads every `interval` seconds.
+
+    Samples are kept per thread; `folded(thread_ids)` returns the flamegraph in
+    the folded format understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True, name="request-profiler")
+        self.interval = interval
+        self.samples = {}   # thread id -> Counter(folded stack)
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.samples.setdefault(tid, Counter())[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self, thread_ids, labels=None) -> str:
+        """labels: thread id -> root frame put above that thread's stacks (e.g. event-loop / worker)."""
+        merged = Counter()
+        for tid in thread_ids:
+            label = (labels or {}).get(tid)
+            for stack, n in self.samples.get(tid, {}).items():
+                merged[f"{label};{stack}" if label else stack] += n
+        return "\n".join(f"{stack} {n}" for stack, n in merged.most_common())
+
+
+# ================== On-disk capture ring ==================
+class CaptureRing:
+    """Fixed number of capture slots on disk; the oldest capture is overwritten."""
+
+    def __init__(self, directory: str, size: int):
+        self.directory = directory
+        self.size = max(1, size)
+        self._lock = threading.Lock()
+        self._seq = None
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"capture_{seq % self.size:04d}.json")
+
+    def _next_seq(self) -> int:
+        if self._seq is None:
+            # resume numbering after a restart from what is already on disk
+            self._seq = max((c.get("id", -1) for c in self.list()), default=-1)
+        self._seq += 1
+        return self._seq
+
+    def reserve(self) -> int:
+        """Capture id handed out before the capture is written (e.g. in a response header)."""
+        with self._lock:
+            return self._next_seq()
+
+    def write(self, kind: str, payload: dict, seq: int = None) -> int:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if seq is None:
+                seq = self._next_seq()
+            record = {"id": seq, "kind": kind, "created_at": datetime.now(timezone.utc).isoformat(), **payload}
+            path = self._path(seq)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            os.replace(tmp, path)
+            return seq
+
+    def get(self, seq: int):
+        try:
+            with open(self._path(seq), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return record if record.get("id") == seq else None
+
+    def list(self):
+        out = []
+        if not os.path.isdir(self.directory):
+            return out
+        for name in os.listdir(self.directory):
+            if not (name.startswith("capture_") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    c = json.load(f)
+            except (OSError, ValueError):
+                continue
+            out.append({k: c.get(k) for k in ("id", "kind", "created_at", "method", "path", "status")}
+                       | {"total_ms": (c.get("timings_ms") or {}).get("total")})
+        out.sort(key=lambda c: c["id"], reverse=True)
+        return out
+
+
+ring = CaptureRing(PROFILE_DIR, PROFILE_RING_SIZE)
+
+
+# ================== Middleware entry point ==================
+def wants_profile(request) -> bool:
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return bool(flag) and flag.lower() not in ("0", "false", "no")
+
+
+async def handle(request, call_next, is_admin):
+    """Run one request with tracing; profile it if an ADMIN asked for it."""
+    trace = RequestTrace(request.method, request.url.path)
+    token = _current_trace.set(trace)
+    sampler = None
+    if wants_profile(request) and is_admin(request):
+        sampler = StackSampler(SAMPLE_INTERVAL_MS / 1000.0)
+        sampler.start()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        trace.closed = True
+        if sampler is not None:
+            sampler.stop()
+        raise
+    finally:
+        _current_trace.reset(token)
+
+    # headers go out before the body: capture ids are reserved now, written once the body is sent
+    capture_id = None
+    if sampler is not None:
+        capture_id = await asyncio.to_thread(ring.reserve)
+        response.headers["X-Profile-Capture"] = str(capture_id)
+    elif (time.perf_counter() - trace.started) * 1000 > SLOW_REQUEST_MS:
+        capture_id = await asyncio.to_thread(ring.reserve)
+        response.headers["X-Slow-Capture"] = str(capture_id)
+    response.body_iterator = _finish_after(response.body_iterator, trace, sampler, response.status_code, capture_id)
+    return response
+
+
+async def _finish_after(body, trace, sampler, status_code, capture_id):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        trace.closed = True
+        if sampler is not None:
+            await asyncio.to_thread(sampler.stop)
+            await asyncio.to_thread(ring.write, "profile", {
+                **trace.summary(total_ms, status_code),
+                "samples": sampler.sample_count,
+                "sample_interval_ms": SAMPLE_INTERVAL_MS,
+                "folded": sampler.folded(trace.thread_ids, trace.thread_labels()),
+            }, capture_id)
+        elif capture_id is not None or total_ms > SLOW_REQUEST_MS:
+            # slow only while streaming: no header any more, the capture is still listed
+            await asyncio.to_thread(ring.write, "slow", trace.summary(total_ms, status_code), capture_id)
@@ -0,0 +1,181 @@
+# recent_posts.py
+# In-memory ring buffer of the newest social posts, serving /social/list.
+#
+# Nearly every /social/list poll asks for the newest 100 posts, which used to be an
+# ORDER BY timestamp query + one dict per row + JSON encoding each time. Here the newest
+# RECENT_POSTS_CAPACITY posts (same order as the query: timestamp text, newest first)
+# sit in a fixed array of __slots__ records, each holding its row already serialised,
+# so a response is a filtered walk + one bytes join.
+#
+# New rows are picked up by id (refresh_from_db, called after our own inserts and on
+# reads); the whole buffer is re-warmed every RECENT_POSTS_RELOAD_SECONDS so in-place
+# updates (e.g. update_urgency.py) show up too.
+import os, json, time, threading
+from bisect import insort
+
+CAPACITY = int(os.getenv("RECENT_POSTS_CAPACITY", "1000"))
+RELOAD_SECONDS = float(os.getenv("RECENT_POSTS_RELOAD_SECONDS", "300"))
+REFRESH_SECONDS = 1.0   # reads look for other processes' inserts at most this often
+COLUMNS = ("id", "source", "text", "timestamp", "url", "hazard", "urgency", "latitude", "longitude", "location_name")
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM social_media"
+
+
+def _sort_key(timestamp, row_id):
+    # SQLite sorts NULL below any text; ties broken by id
+    return (0, "", row_id) if timestamp is None else (1, timestamp, row_id)
+
+
+class _Post:
+    __slots__ = ("key", "hazard", "urgency", "json")
+
+    def __init__(self, row):
+        self.key = _sort_key(row[3], row[0])
+        self.hazard = row[5]
+        self.urgency = row[6]
+        # same encoding as FastAPI's JSONResponse
+        self.json = json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class RecentPosts:
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self._slots = [None] * capacity   # ring, oldest at _start
+        self._start = 0
+        self._n = 0
+        self.complete = True              # False once any row of the table is not in the buffer
+        self.last_id = None
+        self._loaded_at = 0.0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return self._n
+
+    def _ordered(self):
+        cap = self.capacity
+        return [self._slots[(self._start + i) % cap] for i in range(self._n)]
+
+    def add(self, row) -> bool:
+        """Insert one row (COLUMNS order); False if it is older than everything kept."""
+        post = _Post(row)
+        cap = self.capacity
+        with self._lock:
+            if self._n == cap and post.key <= self._slots[self._start].key:
+                self.complete = False
+                return False
+            newest = self._slots[(self._start + self._n - 1) % cap] if self._n else None
+            if newest is None or post.key >= newest.key:
+                # common case: newest post -> write at the head, overwriting the oldest when full
+                if self._n < cap:
+                    self._slots[(self._start + self._n) % cap] = post
+                    self._n += 1
+                else:
+                    self._slots[self._start] = post
+                    self._start = (self._start + 1) % cap
+                    self.complete = False
+                return True
+            # back-dated post (e.g. a fetched tweet from yesterday): re-lay the ring in order
+            items = self._ordered()
+            insort(items, post)
+            if len(items) > cap:
+                del items[0]
+                self.complete = False
+            self._slots[:len(items)] = items
+            self._start, self._n = 0, len(items)
+            return True
+
+    def list_json(self, limit: int, hazard: str | None = None, urgency: str | None = None):
+        """JSON array bytes of the newest `limit` matching posts, or None if the buffer can't answer."""
+        if limit > self.capacity:
+            return None
+        cap = self.capacity
+        frags = []
+        with self._lock:
+            for i in range(self._n - 1, -1, -1):
+                p = self._slots[(self._start + i) % cap]
+                if (hazard is None or p.hazard == hazard) and (urgency is None or p.urgency == urgency):
+                    frags.append(p.json)
+                    if len(frags) == limit:
+                        break
+            if len(frags) < limit and not self.complete:
+                return None   # older matching rows may exist outside the buffer
+        return b"[" + b",".join(frags) + b"]"
+
+    # ---------- DB sync ----------
+    def warm(self, conn):
+        """(Re)load the newest `capacity` rows."""
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM social_media")
+        max_id = cur.fetchone()[0]
+        cur.execute(f"{_SELECT} WHERE id <= ? ORDER BY timestamp DESC, id DESC LIMIT ?", (max_id, self.capacity + 1))
+        rows = cur.fetchall()
+        posts = [_Post(r) for r in rows[:self.capacity]]
+        posts.reverse()   # oldest first
+        with self._lock:
+            self._slots = posts + [None] * (self.capacity - len(posts))
+            self._start, self._n = 0, len(posts)
+            self.complete = len(rows) <= self.capacity
+        self.last_id = max_id
+        self._loaded_at = time.monotonic()
+
+    def refresh(self, get_db, force: bool = False):
+        """refresh_from_db with its own connection, at most every REFRESH_SECONDS unless forced."""
+        now = time.monotonic()
+        if force or now - self._last_refresh >= REFRESH_SECONDS:
+            self._last_refresh = now
+            conn = get_db()
+            try:
+                self.refresh_from_db(conn)
+            finally:
+                conn.close()
+
+    def refresh_from_db(self, conn) -> int:
+        """Add rows inserted since the last call (by any process); periodically re-warm."""
+        with self._refresh_lock:
+            if self.last_id is None or time.monotonic() - self._loaded_at >= RELOAD_SECONDS:
+                self.warm(conn)
+                return self._n
+            cur = conn.cursor()
+            cur.execute(f"{_SELECT} WHERE id > ? ORDER BY id", (self.last_id,))
+            rows = cur.fetchall()
+            for row in rows:
+                self.add(row)
+                self.last_id = max(self.last_id, row[0])
+            return len(rows)
+
+
+if __name__ == "__main__":
+    # quick benchmark: python recent_posts.py
+    import sqlite3, random
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE social_media (id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, text TEXT, "
+                 "timestamp TEXT, url TEXT, hazard TEXT, urgency TEXT, latitude REAL, longitude REAL, location_name TEXT)")
+    hazards, urgencies = ["Flood", "Cyclone", "Tsunami", "High Wave"], ["High", "Medium", "Low"]
+    rows = [("Twitter", f"post {i} about flooding near the coast", f"2025-09-{1 + i // 20000:02d}T{i % 24:02d}:{i % 60:02d}:00",
+             f"https://x.com/{i}", random.choice(hazards), random.choice(urgencies), 13.0, 80.2, "Chennai")
+            for i in range(200_000)]
+    conn.executemany("INSERT INTO social_media (source, text, timestamp, url, hazard, urgency, latitude, longitude, "
+                     "location_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    rp = RecentPosts()
+    t0 = time.perf_counter(); rp.refresh_from_db(conn); t1 = time.perf_counter()
+    print(f"warm {len(rp)} posts in {(t1 - t0) * 1e3:.0f} ms")
+    n = 2000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        cur = conn.execute(f"{_SELECT} ORDER BY timestamp DESC LIMIT 100")
+        cols = [d[0] for d in cur.description]
+        json.dumps([dict(zip(cols, r)) for r in cur.fetchall()])
+    t1 = time.perf_counter()
+    for _ in range(n):
+        rp.list_json(100)
+    t2 = time.perf_counter()
+    for _ in range(n):
+        rp.list_json(100, hazard="Flood", urgency="High")
+    t3 = time.perf_counter()
+    print(f"sql + dicts: {(t1 - t0) / n * 1e6:7.0f} µs/request (no timestamp index)")
+    print(f"ring:        {(t2 - t1) / n * 1e6:7.0f} µs/request")
+    print(f"ring+filter: {(t3 - t2) / n * 1e6:7.0f} µs/request")
@@ -0,0 +1,218 @@
+# rolling_aggregates.py
+# Sliding-window hotspot / trend aggregates.
+#
+# Rows are counted into fixed time buckets (BUCKET_SECONDS) per (grid cell, hazard).
+# For every window (1h / 6h / 24h) we keep two running sums:
+#   cur  = last window            (now - W, now]
+#   prev = the window before it   (now - 2W, now - W]
+# Inserting a row touches O(windows) dicts; moving time forward only adds/subtracts
+# the buckets that cross a window edge. Buckets older than 2 * largest window are
+# dropped, so memory stays bounded and nothing ever rescans the table.
+#
+# spike = (cur - prev) / sqrt(prev + 1)  -> a surge shows up as soon as it starts
+# instead of being averaged away by older data.
+import math, threading, time
+from collections import defaultdict
+
+from hotspot_engine import URGENCY_WEIGHTS
+
+WINDOWS = {"1h": 3600, "6h": 6 * 3600, "24h": 24 * 3600}
+BUCKET_SECONDS = 300
+CELL_DEG = 0.02
+SERIES_MAX_POINTS = 48
+
+
+def spike_score(cur: float, prev: float) -> float:
+    return round((cur - prev) / math.sqrt(prev + 1.0), 3)
+
+
+class _RangeSum:
+    """Running [count, weight] per key over buckets b with head-lo < b <= head-hi."""
+
+    def __init__(self, lo: int, hi: int):
+        self.lo, self.hi = lo, hi
+        self.sums = defaultdict(lambda: [0, 0.0])
+
+    def covers(self, head: int, b: int) -> bool:
+        return head - self.lo < b <= head - self.hi
+
+    def _apply(self, bucket: dict, sign: int):
+        for key, (c, w) in bucket.items():
+            s = self.sums[key]
+            s[0] += sign * c
+            s[1] += sign * w
+            if s[0] <= 0:
+                del self.sums[key]
+
+    def advance(self, old_head: int, new_head: int, buckets: dict):
+        # add what enters first: on a jump wider than the range a bucket can enter and leave in one go
+        for b in range(old_head - self.hi + 1, new_head - self.hi + 1):
+            if b in buckets:
+                self._apply(buckets[b], +1)
+        for b in range(old_head - self.lo + 1, new_head - self.lo + 1):
+            if b in buckets:
+                self._apply(buckets[b], -1)
+
+    def rebuild(self, head: int, buckets: dict):
+        self.sums.clear()
+        for b, bucket in buckets.items():
+            if self.covers(head, b):
+                self._apply(bucket, +1)
+
+
+class RollingAggregates:
+    def __init__(self, bucket_seconds: int = BUCKET_SECONDS, windows: dict = WINDOWS, cell_deg: float = CELL_DEG):
+        self.bucket_seconds = bucket_seconds
+        self.cell_deg = cell_deg
+        self.window_buckets = {name: max(1, sec // bucket_seconds) for name, sec in windows.items()}
+        self.retention = 2 * max(self.window_buckets.values())
+        self.buckets = {}   # bucket id -> {(cell, hazard): [count, weight]}
+        self.ranges = {}
+        for name, n in self.window_buckets.items():
+            self.ranges[(name, "cur")] = _RangeSum(n, 0)
+            self.ranges[(name, "prev")] = _RangeSum(2 * n, n)
+        self.head = int(time.time() // bucket_seconds)
+        self.last_ids = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()   # two requests must not fold the same new rows twice
+
+    def _cell(self, lat, lon):
+        if lat is None or lon is None:
+            return None   # still counted for trends, just not on the map
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def _advance(self, now: float):
+        new_head = int(now // self.bucket_seconds)
+        if new_head <= self.head:
+            return
+        old_head, self.head = self.head, new_head
+        if new_head - old_head > self.retention:
+            for b in [b for b in self.buckets if b <= new_head - self.retention]:
+                del self.buckets[b]
+            for r in self.ranges.values():
+                r.rebuild(new_head, self.buckets)
+            return
+        for r in self.ranges.values():
+            r.advance(old_head, new_head, self.buckets)
+        # expire only after the ranges have subtracted what is leaving them
+        for b in [b for b in self.buckets if b <= new_head - self.retention]:
+            del self.buckets[b]
+
+    def add(self, ts: float | None, lat, lon, hazard, urgency, now: float | None = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._advance(now)
+            b = self.head if ts is None else min(int(ts // self.bucket_seconds), self.head)
+            if b <= self.head - self.retention:
+                return False
+            key = (self._cell(lat, lon), hazard or "Other")
+            w = URGENCY_WEIGHTS.get(urgency, 1.0)
+            s = self.buckets.setdefault(b, {}).setdefault(key, [0, 0.0])
+            s[0] += 1
+            s[1] += w
+            for r in self.ranges.values():
+                if r.covers(self.head, b):
+                    rs = r.sums[key]
+                    rs[0] += 1
+                    rs[1] += w
+            return True
+
+    # ---------- queries ----------
+    def hotspots(self, window: str, top: int = 50, sort: str = "weight", now: float | None = None):
+        with self._lock:
+            self._advance(time.time() if now is None else now)
+            cur = {k: tuple(v) for k, v in self.ranges[(window, "cur")].sums.items() if k[0] is not None}
+            prev = {k: tuple(v) for k, v in self.ranges[(window, "prev")].sums.items() if k[0] is not None}
+
+        cells = defaultdict(lambda: {"count": 0, "weight": 0.0, "prev_weight": 0.0, "hazards": {}})
+        for (cell, hazard), (c, w) in cur.items():
+            h = cells[cell]
+            h["count"] += c
+            h["weight"] += w
+            h["hazards"][hazard] = h["hazards"].get(hazard, 0) + c
+        for (cell, _hazard), (_c, w) in prev.items():
+            if cell in cells:
+                cells[cell]["prev_weight"] += w
+
+        out = []
+        for (ix, iy), h in cells.items():
+            out.append({
+                "latitude": round((ix + 0.5) * self.cell_deg, 5),
+                "longitude": round((iy + 0.5) * self.cell_deg, 5),
+                "count": h["count"],
+                "weight": round(h["weight"], 3),
+                "prev_weight": round(h["prev_weight"], 3),
+                "spike": spike_score(h["weight"], h["prev_weight"]),
+                "hazards": h["hazards"],
+            })
+        out.sort(key=lambda h: h["spike" if sort == "spike" else "weight"], reverse=True)
+        return out[:top]
+
+    def trends(self, window: str, now: float | None = None):
+        n = self.window_buckets[window]
+        step = max(1, math.ceil(n / SERIES_MAX_POINTS))
+        with self._lock:
+            self._advance(time.time() if now is None else now)
+            head = self.head
+            cur = list(self.ranges[(window, "cur")].sums.items())
+            prev = list(self.ranges[(window, "prev")].sums.items())
+            series = defaultdict(lambda: [0] * math.ceil(n / step))
+            for b in range(head - n + 1, head + 1):
+                for (_cell, hazard), (c, _w) in self.buckets.get(b, {}).items():
+                    series[hazard][(b - (head - n + 1)) // step] += c
+
+        totals = defaultdict(lambda: {"count": 0, "weight": 0.0, "prev_count": 0, "prev_weight": 0.0})
+        for (_cell, hazard), (c, w) in cur:
+            totals[hazard]["count"] += c
+            totals[hazard]["weight"] += w
+        for (_cell, hazard), (c, w) in prev:
+            totals[hazard]["prev_count"] += c
+            totals[hazard]["prev_weight"] += w
+
+        start = (head - n + 1) * self.bucket_seconds
+        out = []
+        for hazard, t in totals.items():
+            out.append({
+                "hazard": hazard,
+                "count": t["count"],
+                "prev_count": t["prev_count"],
+                "weight": round(t["weight"], 3),
+                "spike": spike_score(t["weight"], t["prev_weight"]),
+                "series": series.get(hazard, []),
+            })
+        out.sort(key=lambda t: t["spike"], reverse=True)
+        return {"window": window, "start": start, "step_seconds": step * self.bucket_seconds, "hazards": out}
+
+    # ---------- sqlite loader ----------
+    def refresh_from_db(self, conn) -> int:
+        """Fold in rows added since the last call; the first call only reads the retention period."""
+        with self._refresh_lock:
+            cur = conn.cursor()
+            now = time.time()
+            since = (self.head - self.retention + 1) * self.bucket_seconds
+            added = 0
+            for table, hazard_col in (("reports", "hazard_type"), ("social_media", "hazard")):
+                cur.execute(f"PRAGMA table_info({table})")
+                cols = {r[1] for r in cur.fetchall()}
+                if not cols:
+                    continue
+                urgency = "urgency" if "urgency" in cols else "NULL"
+                last_id = self.last_ids.get(table)
+                if last_id is None:
+                    cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+                    max_id = cur.fetchone()[0]
+                    cur.execute(f"""
+                        SELECT id, CAST(strftime('%s', timestamp) AS REAL), latitude, longitude, {hazard_col}, {urgency}
+                        FROM {table} WHERE id <= ? AND CAST(strftime('%s', timestamp) AS REAL) >= ?
+                    """, (max_id, since))
+                else:
+                    max_id = last_id
+                    cur.execute(f"""
+                        SELECT id, CAST(strftime('%s', timestamp) AS REAL), latitude, longitude, {hazard_col}, {urgency}
+                        FROM {table} WHERE id > ? ORDER BY id
+                    """, (last_id,))
+                for row_id, ts, lat, lon, hazard, urg in cur.fetchall():
+                    added += self.add(ts, lat, lon, hazard, urg, now=now)
+                    max_id = max(max_id, row_id)
+                self.last_ids[table] = max_id
+            return added
@@ -1,4 +1,9 @@
-def classify_post(text: str):
+from text_classifier import classify_batch
+
+# the model is trained on the social_fetcher label set; these rules only know Cyclone/Flood/Earthquake/Other
+MODEL_HAZARDS = {"High Wave": "Other", "Tsunami": "Other", "Uncategorized": "Other"}
+
+def _rules(text: str):
     text_lower = text.lower()
     hazard = "Other"
     urgency = "Low"
@@ -16,3 +21,14 @@ def classify_post(text: str):
         urgency = "Medium"
 
     return hazard, urgency
+
+def classify_posts(texts):
+    # learned model (one batch) where it beat the rules on its holdout and is confident, else the rules
+    out = []
+    for text, (m_hazard, m_urgency) in zip(texts, classify_batch(texts, labels=MODEL_HAZARDS)):
+        hazard, urgency = _rules(text or "")
+        out.append((m_hazard or hazard, m_urgency or urgency))
+    return out
+
+def classify_post(text: str):
+    return classify_posts([text])[0]
@@ -1,14 +1,22 @@
 import os
 import json
-import time
 from datetime import datetime, timezone
 from typing import List, Dict, Any
-from collections import defaultdict
 
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
-import requests
+
+# outbound HTTP layer (pooled session, timeouts, retries, cache): the backend's http_client.py,
+# imported from the backend directory three levels up rather than kept as a copy
+import sys
+_BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+if _BACKEND_DIR not in sys.path:
+    sys.path.append(_BACKEND_DIR)
+import http_client
+
+from report_log import ReportLog
+from hotspot_cache import HotspotCache
 
 # External SDKs
 try:
@@ -35,6 +43,19 @@ load_dotenv()
 DATA_DIR = r"C:\Users\hp\Downloads\Project\data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Citizen reports: append-only NDJSON log (old crowdsourced_reports.json is migrated once)
+reports_log = ReportLog(
+    os.path.join(DATA_DIR, "crowdsourced_reports.ndjson"),
+    legacy_json=os.path.join(DATA_DIR, "crowdsourced_reports.json"),
+)
+
+# /api/hotspots aggregate, kept up to date from the social file + report log
+hotspot_cache = HotspotCache(
+    os.path.join(DATA_DIR, "live_social_media.json"),
+    reports_log,
+    os.path.join(DATA_DIR, "hotspots.json"),
+)
+
 # Flask app setup
 app = Flask(__name__)
 CORS(app)
@@ -85,8 +106,8 @@ def geocode_location(location: str):
     if not location or not GOOGLE_MAPS_API_KEY:
         return None, None
     try:
-        url = f"https://maps.googleapis.com/maps/api/geocode/json?address={location}&key={GOOGLE_MAPS_API_KEY}"
-        response = requests.get(url)
+        response = http_client.get("https://maps.googleapis.com/maps/api/geocode/json",
+                                   params={"address": location, "key": GOOGLE_MAPS_API_KEY}, cache=True)
         data = response.json()
         if data["status"] == "OK" and len(data["results"]) > 0:
             loc = data["results"][0]["geometry"]["location"]
@@ -177,8 +198,9 @@ def fetch_instagram_posts(query: str, limit: int = 10) -> List[Dict[str, Any]]:
     if not INSTAGRAM_USER_TOKEN or not INSTAGRAM_APP_ID:
         return posts
     try:
-        url = f"https://graph.facebook.com/v17.0/me/media?fields=caption,media_url,timestamp,permalink&access_token={INSTAGRAM_USER_TOKEN}"
-        response = requests.get(url)
+        response = http_client.get("https://graph.facebook.com/v17.0/me/media",
+                                   params={"fields": "caption,media_url,timestamp,permalink",
+                                           "access_token": INSTAGRAM_USER_TOKEN})
         data = response.json()
         if "data" in data:
             for item in data["data"][:limit]:
@@ -224,6 +246,7 @@ def refresh_data():
     # Save to local file
     with open(os.path.join(DATA_DIR, "live_social_media.json"), "w", encoding="utf-8") as f:
         json.dump(all_posts, f, indent=2)
+    hotspot_cache.refresh()
 
     return jsonify({"status": "success", "count": len(all_posts)})
 
@@ -246,8 +269,7 @@ def submit_report():
     media = data.get("media")
 
     lat, lon = geocode_location(location)
-    report = {
-        "id": int(time.time()),
+    report = reports_log.append({
         "description": description,
         "location": location,
         "media": media,
@@ -256,72 +278,24 @@ def submit_report():
         "source": "Citizen",
         "latitude": lat,
         "longitude": lon
-    }
+    })
+    hotspot_cache.refresh()
 
-    filepath = os.path.join(DATA_DIR, "crowdsourced_reports.json")
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            reports = json.load(f)
-    except FileNotFoundError:
-        reports = []
+    return jsonify({"status": "success", "report": report})
 
-    reports.append(report)
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(reports, f, indent=2)
 
-    return jsonify({"status": "success", "report": report})
+@app.route("/api/report/<int:report_id>", methods=["GET"])
+def get_report(report_id):
+    report = reports_log.get(report_id)
+    if report is None:
+        return jsonify({"error": "Report not found"}), 404
+    return jsonify(report)
 
 
 @app.route("/api/hotspots", methods=["GET"])
 def get_hotspots():
-    combined_locations = []
-
-    # Social media posts
-    try:
-        with open(os.path.join(DATA_DIR, "live_social_media.json"), "r", encoding="utf-8") as f:
-            social_posts = json.load(f)
-        for post in social_posts:
-            if post.get("latitude") and post.get("longitude"):
-                combined_locations.append((
-                    post.get("location_name", post["text"][:50]),
-                    post["latitude"],
-                    post["longitude"]
-                ))
-    except FileNotFoundError:
-        pass
-
-    # Citizen reports
-    try:
-        with open(os.path.join(DATA_DIR, "crowdsourced_reports.json"), "r", encoding="utf-8") as f:
-            reports = json.load(f)
-        for report in reports:
-            if report.get("latitude") and report.get("longitude"):
-                combined_locations.append((
-                    report.get("location", "Unknown"),
-                    report["latitude"],
-                    report["longitude"]
-                ))
-    except FileNotFoundError:
-        pass
-
-    # Aggregate hotspots
-    hotspot_dict = defaultdict(lambda: {"count": 0, "latitude": 0, "longitude": 0})
-    for loc_name, lat, lon in combined_locations:
-        key = f"{lat}_{lon}"
-        hotspot_dict[key]["count"] += 1
-        hotspot_dict[key]["latitude"] = lat
-        hotspot_dict[key]["longitude"] = lon
-        hotspot_dict[key]["location"] = loc_name
-
-    hotspots = list(hotspot_dict.values())
-    hotspots.sort(key=lambda x: x["count"], reverse=True)
-
-    # Save to local file
-    hotspots_file = os.path.join(DATA_DIR, "hotspots.json")
-    with open(hotspots_file, "w", encoding="utf-8") as f:
-        json.dump(hotspots, f, indent=2)
-
-    return jsonify(hotspots)
+    # cached aggregate; rebuilt only when the sources change, hotspots.json saved in the background
+    return app.response_class(hotspot_cache.body(), mimetype="application/json")
 
 
 # ----------------------------
@@ -0,0 +1,134 @@
+# hotspot_cache.py
+# In-memory hotspot aggregate behind /api/hotspots.
+#
+# The route used to re-read and re-parse live_social_media.json and every citizen report,
+# re-aggregate everything and rewrite hotspots.json on each GET. Now:
+#   - social posts: re-aggregated only when the file changes (inode / size / mtime)
+#   - citizen reports: read incrementally from the report log tail (new lines only)
+#   - the sorted list is serialised once per version; GET returns those bytes
+#   - hotspots.json is written by a background thread after the data changes
+# Points are counted per HOTSPOT_CELL_DEG grid cell (reported at the cell centre), so
+# 13.0827 and 13.08271 are one hotspot, not two.
+import os, json, math, time, threading
+
+SNAPSHOT_DELAY = float(os.getenv("HOTSPOT_SNAPSHOT_DELAY", "2"))   # seconds; coalesces bursts of reports
+CELL_DEG = float(os.getenv("HOTSPOT_CELL_DEG", "0.02"))            # same grid as the backend hotspot engine
+
+
+def _cell(lat, lon):
+    """(key, centre lat, centre lon) of the grid cell holding the point."""
+    ix, iy = math.floor(float(lat) / CELL_DEG), math.floor(float(lon) / CELL_DEG)
+    return f"{ix}_{iy}", round((ix + 0.5) * CELL_DEG, 5), round((iy + 0.5) * CELL_DEG, 5)
+
+
+def _add(agg: dict, key: str, lat, lon, name, n: int = 1):
+    h = agg.get(key)
+    if h is None:
+        h = agg[key] = {"count": 0, "latitude": lat, "longitude": lon, "location": name}
+    h["count"] += n
+    h["location"] = name
+
+
+class HotspotCache:
+    def __init__(self, social_path: str, reports_log, snapshot_path: str):
+        self.social_path = social_path
+        self.reports_log = reports_log
+        self.snapshot_path = snapshot_path
+        self.version = 0
+        self._social = {}         # key -> hotspot, from the social file
+        self._social_stat = None
+        self._reports = {}        # key -> hotspot, from citizen reports
+        self._report_keys = {}    # report id -> key it is counted under (a re-written report moves)
+        self._report_pos = (None, 0)   # (log generation, offset read up to)
+        self._hotspots = []
+        self._body = b"[]"
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._saved_version = 0
+        threading.Thread(target=self._snapshot_loop, daemon=True).start()
+
+    # ---------- sources ----------
+    def _refresh_social(self) -> bool:
+        try:
+            st = os.stat(self.social_path)
+            stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            stat = None
+        if stat == self._social_stat:
+            return False
+        social = {}
+        if stat is not None:
+            try:
+                with open(self.social_path, "r", encoding="utf-8") as f:
+                    posts = json.load(f)
+            except ValueError:
+                return False   # /api/refresh is mid-write; keep the old aggregate, retry next time
+            for post in posts:
+                if post.get("latitude") and post.get("longitude"):
+                    _add(social, *_cell(post["latitude"], post["longitude"]), post.get("location_name", post["text"][:50]))
+        self._social, self._social_stat = social, stat
+        return True
+
+    def _refresh_reports(self) -> bool:
+        generation, offset = self._report_pos
+        if generation != self.reports_log.generation:
+            # log was compacted: offsets changed, rebuild from the start
+            self._reports, self._report_keys, offset = {}, {}, 0
+        reports, end, generation = self.reports_log.tail(offset)
+        changed = False
+        for report in reports:
+            old = self._report_keys.pop(report["id"], None)
+            if old is not None:
+                h = self._reports[old]
+                h["count"] -= 1
+                if not h["count"]:
+                    del self._reports[old]
+                changed = True
+            if report.get("latitude") and report.get("longitude"):
+                key, lat, lon = _cell(report["latitude"], report["longitude"])
+                _add(self._reports, key, lat, lon, report.get("location", "Unknown"))
+                self._report_keys[report["id"]] = key
+                changed = True
+        self._report_pos = (generation, end)
+        return changed
+
+    # ---------- public API ----------
+    def refresh(self) -> int:
+        """Pick up source changes (a stat + a log tail read when nothing changed); returns the version."""
+        with self._lock:
+            social_changed = self._refresh_social()
+            reports_changed = self._refresh_reports()
+            if social_changed or reports_changed or not self.version:
+                merged = {k: dict(h) for k, h in self._social.items()}
+                for k, h in self._reports.items():
+                    _add(merged, k, h["latitude"], h["longitude"], h["location"], h["count"])
+                hotspots = sorted(merged.values(), key=lambda x: x["count"], reverse=True)
+                self._hotspots = hotspots
+                self._body = json.dumps(hotspots).encode("utf-8")
+                self.version += 1
+                self._changed.set()
+            return self.version
+
+    def body(self) -> bytes:
+        """Serialised hotspot list for the current version."""
+        self.refresh()
+        return self._body
+
+    # ---------- snapshot ----------
+    def _snapshot_loop(self):
+        while True:
+            self._changed.wait()
+            time.sleep(SNAPSHOT_DELAY)
+            self._changed.clear()
+            with self._lock:
+                version, hotspots = self.version, self._hotspots
+            if version == self._saved_version:
+                continue
+            try:
+                tmp = self.snapshot_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(hotspots, f, indent=2)
+                os.replace(tmp, self.snapshot_path)
+                self._saved_version = version
+            except OSError as e:
+                print(f"Hotspot snapshot error: {e}")
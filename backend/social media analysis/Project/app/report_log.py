@@ -0,0 +1,360 @@
+# report_log.py
+# Append-only NDJSON storage for citizen reports (replaces rewriting crowdsourced_reports.json).
+#
+#   log = ReportLog(os.path.join(DATA_DIR, "crowdsourced_reports.ndjson"))
+#   report = log.append({...})     # assigns a unique "id", one write() + group fsync
+#   log.get(report_id)             # seek to the offset from the index, read one line
+#   for r in log.scan(): ...       # all live reports, oldest first
+#
+# Every report is one JSON line. A submit is a single O_APPEND write, so its cost does
+# not depend on how many reports exist. fsync is batched: concurrent submitters wait on
+# the same fsync instead of one each. An id -> (offset, length) index lives in memory,
+# is saved to a small sidecar (.idx) and caught up from the log tail, which also picks
+# up lines appended by other processes. Compaction rewrites the file without dead bytes
+# (torn lines from crashed writes, superseded copies of an id): right away once they
+# reach REPORT_LOG_COMPACT_DEAD_RATIO of the file, otherwise at most every
+# REPORT_LOG_COMPACT_INTERVAL seconds while there are any.
+import os, json, time, struct, threading, atexit
+
+try:
+    import fcntl   # cross-process lock; not available on Windows (in-process lock only there)
+except ImportError:
+    fcntl = None
+
+FSYNC = os.getenv("REPORT_LOG_FSYNC", "1") != "0"
+COMPACT_MIN_BYTES = int(os.getenv("REPORT_LOG_COMPACT_MIN_BYTES", str(1 << 20)))
+COMPACT_DEAD_RATIO = float(os.getenv("REPORT_LOG_COMPACT_DEAD_RATIO", "0.3"))
+COMPACT_INTERVAL = float(os.getenv("REPORT_LOG_COMPACT_INTERVAL", str(6 * 3600)))
+
+_IDX_MAGIC = b"RLIDX1\n"
+_IDX_HEADER = struct.Struct("<QQ")      # log size covered by the index, dead bytes
+_IDX_ENTRY = struct.Struct("<qQI")      # id, offset, length
+
+
+def _dumps(record: dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class ReportLog:
+    def __init__(self, path: str, legacy_json: str = None):
+        self.path = path
+        self.idx_path = os.path.splitext(path)[0] + ".idx"
+        self.index = {}          # id -> (offset, length) of the latest copy
+        self.dead = 0            # bytes of torn lines / superseded copies
+        self.end = 0             # log offset the index covers
+        self.last_id = 0
+        self.generation = 0      # bumped whenever the file is replaced (offsets change)
+        self._lock = threading.RLock()
+        self._sync_cond = threading.Condition()
+        self._written = 0        # appends written
+        self._synced = 0         # appends known to be on disk
+        self._syncing = False
+        self._closed = False
+        self._compacted_at = time.monotonic()
+
+        if legacy_json and not os.path.exists(path) and os.path.exists(legacy_json):
+            self._import_legacy(legacy_json)
+        self._open()
+        self._load_index()
+        with self._locked():
+            self._catch_up()
+        atexit.register(self.close)
+
+    # ---------- files ----------
+    def _open(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+        self.ino = os.fstat(self.fd).st_ino
+
+    def _import_legacy(self, legacy_json: str):
+        """One-time migration from the old whole-file JSON array."""
+        try:
+            with open(legacy_json, "r", encoding="utf-8") as f:
+                reports = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Report log migration error: {e}")
+            return
+        # old ids were int(time.time()): duplicates (same second) or missing. Every record gets a
+        # fresh id in file order, otherwise the index would treat all but one as superseded.
+        records = [{"id": i, **({"legacy_id": r["id"]} if r.get("id") is not None else {}),
+                    **{k: v for k, v in r.items() if k != "id"}}
+                   for i, r in enumerate((r for r in reports if isinstance(r, dict)), start=1)]
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.writelines(_dumps(r) for r in records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        skipped = len(reports) - len(records)
+        print(f"Migrated {len(records)} reports from {legacy_json} to {self.path}" + (f" ({skipped} non-object entries skipped)" if skipped else ""))
+
+    class _FileLock:
+        def __init__(self, log):
+            self.log = log
+
+        def __enter__(self):
+            self.log._lock.acquire()
+            if fcntl:
+                fcntl.flock(self.log.fd, fcntl.LOCK_EX)
+                # another process may have compacted (replaced) the file: reopen and re-index
+                try:
+                    replaced = os.stat(self.log.path).st_ino != self.log.ino
+                except FileNotFoundError:
+                    replaced = True
+                if replaced:
+                    fcntl.flock(self.log.fd, fcntl.LOCK_UN)
+                    os.close(self.log.fd)
+                    self.log._open()
+                    fcntl.flock(self.log.fd, fcntl.LOCK_EX)
+                    self.log.index, self.log.dead, self.log.end = {}, 0, 0
+                    self.log.generation += 1
+            return self.log
+
+        def __exit__(self, *exc):
+            if fcntl:
+                fcntl.flock(self.log.fd, fcntl.LOCK_UN)
+            self.log._lock.release()
+
+    def _locked(self):
+        return self._FileLock(self)
+
+    # ---------- index ----------
+    def _load_index(self):
+        try:
+            with open(self.idx_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        if not data.startswith(_IDX_MAGIC):
+            return
+        pos = len(_IDX_MAGIC)
+        end, dead = _IDX_HEADER.unpack_from(data, pos)
+        pos += _IDX_HEADER.size
+        if end > os.fstat(self.fd).st_size:
+            return   # index is from a longer (pre-compaction) file; rebuild from the log
+        index = {}
+        for rid, off, length in _IDX_ENTRY.iter_unpack(data[pos:]):
+            index[rid] = (off, length)
+        # spot check: the last indexed record must be where the index says it is
+        if index:
+            rid = max(index, key=lambda k: index[k][0])
+            if (self._read_at(*index[rid]) or {}).get("id") != rid:
+                return
+        self.index, self.dead, self.end = index, dead, end
+        self.last_id = max(index, default=0)
+
+    def save_index(self):
+        with self._lock:
+            body = b"".join(_IDX_ENTRY.pack(rid, off, length) for rid, (off, length) in self.index.items())
+            tmp = self.idx_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(_IDX_MAGIC + _IDX_HEADER.pack(self.end, self.dead) + body)
+            os.replace(tmp, self.idx_path)
+
+    def _catch_up(self):
+        """Index lines appended after self.end (by us before a restart, or by another process).
+
+        Always called under the file lock, so no writer is mid-line: a line without its
+        newline is a crashed write and gets terminated, otherwise the next append would
+        be glued onto it."""
+        size = os.fstat(self.fd).st_size
+        if size <= self.end:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.end)
+            off = self.end
+            for line in f:
+                torn = not line.endswith(b"\n")
+                if torn:
+                    os.write(self.fd, b"\n")
+                    line += b"\n"
+                self._index_line(line, off)
+                off += len(line)
+                if torn:
+                    break   # always the last line; don't read back the newline just written
+        self.end = off
+
+    def _index_line(self, line: bytes, off: int):
+        try:
+            rid = int(json.loads(line)["id"])
+        except (ValueError, KeyError, TypeError):
+            self.dead += len(line)
+            return
+        old = self.index.get(rid)
+        if old:
+            self.dead += old[1]
+        self.index[rid] = (off, len(line))
+        self.last_id = max(self.last_id, rid)
+
+    def _pread(self, off: int, length: int) -> bytes:
+        if hasattr(os, "pread"):
+            return os.pread(self.fd, length, off)
+        with open(self.path, "rb") as f:
+            f.seek(off)
+            return f.read(length)
+
+    def _read_at(self, off: int, length: int):
+        try:
+            return json.loads(self._pread(off, length))
+        except ValueError:
+            return None
+
+    # ---------- public API ----------
+    def append(self, record: dict, durable: bool = True) -> dict:
+        """Assign an id, append one line; with durable=True return only after it is fsynced."""
+        with self._locked():
+            self._catch_up()
+            record = {"id": max(int(time.time()), self.last_id + 1), **{k: v for k, v in record.items() if k != "id"}}
+            line = _dumps(record)
+            os.write(self.fd, line)
+            self._index_line(line, self.end)
+            self.end += len(line)
+            with self._sync_cond:
+                self._written += 1
+                seq = self._written
+            needs_compaction = self.dead > 0 and (
+                (self.dead >= COMPACT_MIN_BYTES and self.dead >= COMPACT_DEAD_RATIO * self.end)
+                or time.monotonic() - self._compacted_at >= COMPACT_INTERVAL)
+        if durable and FSYNC:
+            self._sync_upto(seq)
+        if needs_compaction:
+            self.compact()
+        return record
+
+    def _sync_upto(self, seq: int):
+        # group commit: one caller runs fsync for everything written so far, the others wait for it
+        with self._sync_cond:
+            while self._synced < seq:
+                if self._syncing:
+                    self._sync_cond.wait()
+                    continue
+                self._syncing = True
+                target = self._written
+                self._sync_cond.release()
+                try:
+                    os.fsync(self.fd)
+                finally:
+                    self._sync_cond.acquire()
+                    self._syncing = False
+                    self._sync_cond.notify_all()
+                self._synced = max(self._synced, target)
+
+    def get(self, report_id: int):
+        with self._lock:
+            loc = self.index.get(report_id)
+            if loc is None:
+                with self._locked():
+                    self._catch_up()
+                loc = self.index.get(report_id)
+            return self._read_at(*loc) if loc else None
+
+    def scan(self, start: int = 0):
+        """Live reports (latest copy per id) from log offset `start` onwards, oldest first."""
+        return self.tail(start)[0]
+
+    def tail(self, start: int = 0):
+        """(reports from offset `start`, end offset, generation) for incremental readers.
+
+        Pass the returned end offset as the next `start`; offsets are only valid within
+        one generation (compaction starts a new one)."""
+        with self._locked():
+            self._catch_up()
+            end, generation, index = self.end, self.generation, self.index
+            if start >= end:
+                return iter(()), end, generation
+            f = open(self.path, "rb")   # opened under the lock: a later compaction can't swap it under us
+        return self._read_lines(f, start, end, index), end, generation
+
+    @staticmethod
+    def _read_lines(f, start, end, index):
+        with f:
+            f.seek(start)
+            off = start
+            while off < end:
+                line = f.readline()
+                if not line:
+                    break   # file shorter than the index says: never spin at EOF
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None   # torn line
+                # skip copies superseded by a later line (compaction swaps in a new index dict, not this one)
+                if record is not None and index.get(record.get("id"), (None,))[0] == off:
+                    yield record
+                off += len(line)
+
+    def __len__(self):
+        return len(self.index)
+
+    def compact(self):
+        """Rewrite the log with only the latest copy of each report, then swap it in atomically."""
+        self._compacted_at = time.monotonic()   # also after a failed attempt: don't retry on every append
+        try:
+            with self._locked():
+                self._catch_up()
+                tmp = self.path + ".compact"
+                index, off = {}, 0
+                with open(tmp, "wb") as out:
+                    for rid, (o, length) in sorted(self.index.items(), key=lambda kv: kv[1][0]):
+                        out.write(self._pread(o, length))
+                        index[rid] = (off, length)
+                        off += length
+                    out.flush()
+                    os.fsync(out.fileno())
+                before = self.end
+                os.replace(tmp, self.path)
+                old_fd = self.fd
+                self._open()
+                if fcntl:
+                    fcntl.flock(self.fd, fcntl.LOCK_EX)   # released by _FileLock.__exit__ on the new fd
+                    fcntl.flock(old_fd, fcntl.LOCK_UN)
+                os.close(old_fd)
+                self.index, self.dead, self.end = index, 0, off
+                self.generation += 1
+                self.save_index()
+            print(f"Report log compacted: {before} -> {off} bytes, {len(index)} reports")
+        except OSError as e:
+            print(f"Report log compaction error: {e}")
+
+    def sync(self):
+        with self._sync_cond:
+            seq = self._written
+        self._sync_upto(seq)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.sync()
+            self.save_index()
+            os.close(self.fd)
+        except OSError as e:
+            print(f"Report log close error: {e}")
+
+
+if __name__ == "__main__":
+    # quick benchmark: python report_log.py  (append cost stays flat as the log grows)
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    with tempfile.TemporaryDirectory() as d:
+        log = ReportLog(os.path.join(d, "reports.ndjson"))
+        sample = {"description": "Flooding near Marina beach", "location": "Chennai", "hazard": "Flood",
+                  "source": "Citizen", "latitude": 13.05, "longitude": 80.28}
+        for total in (1_000, 10_000, 50_000):
+            n = total - len(log)
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(16) as pool:
+                ids = [r["id"] for r in pool.map(lambda _: log.append(sample), range(n))]
+            dt = time.perf_counter() - t0
+            assert len(set(ids)) == n
+            print(f"{total:>6} reports: {dt / n * 1e6:7.1f} µs/append (16 threads, fsync {'on' if FSYNC else 'off'})")
+        t0 = time.perf_counter()
+        for rid in ids[:1000]:
+            assert log.get(rid)["id"] == rid
+        print(f"lookup: {(time.perf_counter() - t0) / 1000 * 1e6:.1f} µs")
+        log.close()
+        t0 = time.perf_counter()
+        reopened = ReportLog(log.path)
+        print(f"reopen with index: {(time.perf_counter() - t0) * 1e3:.1f} ms, {len(reopened)} reports")
+        reopened.close()
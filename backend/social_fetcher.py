@@ -1,42 +1,122 @@
 # social_fetcher.py
-import os, json, time
+import os, json, time, threading
 from datetime import datetime, timezone
 from typing import List, Dict, Any
 
-# optional SDKs - imported only if installed
-try:
+# config
+# SDKs (tweepy / praw / googleapiclient), .env and the HTTP client / classifier / prefilter /
+# gazetteer modules are NOT loaded at import: uvicorn workers start without them and they
+# are loaded on first use (or by prewarm() at startup).
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+_env_loaded = False
+
+def _env(name: str):
+    """Setting from the environment, loading .env on first use."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+    return os.getenv(name)
+
+def prewarm_enabled() -> bool:
+    return (_env("SOCIAL_PREWARM") or "0") == "1"
+
+def client_retry_seconds() -> float:
+    return float(_env("SOCIAL_CLIENT_RETRY_SECONDS") or "300")
+
+# --- API clients: built lazily, one registry per process ---
+def _build_twitter():
+    token = _env("TWITTER_BEARER_TOKEN")
+    if not token:
+        return None
     import tweepy
-except Exception:
-    tweepy = None
-try:
+    return tweepy.Client(bearer_token=token)
+
+def _build_reddit():
+    client_id = _env("REDDIT_CLIENT_ID")
+    if not client_id:
+        return None
     import praw
-except Exception:
-    praw = None
-try:
+    return praw.Reddit(client_id=client_id, client_secret=_env("REDDIT_CLIENT_SECRET"), user_agent="coastal")
+
+def _build_youtube():
+    key = _env("YOUTUBE_API_KEY")
+    if not key:
+        return None
     from googleapiclient.discovery import build as gbuild
-except Exception:
-    gbuild = None
+    return gbuild("youtube", "v3", developerKey=key)   # may fetch the discovery document
 
-import requests
-from dotenv import load_dotenv
-load_dotenv()
+class ClientRegistry:
+    """
+    name -> SDK client, built on first get() and kept for the process.
+    Health per client: ok / unconfigured (no keys) / unavailable (SDK not installed) /
+    error (build failed; retried after SOCIAL_CLIENT_RETRY_SECONDS) plus last fetch outcome.
+    """
+    def __init__(self, builders: Dict[str, Any]):
+        self._builders = builders
+        self._clients = {}
+        self._locks = {name: threading.Lock() for name in builders}
+        self._health = {name: {"status": "not_built", "failures": 0} for name in builders}
 
-# config
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
-os.makedirs(DATA_DIR, exist_ok=True)
-TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
-REDDIT_CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
-REDDIT_CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET")
-YOUTUBE_KEY = os.getenv("YOUTUBE_API_KEY")
-GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+    def get(self, name: str):
+        if name in self._clients:
+            return self._clients[name]
+        with self._locks[name]:
+            if name in self._clients:
+                return self._clients[name]
+            h = self._health[name]
+            if h["status"] == "error" and time.time() - h["checked_at"] < client_retry_seconds():
+                return None   # failed recently; don't hammer the upstream on every fetch
+            t0 = time.perf_counter()
+            client, error = None, None
+            try:
+                client = self._builders[name]()
+                status = "ok" if client is not None else "unconfigured"
+            except ImportError as e:
+                status, error = "unavailable", str(e)
+            except Exception as e:
+                status, error = "error", str(e)
+                print(f"{name} client error:", e)
+            h.update(status=status, error=error, checked_at=time.time(),
+                     build_ms=round((time.perf_counter() - t0) * 1000, 1))
+            if status != "error":
+                self._clients[name] = client
+            return client
+
+    def report(self, name: str, ok: bool, error: Exception = None):
+        """Record the outcome of a call made with the client."""
+        h = self._health[name]
+        if ok:
+            h.update(last_ok=time.time(), failures=0)
+        else:
+            h.update(last_error=str(error), last_error_at=time.time(), failures=h["failures"] + 1)
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(h) for name, h in self._health.items()}
+
+    def prewarm(self, names=None, background: bool = True):
+        """Build clients ahead of the first fetch (e.g. at app startup), off the request path."""
+        def run():
+            for name in names or self._builders:
+                self.get(name)
+        if background:
+            threading.Thread(target=run, name="social-prewarm", daemon=True).start()
+        else:
+            run()
+
+clients = ClientRegistry({"twitter": _build_twitter, "reddit": _build_reddit, "youtube": _build_youtube})
 
-# instantiate clients if available
-twitter_client = tweepy.Client(bearer_token=TWITTER_BEARER_TOKEN) if tweepy and TWITTER_BEARER_TOKEN else None
-reddit_client = praw.Reddit(client_id=REDDIT_CLIENT_ID, client_secret=REDDIT_CLIENT_SECRET, user_agent="coastal") if praw and REDDIT_CLIENT_ID else None
-youtube_client = gbuild("youtube", "v3", developerKey=YOUTUBE_KEY) if gbuild and YOUTUBE_KEY else None
+def prewarm(background: bool = True):
+    clients.prewarm(background=background)
 
 # --- classifiers (simple) ---
 def classify_hazard(text: str) -> str:
+    import prefilter
+    if prefilter.figurative(text):   # "political waves are rising", "tsunami de haine"
+        return "Uncategorized"
     t = (text or "").lower()
     if "flood" in t or "flooding" in t:
         return "Flood"
@@ -58,11 +138,13 @@ def classify_urgency(text: str) -> str:
 
 # --- geocode helper ---
 def geocode_location(location: str):
-    if not location or not GOOGLE_MAPS_API_KEY:
+    key = _env("GOOGLE_MAPS_API_KEY")
+    if not location or not key:
         return None, None
     try:
-        url = f"https://maps.googleapis.com/maps/api/geocode/json?address={requests.utils.quote(location)}&key={GOOGLE_MAPS_API_KEY}"
-        r = requests.get(url, timeout=10)
+        import http_client
+        r = http_client.get("https://maps.googleapis.com/maps/api/geocode/json",
+                            params={"address": location, "key": key}, cache=True)
         j = r.json()
         if j.get("status") == "OK" and j.get("results"):
             loc = j["results"][0]["geometry"]["location"]
@@ -74,6 +156,7 @@ def geocode_location(location: str):
 # --- fetch functions (safe: return empty list if SDK/keys missing) ---
 def fetch_twitter_posts(query: str, limit: int = 10) -> List[Dict[str,Any]]:
     out = []
+    twitter_client = clients.get("twitter")
     if not twitter_client:
         # fallback: try to read a local file `data/twitter_mock.json` if present
         fp = os.path.join(DATA_DIR, "twitter_mock.json")
@@ -96,12 +179,15 @@ def fetch_twitter_posts(query: str, limit: int = 10) -> List[Dict[str,Any]]:
                     "longitude": None,
                     "location_name": None
                 })
+        clients.report("twitter", True)
     except Exception as e:
         print("Twitter fetch error:", e)
+        clients.report("twitter", False, e)
     return out
 
 def fetch_reddit_posts(query: str, limit: int = 10) -> List[Dict[str,Any]]:
     out = []
+    reddit_client = clients.get("reddit")
     if not reddit_client:
         fp = os.path.join(DATA_DIR, "reddit_mock.json")
         if os.path.exists(fp):
@@ -119,12 +205,15 @@ def fetch_reddit_posts(query: str, limit: int = 10) -> List[Dict[str,Any]]:
                 "hazard": classify_hazard(sub.title),
                 "latitude": None, "longitude": None, "location_name": None
             })
+        clients.report("reddit", True)
     except Exception as e:
         print("Reddit fetch error:", e)
+        clients.report("reddit", False, e)
     return out
 
 def fetch_youtube_posts(query: str, limit: int = 10) -> List[Dict[str,Any]]:
     out = []
+    youtube_client = clients.get("youtube")
     if not youtube_client:
         fp = os.path.join(DATA_DIR, "youtube_mock.json")
         if os.path.exists(fp):
@@ -144,8 +233,10 @@ def fetch_youtube_posts(query: str, limit: int = 10) -> List[Dict[str,Any]]:
                 "hazard": classify_hazard(snip.get("title","")),
                 "latitude": None, "longitude": None, "location_name": None
             })
+        clients.report("youtube", True)
     except Exception as e:
         print("YouTube fetch error:", e)
+        clients.report("youtube", False, e)
     return out
 
 def fetch_instagram_posts(query: str, limit: int = 10) -> List[Dict[str,Any]]:
@@ -161,19 +252,25 @@ def fetch_instagram_posts(query: str, limit: int = 10) -> List[Dict[str,Any]]:
 
 # --- unified fetcher ---
 def fetch_all_social(query: str = "flood,tsunami,cyclone", limit: int = 10) -> List[Dict[str,Any]]:
+    import prefilter, text_classifier, geoparser
     all_posts = []
     for kw in [k.strip() for k in query.split(",") if k.strip()]:
         all_posts += fetch_twitter_posts(kw, limit)
         all_posts += fetch_reddit_posts(kw, limit)
         all_posts += fetch_youtube_posts(kw, limit)
         all_posts += fetch_instagram_posts(kw, limit)
+    # drop RT shells / other languages / irrelevant posts before any classification or geocoding
+    all_posts = prefilter.filter_posts(all_posts)
     # normalize: ensure timestamp and fields present
-    for p in all_posts:
+    # learned classifier runs once over the whole batch; keyword rules fill in where it is unsure
+    preds = text_classifier.classify_batch([p.get("text") or "" for p in all_posts])
+    for p, (hazard, urgency) in zip(all_posts, preds):
         if "timestamp" not in p or not p["timestamp"]:
             p["timestamp"] = datetime.utcnow().isoformat()
-        p.setdefault("hazard", classify_hazard(p.get("text","")))
-        p.setdefault("urgency", classify_urgency(p.get("text","")))
+        p["hazard"] = hazard or p.get("hazard") or classify_hazard(p.get("text",""))
+        p["urgency"] = urgency or p.get("urgency") or classify_urgency(p.get("text",""))
         p.setdefault("location_name", p.get("location_name"))
+        geoparser.fill_location(p)   # offline gazetteer, no API call
     # sort newest first
     try:
         all_posts.sort(key=lambda x: x.get("timestamp",""), reverse=True)
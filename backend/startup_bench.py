@@ -0,0 +1,71 @@
+# startup_bench.py
+# Import-time benchmark for worker start / reload: every run is a fresh interpreter.
+#
+#   python startup_bench.py                     # social_fetcher and main
+#   python startup_bench.py social_fetcher -n 10
+#
+# Prints the median wall time per module and the slowest imports directly under it
+# (python -X importtime, cumulative).
+import argparse, os, statistics, subprocess, sys, time
+
+
+def run_once(module: str):
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        last = [l for l in p.stderr.splitlines() if not l.startswith("import time:")][-1:]
+        raise RuntimeError(f"import {module} failed: {last[0] if last else p.returncode}")
+    rows = []
+    for line in p.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _self, cumulative, name = line[len("import time:"):].split("|")
+            name = name.rstrip()[1:]
+            rows.append((int(cumulative), len(name) - len(name.lstrip()), name.strip()))
+    return wall, rows
+
+
+def direct_imports(rows, module: str):
+    """Rows one level under `module`'s own import line.
+
+    -X importtime prints a module after everything it imported, so its imports are the
+    nested rows right above its line; other top-level rows (site, encodings, .pth hooks)
+    belong to interpreter start."""
+    for i in range(len(rows) - 1, -1, -1):
+        if rows[i][1] == 0 and rows[i][2] == module:
+            break
+    else:
+        return []
+    out = []
+    for j in range(i - 1, -1, -1):
+        if rows[j][1] == 0:
+            break
+        if rows[j][1] == 2:
+            out.append(rows[j])
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure import time of backend modules.")
+    ap.add_argument("modules", nargs="*", default=["social_fetcher", "main"])
+    ap.add_argument("-n", type=int, default=5, help="runs per module")
+    ap.add_argument("--top", type=int, default=10)
+    args = ap.parse_args()
+
+    for module in args.modules:
+        try:
+            runs = [run_once(module) for _ in range(args.n)]
+        except RuntimeError as e:
+            print(f"{module}: {e}")
+            continue
+        walls = [w for w, _ in runs]
+        print(f"{module}: median {statistics.median(walls) * 1e3:.0f} ms "
+              f"(min {min(walls) * 1e3:.0f}, max {max(walls) * 1e3:.0f}, interpreter start included)")
+        top = sorted(direct_imports(runs[-1][1], module), reverse=True)[:args.top]
+        for cumulative, _depth, name in top:
+            print(f"    {cumulative / 1e3:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
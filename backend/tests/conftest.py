@@ -0,0 +1,4 @@
+# backend modules are flat files imported by name (python main.py / uvicorn main:app from backend/)
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+import admission
+from admission import Admission, SingleFlight
+
+
+def test_single_flight_dedupes_until_finished():
+    f = SingleFlight("t")
+    token = f.try_start()
+    assert token is not None
+    assert f.try_start() is None
+    f.finish(token, {"inserted": 3})
+    assert f.stats()["running"] is False and f.stats()["last_result"] == {"inserted": 3}
+    assert f.try_start() is not None
+    assert f.stats()["deduped"] == 1
+
+
+def test_single_flight_released_after_failure():
+    f = SingleFlight("t")
+    token = f.try_start()
+    try:
+        raise RuntimeError("fetch failed")
+    except RuntimeError:
+        f.finish(token)
+    assert f.try_start() is not None
+
+
+def test_stale_flight_is_taken_over():
+    f = SingleFlight("t", stale_seconds=60)
+    abandoned = f.try_start()          # e.g. background task never scheduled
+    f.started_at -= 61
+    token = f.try_start()
+    assert token is not None and f.stats()["stale"] == 1
+    f.finish(abandoned)                # late finish of the abandoned run must not release the new one
+    assert f.try_start() is None
+    f.finish(token)
+    assert f.try_start() is not None
+
+
+@pytest.mark.skipif(admission.fcntl is None, reason="no flock on this platform")
+def test_single_flight_is_shared_between_processes(tmp_path):
+    # two instances on one lock dir behave like two uvicorn workers
+    a, b = SingleFlight("t", lock_dir=str(tmp_path)), SingleFlight("t", lock_dir=str(tmp_path))
+    token = a.try_start()
+    assert token is not None
+    assert b.try_start() is None and b.stats()["deduped"] == 1
+    a.finish(token)
+    token = b.try_start()
+    assert token is not None and a.try_start() is None
+    b.finish(token)
+
+
+def test_low_priority_is_shed_when_over_its_share(monkeypatch):
+    monkeypatch.setitem(admission.WAIT, "high", 0.05)
+
+    async def run():
+        a = Admission(capacity=4, limits={"read": 4})
+        low = [await a.acquire("read", "low") for _ in range(3)]
+        assert low == [True, True, False]          # low may fill half the pool
+        assert await a.acquire("read", "high") and await a.acquire("read", "high")
+        assert not await a.acquire("read", "high")  # class full, waits 50 ms then sheds
+        await a.release("read")
+        assert await a.acquire("read", "high")
+        return a.stats()
+
+    stats = asyncio.run(run())
+    assert stats["classes"]["read"]["low"]["shed"] == 1
+    assert stats["classes"]["read"]["high"]["shed"] == 1
@@ -0,0 +1,78 @@
+import sqlite3, threading
+
+import numpy as np
+
+import analytics_cube
+import partitions
+from analytics_cube import RollupCube, _group
+
+
+def test_group_does_not_collide_with_missing_cells():
+    rng = np.random.default_rng(1)
+    n = 5000
+    no_cell = analytics_cube._NO_CELL
+    parts = [
+        rng.integers(0, 5, n), rng.integers(0, 4, n), rng.integers(0, 3, n),
+        rng.integers(480_000, 490_000, n).astype(np.int64),
+        np.where(rng.random(n) < 0.2, no_cell, rng.integers(-180, 180, n)).astype(np.int32),
+        np.where(rng.random(n) < 0.2, no_cell, rng.integers(-360, 360, n)).astype(np.int32),
+    ]
+    first, inv = _group(parts)
+    rows = list(zip(*(p.tolist() for p in parts)))
+    assert len(first) == len(set(rows))
+    for i, row in enumerate(rows):
+        assert rows[first[inv[i]]] == row
+
+
+def test_query_counts_match_raw_rows():
+    cube = RollupCube(cell_deg=0.5)
+    hazards = ["Flood", "Flood", "Cyclone", None]
+    sources = ["Twitter", "Citizen", "Twitter", "Reddit"]
+    ts = [1_757_000_000, 1_757_000_100, 1_757_090_000, float("nan")]
+    lats, lons = [13.1, 13.2, float("nan"), 19.0], [80.2, 80.3, float("nan"), 72.8]
+    cube.add(hazards, sources, ["High", "High", "Low", None], ts, lats, lons)
+    assert cube.query(["hazard"]) == [{"hazard": "Flood", "count": 2}, {"hazard": "Cyclone", "count": 1},
+                                      {"hazard": "Unknown", "count": 1}]
+    assert cube.query(["cell"], top=1) == [{"cell": [13.25, 80.25], "count": 2}]
+    assert cube.query([], filters={"source": ["Twitter"]}) == [{"count": 2}]
+    assert cube.query([], bbox=(12, 79, 14, 81)) == [{"count": 2}]
+
+
+def test_refresh_folds_in_new_rows_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(partitions, "PARTITION_DIR", str(tmp_path / "partitions"))
+    db = str(tmp_path / "coastal.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE social_media (id INTEGER PRIMARY KEY, source TEXT, text TEXT, timestamp TEXT, url TEXT, "
+                 "hazard TEXT, urgency TEXT, latitude REAL, longitude REAL, location_name TEXT)")
+    conn.execute("INSERT INTO social_media (source, hazard, timestamp) VALUES ('Twitter', 'Flood', '2025-09-01T10:00:00')")
+    conn.commit()
+    cube = RollupCube()
+    cube.refresh(lambda: sqlite3.connect(db))
+    conn.execute("INSERT INTO social_media (source, hazard, timestamp) VALUES ('Reddit', 'Flood', '2025-09-01T11:00:00')")
+    conn.commit()
+    conn.close()
+    cube.refresh(lambda: sqlite3.connect(db), force=True)
+    assert cube.query(["source"]) == [{"source": "Twitter", "count": 1}, {"source": "Reddit", "count": 1}]
+
+
+def test_periodic_reload_picks_up_rows_changed_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr(partitions, "PARTITION_DIR", str(tmp_path / "partitions"))
+    db = str(tmp_path / "coastal.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY, hazard_type TEXT, urgency TEXT, timestamp TEXT, "
+                 "latitude REAL, longitude REAL)")
+    conn.executemany("INSERT INTO reports (hazard_type, urgency, timestamp) VALUES ('Flood', 'Low', ?)",
+                     [("2025-09-01T10:00:00",)] * 3)
+    conn.commit()
+    cube = RollupCube(reload_seconds=60)
+    cube.refresh(lambda: sqlite3.connect(db))
+    conn.execute("UPDATE reports SET urgency = 'High'")   # update_urgency.py re-classifies in place
+    conn.commit()
+    conn.close()
+    cube.loader.loaded_at -= 61
+    cube.refresh(lambda: sqlite3.connect(db), force=True)
+    for t in threading.enumerate():
+        if t.name == "cube-reload":
+            t.join(10)
+    assert cube.query(["urgency"]) == [{"urgency": "High", "count": 3}]
+    assert cube.stats()["reloads"] == 1
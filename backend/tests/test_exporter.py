@@ -0,0 +1,27 @@
+import sqlite3
+
+import pytest
+
+import exporter
+
+
+def test_check_rejects_missing_table_before_streaming(tmp_path):
+    db = str(tmp_path / "coastal.db")
+    sqlite3.connect(db).close()
+    with pytest.raises(LookupError):
+        exporter.check("reports", "csv", db)
+    with pytest.raises(ValueError):
+        exporter.check("users", "csv", db)
+
+
+def test_csv_export(tmp_path):
+    db = str(tmp_path / "coastal.db")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY, hazard_type TEXT, timestamp DATETIME)")
+    conn.executemany("INSERT INTO reports (hazard_type, timestamp) VALUES (?, ?)",
+                     [("Flood", "2025-09-01 10:00:00"), ("Cyclone", "2025-09-02 10:00:00")])
+    conn.commit()
+    conn.close()
+    cols = exporter.check("reports", "csv", db)
+    body = b"".join(exporter.stream("reports", "csv", hazard="Flood", db_path=db, cols=cols)).decode()
+    assert body.splitlines() == ["id,hazard_type,timestamp", "1,Flood,2025-09-01 10:00:00"]
@@ -0,0 +1,78 @@
+import pytest
+
+import geoparser
+from geoparser import Gazetteer
+
+ENTRIES = [
+    (["Mumbai", "Bombay"], 19.076, 72.8777, "city", "Maharashtra"),
+    (["Navi Mumbai"], 19.033, 73.0297, "city", "Maharashtra"),
+    (["Port Blair"], 11.6234, 92.7265, "city", "Andaman and Nicobar"),
+    (["Blair"], 0.0, 0.0, "locality", "Nowhere"),
+    (["Andaman", "Andaman and Nicobar"], 11.7401, 92.6586, "state", "Andaman and Nicobar"),
+    (["Puri"], 19.8135, 85.8312, "city", "Odisha"),
+    (["Diu"], 20.7144, 70.9874, "city", "Dadra and Nagar Haveli and Daman and Diu"),
+    (["Velachery"], 12.9815, 80.218, "locality", "Tamil Nadu"),
+    (["Kerala"], 10.8505, 76.2711, "state", "Kerala"),
+    (["Mandvi"], 22.8333, 69.3500, "city", "Gujarat"),
+    (["Mandvi"], 18.9530, 72.8330, "locality", "Maharashtra"),
+]
+
+
+@pytest.fixture
+def gazetteer(monkeypatch):
+    g = Gazetteer(ENTRIES)
+    monkeypatch.setattr(geoparser, "_gazetteer", g)
+    return g
+
+
+def _names(g, text):
+    return [surface for _ids, _start, surface, _prev in g.find(text)]
+
+
+def test_longest_match_wins_at_each_position(gazetteer):
+    assert _names(gazetteer, "Waterlogging in Navi Mumbai and Mumbai") == ["Navi Mumbai", "Mumbai"]
+    assert _names(gazetteer, "Tsunami alert for Andaman and Nicobar islands") == ["Andaman and Nicobar"]
+    # a partial multi-word name falls back to the shorter entry it contains
+    assert _names(gazetteer, "Andaman and the rest") == ["Andaman"]
+
+
+def test_overlapping_names_are_matched_once(gazetteer):
+    # "Blair" is a name on its own but is consumed by "Port Blair"
+    assert _names(gazetteer, "Rough sea at Port Blair") == ["Port Blair"]
+    assert gazetteer.resolve("Rough sea at Port Blair")["location_name"] == "Port Blair"
+
+
+def test_confidence_scoring(gazetteer):
+    conf = lambda text: gazetteer.resolve(text)["confidence"]
+    assert conf("velachery flooded") == 0.8                     # locality
+    assert conf("Velachery flooded") == 0.9                     # + written as a proper noun
+    assert conf("flooding in velachery") == 0.9                 # + after a preposition
+    assert conf("Flooding in Velachery") == 1.0
+    assert conf("Heavy rain in Kerala") > 0 and conf("Heavy rain in Kerala") < conf("Heavy rain in Puri")
+    assert conf("waves at Diu") < conf("waves at Port Blair")   # short names are penalised
+    assert conf("Flooding in Mandvi") == 0.7                    # two places share the name
+    assert gazetteer.resolve("Velachery and Kerala")["location_name"] == "Velachery"   # most specific wins
+    assert gazetteer.resolve("no place here") is None
+
+
+def test_parse_applies_the_confidence_threshold(gazetteer):
+    assert geoparser.parse("rain in kerala", min_confidence=0.5) is None
+    assert geoparser.parse("rain in kerala", min_confidence=0.0)["location_name"] == "Kerala"
+
+
+def test_fill_location_never_overwrites_coordinates(gazetteer):
+    post = {"text": "Flooding in Puri", "latitude": 0.0, "longitude": 0.0, "location_name": "Gulf of Guinea"}
+    assert not geoparser.fill_location(post)
+    assert (post["latitude"], post["longitude"], post["location_name"]) == (0.0, 0.0, "Gulf of Guinea")
+
+    post = {"text": "Flooding in Puri", "latitude": None, "longitude": None, "location_name": "Puri beach"}
+    assert geoparser.fill_location(post)
+    assert (post["latitude"], post["longitude"]) == (19.8135, 85.8312)
+    assert post["location_name"] == "Puri beach" and post["geo_confidence"] == 0.8
+
+
+def test_shipped_gazetteer_is_coastal_only():
+    g = Gazetteer.load(geoparser.GAZETTEER_PATH)
+    states = {state for *_rest, state in g.entries}
+    assert not states & {"Assam", "Punjab"}
+    assert g.resolve("Flooding in Guwahati") is None
@@ -0,0 +1,68 @@
+import json, os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "social media analysis", "Project", "app"))
+import hotspot_cache
+from hotspot_cache import HotspotCache
+from report_log import ReportLog
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(hotspot_cache, "SNAPSHOT_DELAY", 0)
+    log = ReportLog(str(tmp_path / "reports.ndjson"))
+    return HotspotCache(str(tmp_path / "social.json"), log, str(tmp_path / "hotspots.json"))
+
+
+def _write_posts(cache, posts):
+    with open(cache.social_path, "w", encoding="utf-8") as f:
+        json.dump(posts, f)
+    os.utime(cache.social_path, ns=(0, len(posts)))   # a distinct mtime even within one clock tick
+
+
+def _post(lat, lon, name="Chennai"):
+    return {"text": "flooding", "latitude": lat, "longitude": lon, "location_name": name}
+
+
+def test_unchanged_sources_are_served_from_the_cached_body(cache):
+    _write_posts(cache, [_post(13.08, 80.27)])
+    version = cache.refresh()
+    body = cache.body()
+    assert cache.refresh() == version and cache.body() is body
+
+
+def test_new_posts_and_reports_make_a_new_version(cache):
+    _write_posts(cache, [_post(13.08, 80.27)])
+    v1 = cache.refresh()
+    _write_posts(cache, [_post(13.08, 80.27), _post(19.07, 72.87, "Mumbai")])
+    v2 = cache.refresh()
+    cache.reports_log.append({"latitude": 19.07, "longitude": 72.87, "location": "Mumbai"}, durable=False)
+    v3 = cache.refresh()
+    assert v1 < v2 < v3
+    assert [h["count"] for h in json.loads(cache.body())] == [2, 1]
+
+
+def test_hotspots_expire_with_their_source(cache):
+    _write_posts(cache, [_post(13.08, 80.27)])
+    cache.reports_log.append({"latitude": 13.08, "longitude": 80.27, "location": "Chennai"}, durable=False)
+    cache.refresh()
+    assert json.loads(cache.body())[0]["count"] == 2
+    os.remove(cache.social_path)
+    cache.refresh()
+    assert json.loads(cache.body())[0]["count"] == 1
+    cache.reports_log.compact()   # new log generation: the report aggregate is rebuilt, not doubled
+    cache.refresh()
+    assert json.loads(cache.body())[0]["count"] == 1
+
+
+def test_points_are_counted_per_grid_cell(cache):
+    _write_posts(cache, [_post(13.0827, 80.2707), _post(13.08271, 80.27069), _post("13.0827", "80.2707"),
+                         _post(13.2, 80.27, "Ennore")])
+    cache.refresh()
+    hotspots = json.loads(cache.body())
+    assert [h["count"] for h in hotspots] == [3, 1]
+    top = hotspots[0]
+    cell = hotspot_cache.CELL_DEG
+    assert abs(top["latitude"] - 13.0827) <= cell / 2 and abs(top["longitude"] - 80.2707) <= cell / 2
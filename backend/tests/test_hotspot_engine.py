@@ -0,0 +1,68 @@
+import sqlite3
+import threading
+import time
+
+from hotspot_engine import HotspotEngine
+
+
+def _db(path=":memory:"):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY, latitude REAL, longitude REAL, urgency TEXT, timestamp TEXT)")
+    week_ago = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() - 7 * 86400))
+    conn.executemany("INSERT INTO reports (latitude, longitude, urgency, timestamp) VALUES (?, ?, ?, ?)",
+                     [(19.8, 85.8, "Low", week_ago)] * 4)
+    conn.commit()
+    return conn
+
+
+def test_half_life_zero_keeps_plain_weight_sums():
+    conn = _db()
+    decayed, plain = HotspotEngine(half_life_hours=6), HotspotEngine(half_life_hours=0)
+    decayed.refresh_from_db(conn)
+    plain.refresh_from_db(conn)
+    assert decayed.clusters(now=time.time()) == []   # a week old: decayed far below min_score
+    [c] = plain.clusters(now=time.time())
+    assert c["score"] == 4.0 and c["count"] == 4
+
+
+def test_reload_refolds_rows_updated_in_place():
+    conn = _db()
+    engine = HotspotEngine(half_life_hours=0, reload_seconds=60)
+    engine.refresh_from_db(conn)
+    conn.execute("UPDATE reports SET urgency = 'High'")
+    engine.refresh_from_db(conn)
+    assert engine.clusters()[0]["score"] == 4.0   # high-water mark only: update not seen yet
+    engine.loader.loaded_at -= 61
+    engine.refresh_from_db(conn)
+    [c] = engine.clusters()
+    assert c["score"] == 12.0 and c["count"] == 4
+
+
+def test_background_reload_does_not_block_readers(tmp_path):
+    conn = _db(str(tmp_path / "coastal.db"))
+    engine = HotspotEngine(half_life_hours=0, reload_seconds=60)
+    engine.refresh_from_db(conn)
+    conn.execute("UPDATE reports SET urgency = 'High'")
+    conn.commit()
+
+    release, loading = threading.Event(), threading.Event()
+    load_all = engine.loader.load_all
+
+    def slow_load_all(*args):
+        loading.set()
+        release.wait(5)
+        return load_all(*args)
+
+    engine.loader.load_all = slow_load_all
+    engine.loader.loaded_at -= 61
+    t0 = time.perf_counter()
+    engine.refresh_from_db(conn)   # starts the reload
+    assert loading.wait(5)
+    engine.refresh_from_db(conn)   # a reader while the reload is running
+    assert time.perf_counter() - t0 < 1
+    assert engine.clusters()[0]["score"] == 4.0   # still the current grid
+    release.set()
+    for t in threading.enumerate():
+        if t.name == "hotspots-reload":
+            t.join(5)
+    assert engine.clusters()[0]["score"] == 12.0 and engine.loader.reloads == 1
@@ -0,0 +1,37 @@
+import os
+
+import http_client
+
+def test_cache_key_blanks_credentials():
+    key = http_client.cache_key("https://maps.googleapis.com/maps/api/geocode/json?address=Puri&key=AIzaSECRET")
+    assert "SECRET" not in key and "address=Puri" in key
+
+
+def test_credentials_never_written_to_disk(tmp_path, monkeypatch):
+    class Response:
+        status_code = 200
+        headers = {"Cache-Control": "max-age=60"}
+        content = b'{"status": "OK"}'
+
+    monkeypatch.setattr(http_client, "request", lambda *a, **kw: Response())
+    monkeypatch.setattr(http_client, "_cache", http_client.DiskCache(str(tmp_path)))
+    for _ in range(2):
+        r = http_client.get("https://example.org/geo", params={"address": "Puri", "key": "AIzaSECRET"}, cache=True)
+        assert r.content == Response.content
+    assert getattr(r, "from_cache", False)
+    for d, _, names in os.walk(tmp_path):
+        for n in names:
+            with open(os.path.join(d, n), "rb") as f:
+                assert b"SECRET" not in f.read()
+
+
+
+def test_retry_after_is_capped(monkeypatch):
+    class Response:
+        headers = {"Retry-After": "3600"}
+
+    monkeypatch.setattr(http_client, "MAX_RETRY_AFTER", 5.0)
+    retry = http_client.session().adapters["https://"].max_retries
+    assert retry.get_retry_after(Response()) == 5.0
+    Response.headers = {"Retry-After": "2"}
+    assert retry.get_retry_after(Response()) == 2
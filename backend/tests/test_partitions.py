@@ -0,0 +1,110 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+import partitions
+
+MONTHS = [f"2024-{m:02d}" for m in range(11, 13)] + [f"2025-{m:02d}" for m in range(1, 11)]   # 12 months
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(partitions, "PARTITION_DIR", str(tmp_path / "partitions"))
+    monkeypatch.setattr(partitions, "CACHE_DIR", str(tmp_path / "partitions" / ".cache"))
+    path = str(tmp_path / "coastal.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT, hazard_type TEXT, "
+                 "description TEXT, latitude REAL, longitude REAL, file_path TEXT, timestamp DATETIME)")
+    conn.execute("CREATE TABLE social_media (id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, text TEXT, timestamp TEXT, "
+                 "url TEXT, hazard TEXT, urgency TEXT, latitude REAL, longitude REAL, location_name TEXT)")
+    for month in MONTHS:
+        conn.execute("INSERT INTO reports (hazard_type, latitude, longitude, timestamp) VALUES ('Flood', 13, 80, ?)",
+                     (f"{month}-15 10:00:00",))
+        conn.execute("INSERT INTO social_media (hazard, latitude, longitude, timestamp) VALUES ('Flood', 13, 80, ?)",
+                     (f"{month}-15T10:00:00",))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _archive(db, tables):
+    partitions.archive(db, tables=tables, now=datetime(2025, 10, 20, tzinfo=timezone.utc))
+
+
+def test_connect_attaches_each_table_file(db):
+    tables = ("social_media", "reports")
+    _archive(db, tables)
+    assert len(partitions.partitions("reports")) == len(partitions.partitions("social_media")) == 10
+    conn = partitions.connect(db, since="2025-08-01", tables=tables)
+    try:
+        for table in tables:
+            n = conn.execute(f"SELECT COUNT(*) FROM {table}_all WHERE timestamp >= '2025-08-01'").fetchone()[0]
+            assert n == 3   # Aug archived, Sep + Oct hot
+    finally:
+        conn.close()
+
+
+def test_connect_counts_files_not_months(db):
+    tables = ("social_media", "reports")
+    _archive(db, tables)
+    partitions.connect(db, since="2025-05-01", tables=tables).close()   # 4 months x 2 tables = 8 files
+    with pytest.raises(ValueError):
+        partitions.connect(db, since="2025-04-01", tables=tables)       # 10 files > MAX_ATTACH
+
+
+def test_iter_connections_reads_every_row_once(db):
+    tables = ("social_media", "reports")
+    _archive(db, tables)
+    totals = {t: 0 for t in tables}
+    n_conns = 0
+    for conn in partitions.iter_connections(db, tables=tables):
+        n_conns += 1
+        for t in tables:
+            totals[t] += conn.execute(f"SELECT COUNT(*) FROM {t}_all").fetchone()[0]
+    assert n_conns > 1
+    assert totals == {t: len(MONTHS) for t in tables}
+
+
+def test_stream_db_reads_unpartitioned_table_once(db, monkeypatch):
+    import visualize_hotspot
+    monkeypatch.setattr(partitions, "PARTITIONED_TABLES", ("social_media",))
+    _archive(db, ("social_media",))
+    monkeypatch.setattr(partitions, "MAX_ATTACH", 4)   # 10 archived months -> 3 connections
+    n = sum(len(lat) for lat, _, _ in visualize_hotspot.stream_db(db))
+    assert n == 2 * len(MONTHS)
+
+
+def _add_post(db, url, month):
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO social_media (text, url, hazard, latitude, longitude, timestamp) "
+                 "VALUES ('flood', ?, 'Flood', 13, 80, ?)", (url, f"{month}-20T10:00:00"))
+    conn.commit()
+    conn.close()
+
+
+def test_archived_posts_stay_known_for_dedupe(db):
+    _add_post(db, "https://reddit.com/r/x/1", "2025-01")
+    _add_post(db, None, "2025-02")
+    _archive(db, ("social_media",))
+    conn = sqlite3.connect(db)
+    cur = conn.cursor()
+    assert partitions.is_archived(cur, "social_media", partitions.dedupe_key("https://reddit.com/r/x/1", "flood", None))
+    assert partitions.is_archived(cur, "social_media", partitions.dedupe_key(None, "flood", "2025-02-20T10:00:00"))
+    assert not partitions.is_archived(cur, "social_media", "https://reddit.com/r/x/2")
+    # partitions archived before archived_keys existed are backfilled on the next archive run
+    conn.execute("DROP TABLE archived_keys")
+    conn.commit()
+    _archive(db, ("social_media",))
+    assert partitions.is_archived(cur, "social_media", "https://reddit.com/r/x/1")
+    conn.close()
+
+
+def test_full_reload_includes_archived_rows(db):
+    from hotspot_engine import HotspotEngine
+    _archive(db, ("social_media",))
+    engine = HotspotEngine(half_life_hours=0)
+    conn = sqlite3.connect(db)
+    engine.refresh_from_db(conn)
+    conn.close()
+    assert sum(c["count"] for c in engine.clusters(min_score=0)) == 2 * len(MONTHS)   # reports + every post month
@@ -0,0 +1,45 @@
+import pytest
+
+import prefilter
+
+
+@pytest.mark.parametrize("text", [
+    "Flooding in Velachery, help needed",
+    "Massive flooding in Assam today",
+    "Cyclone Biparjoy intensifies into severe storm",
+    "Tsunami hits Indonesia, many dead",
+    "बाढ़ से गांव डूबा",
+    "High tide warning for fishermen in Puri, stay away from the sea",
+])
+def test_bare_hazard_posts_pass(text):
+    keep, reason, score = prefilter.check(text)
+    assert keep, (reason, score)
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("Tsunami Remix! new song out now", "noise"),
+    ("What a flood of goals in the football match tonight, fans going crazy", "noise"),
+    ("RT @someone: flood in Chennai", "retweet_or_empty"),
+    ("Le tsunami de haine contre les joueurs est incroyable pour le club", "language:fr"),
+    ("Lovely sunny day at the park", "no_hazard_term"),
+])
+def test_noise_is_dropped(text, reason):
+    keep, got, _ = prefilter.check(text)
+    assert not keep and got == reason
+
+
+def test_place_signal_comes_from_gazetteer():
+    # Velachery is only in the gazetteer, not in any hand-written list
+    assert prefilter.relevance_score("flood near Velachery") > prefilter.relevance_score("flood near somewhere")
+
+
+@pytest.mark.parametrize("text, hazard", [
+    ("political waves are rising", "Uncategorized"),
+    ("Ça va mec, niveau de tsunami de haine ça va non ?", "Uncategorized"),
+    ("a wave of support for the team", "Uncategorized"),
+    ("High waves lash Puri coast", "High Wave"),
+    ("Massive wave of flood water hits village near the coast", "Flood"),
+])
+def test_figurative_hazard_words_are_not_classified(text, hazard):
+    from social_fetcher import classify_hazard
+    assert classify_hazard(text) == hazard
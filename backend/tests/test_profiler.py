@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import profiler
+
+
+class Request(SimpleNamespace):
+    method = "GET"
+    headers = {}
+    query_params = {}
+    url = SimpleNamespace(path="/export/reports")
+
+
+async def _body():
+    await asyncio.sleep(0.05)   # slow only while streaming
+    yield b"chunk"
+
+
+def _run(ring, request, is_admin=False):
+    async def call_next(_request):
+        return SimpleNamespace(status_code=200, headers={}, body_iterator=_body())
+
+    async def go():
+        response = await profiler.handle(request, call_next, lambda r: is_admin)
+        chunks = [c async for c in response.body_iterator]
+        return response, chunks
+
+    return asyncio.run(go())
+
+
+def test_total_time_includes_streamed_body(tmp_path, monkeypatch):
+    ring = profiler.CaptureRing(str(tmp_path), 5)
+    monkeypatch.setattr(profiler, "ring", ring)
+    monkeypatch.setattr(profiler, "SLOW_REQUEST_MS", 30)
+    response, chunks = _run(ring, Request())
+    assert chunks == [b"chunk"]
+    assert "X-Slow-Capture" not in response.headers   # not slow yet when headers were sent
+    [capture] = ring.list()
+    assert capture["kind"] == "slow" and capture["total_ms"] >= 50
+
+
+def test_profile_id_reserved_before_body(tmp_path, monkeypatch):
+    ring = profiler.CaptureRing(str(tmp_path), 5)
+    monkeypatch.setattr(profiler, "ring", ring)
+    response, _ = _run(ring, Request(headers={"x-profile": "1"}), is_admin=True)
+    capture = ring.get(int(response.headers["X-Profile-Capture"]))
+    assert capture["kind"] == "profile" and capture["timings_ms"]["total"] >= 50
+
+
+def test_folded_stacks_are_labelled_by_thread():
+    sampler = profiler.StackSampler(0.001)
+    done = threading.Event()
+    worker = threading.Thread(target=done.wait)
+    worker.start()
+    sampler.start()
+    time.sleep(0.02)
+    sampler.stop()
+    done.set()
+    worker.join()
+    main = threading.get_ident()
+    folded = sampler.folded({main, worker.ident}, {main: "event-loop", worker.ident: "worker"})
+    roots = {line.split(";", 1)[0] for line in folded.splitlines()}
+    assert roots == {"event-loop", "worker"}
@@ -0,0 +1,77 @@
+import json, sqlite3
+
+import pytest
+
+from recent_posts import COLUMNS, RecentPosts
+
+
+def _row(row_id, timestamp, hazard="Flood", urgency="Low"):
+    return (row_id, "Twitter", f"post {row_id}", timestamp, f"https://x.com/{row_id}", hazard, urgency, 13.0, 80.2, "Chennai")
+
+
+def _ids(body):
+    return [p["id"] for p in json.loads(body)]
+
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE social_media (id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, text TEXT, "
+                 "timestamp TEXT, url TEXT, hazard TEXT, urgency TEXT, latitude REAL, longitude REAL, location_name TEXT)")
+    return conn
+
+
+def _insert(conn, *rows):
+    conn.executemany(f"INSERT INTO social_media ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+
+
+def test_back_dated_posts_are_kept_in_timestamp_order():
+    rp = RecentPosts(capacity=3)
+    for row in (_row(1, "2025-09-01T10:00"), _row(2, "2025-09-01T12:00"), _row(3, "2025-09-01T11:00")):
+        assert rp.add(row)
+    assert _ids(rp.list_json(3)) == [2, 3, 1] and rp.complete
+    # full ring: a back-dated post still newer than the oldest evicts it
+    assert rp.add(_row(4, "2025-09-01T10:30"))
+    assert _ids(rp.list_json(3)) == [2, 3, 4] and not rp.complete
+    # older than everything kept: dropped
+    assert not rp.add(_row(5, "2025-08-31T00:00"))
+    assert _ids(rp.list_json(3)) == [2, 3, 4]
+    # same timestamp: ties broken by id, like the SQL ORDER BY timestamp DESC, id DESC
+    assert rp.add(_row(6, "2025-09-01T12:00"))
+    assert _ids(rp.list_json(3)) == [6, 2, 3]
+
+
+def test_falls_back_to_the_db_when_the_buffer_cannot_answer(db):
+    _insert(db, *(_row(i, f"2025-09-01T{i:02d}:00", hazard="Flood" if i % 2 else "Cyclone") for i in range(1, 6)))
+    rp = RecentPosts(capacity=4)
+    rp.refresh_from_db(db)
+    assert len(rp) == 4 and not rp.complete   # row 1 did not fit
+    assert rp.list_json(5) is None            # limit beyond the ring
+    assert _ids(rp.list_json(2, hazard="Flood")) == [5, 3]
+    assert rp.list_json(3, hazard="Flood") is None   # the third Flood post is only in the DB
+
+    small = RecentPosts(capacity=10)
+    small.refresh_from_db(db)
+    assert small.complete and _ids(small.list_json(3, hazard="Flood")) == [5, 3, 1]
+    assert small.list_json(11) is None
+
+
+def test_new_rows_are_folded_in_by_id(db):
+    _insert(db, _row(1, "2025-09-01T10:00"))
+    rp = RecentPosts(capacity=10)
+    rp.refresh_from_db(db)
+    _insert(db, _row(2, "2025-09-01T09:00"), _row(3, "2025-09-01T11:00"))
+    assert rp.refresh_from_db(db) == 2 and rp.last_id == 3
+    assert _ids(rp.list_json(10)) == [3, 1, 2]
+
+
+def test_periodic_reload_picks_up_rows_changed_in_place(db):
+    _insert(db, _row(1, "2025-09-01T10:00", urgency="Low"))
+    rp = RecentPosts(capacity=10)
+    rp.refresh_from_db(db)
+    db.execute("UPDATE social_media SET urgency = 'High'")   # update_urgency.py
+    rp.refresh_from_db(db)
+    assert rp.list_json(10, urgency="High") == b"[]"
+    rp._loaded_at -= 3600   # reload due
+    rp.refresh_from_db(db)
+    assert _ids(rp.list_json(10, urgency="High")) == [1]
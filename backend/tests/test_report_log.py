@@ -0,0 +1,68 @@
+import json, os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "social media analysis", "Project", "app"))
+import report_log
+from report_log import ReportLog
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "reports.ndjson"), str(tmp_path / "reports.json")
+
+
+def test_legacy_migration_keeps_duplicate_and_missing_ids(paths):
+    path, legacy = paths
+    with open(legacy, "w") as f:
+        json.dump([{"id": 1700000000, "description": "a"}, {"id": 1700000000, "description": "b"},
+                   {"description": "c"}], f)
+    log = ReportLog(path, legacy_json=legacy)
+    try:
+        assert len(log) == 3
+        assert [r["description"] for r in log.scan()] == ["a", "b", "c"]
+        assert log.dead == 0
+        assert [r.get("legacy_id") for r in log.scan()] == [1700000000, 1700000000, None]
+        new = log.append({"description": "d"})
+        assert new["id"] not in {r["id"] for r in list(log.scan())[:3]}
+        log.compact()
+        assert [r["description"] for r in log.scan()] == ["a", "b", "c", "d"]
+    finally:
+        log.close()
+
+
+def test_compaction_drops_torn_and_superseded_lines(paths):
+    path, _ = paths
+    log = ReportLog(path)
+    a = log.append({"description": "a"})
+    log.append({"description": "b"})
+    os.write(log.fd, json.dumps({"id": a["id"], "description": "a2"}).encode() + b"\n")   # newer copy of a
+    os.write(log.fd, b'{"id": 12, "descr')                       # crashed write
+    log.close()
+
+    log = ReportLog(path)
+    try:
+        assert {r["description"] for r in log.scan()} == {"a2", "b"}
+        assert log.dead > 0
+        size = os.path.getsize(path)
+        log.compact()
+        assert log.dead == 0 and os.path.getsize(path) < size
+        assert sorted(r["description"] for r in log.scan()) == ["a2", "b"]
+        assert log.get(a["id"])["description"] == "a2"
+    finally:
+        log.close()
+
+
+def test_periodic_compaction_runs_when_dead_bytes_exist(paths, monkeypatch):
+    path, _ = paths
+    log = ReportLog(path)
+    try:
+        log.append({"description": "a"})
+        os.write(log.fd, b'{"torn')
+        monkeypatch.setattr(report_log, "COMPACT_INTERVAL", 0)
+        log.append({"description": "b"})          # catches up the torn line, then compacts
+        assert log.dead == 0
+        assert [r["description"] for r in log.scan()] == ["a", "b"]
+    finally:
+        log.close()
@@ -0,0 +1,29 @@
+import random
+
+import pytest
+
+from rolling_aggregates import _RangeSum
+
+
+def _buckets(seed, n=60):
+    rng = random.Random(seed)
+    return {b: {("cell", rng.choice("ab")): [rng.randint(1, 3), float(rng.randint(1, 9))]}
+            for b in range(n) if rng.random() < 0.7}
+
+
+def _plain(sums):
+    return {k: (c, round(w, 6)) for k, (c, w) in sums.items()}
+
+
+@pytest.mark.parametrize("lo, hi", [(12, 0), (24, 12)])
+@pytest.mark.parametrize("steps", [[1] * 40, [3, 1, 13, 2, 25, 1, 7]])
+def test_advance_matches_rebuild(lo, hi, steps):
+    buckets = _buckets(lo + len(steps))
+    rolling, fresh = _RangeSum(lo, hi), _RangeSum(lo, hi)
+    head = 5
+    rolling.rebuild(head, buckets)
+    for step in steps:   # jumps wider than the range included
+        rolling.advance(head, head + step, buckets)
+        head += step
+        fresh.rebuild(head, buckets)
+        assert _plain(rolling.sums) == _plain(fresh.sums)
@@ -0,0 +1,12 @@
+from startup_bench import direct_imports
+
+
+def test_only_imports_under_the_target_module_are_reported():
+    # (cumulative us, depth, name) in -X importtime order: children before their parent
+    rows = [
+        (900, 2, "encodings.aliases"), (1200, 0, "encodings"),
+        (400, 2, "certifi.core"), (700, 0, "certifi"),          # imported by a .pth file at startup
+        (50, 4, "sqlite3.dbapi2"), (300, 2, "sqlite3"), (600, 2, "partitions"), (2000, 0, "incremental"),
+    ]
+    assert direct_imports(rows, "incremental") == [(600, 2, "partitions"), (300, 2, "sqlite3")]
+    assert direct_imports(rows, "missing") == []
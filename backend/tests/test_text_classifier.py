@@ -0,0 +1,41 @@
+import pytest
+
+import rule_classifier
+import text_classifier
+from text_classifier import TextClassifier
+
+EXAMPLES = [
+    {"text": "tsunami waves hit the coast", "hazard": "Tsunami", "urgency": "High"},
+    {"text": "huge tsunami warning issued", "hazard": "Tsunami", "urgency": "High"},
+    {"text": "lovely sunny day at the beach", "hazard": "Uncategorized", "urgency": "Low"},
+    {"text": "nice weather at the park", "hazard": "Uncategorized", "urgency": "Low"},
+] * 5
+
+
+@pytest.fixture
+def model(monkeypatch):
+    m = TextClassifier.train(EXAMPLES, epochs=20)
+    monkeypatch.setattr(text_classifier, "_model", m)
+    return m
+
+
+def test_heads_without_holdout_win_fall_back_to_rules(model):
+    model.holdout = {"hazard": (0.61, 0.67), "urgency": (0.70, 0.61)}
+    assert text_classifier.classify_batch(["tsunami waves hit the coast"], min_confidence=0) == [(None, "High")]
+    model.holdout = {}   # model file from before holdout scores were stored
+    assert text_classifier.classify_batch(["tsunami waves hit the coast"], min_confidence=0) == [(None, None)]
+
+
+def test_holdout_round_trip(model, tmp_path):
+    model.holdout = {"hazard": (0.8, 0.67), "urgency": (0.5, 0.61)}
+    path = str(tmp_path / "m.npz")
+    model.save(path)
+    loaded = TextClassifier.load(path)
+    assert loaded.holdout == model.holdout
+    assert loaded.beats_rules("hazard") and not loaded.beats_rules("urgency")
+
+
+def test_model_labels_mapped_to_rule_labels(model):
+    model.holdout = {"hazard": (0.9, 0.6), "urgency": (0.9, 0.6)}
+    hazard, _ = rule_classifier.classify_post("huge tsunami warning issued")
+    assert hazard == "Other"   # rules have no Tsunami label
@@ -0,0 +1,75 @@
+import sqlite3
+
+import numpy as np
+
+import tiles
+from hotspot_engine import HotspotEngine
+from tiles import TileService
+
+
+class _Engine:
+    def __init__(self):
+        self.lat = np.array([13.08, 19.07, 22.57])
+        self.lon = np.array([80.27, 72.87, 88.36])
+        self.weight = np.ones(3)
+        self.size = 1
+        self.generation = 1
+
+    def refresh_from_db(self, conn):
+        pass
+
+    def points(self):
+        n = self.size
+        return self.generation, self.lat[:n].copy(), self.lon[:n].copy(), self.weight[:n].copy()
+
+
+class _Conn:
+    def close(self):
+        pass
+
+
+def _count(geojson):
+    return sum(f["properties"]["count"] for f in geojson["features"])
+
+
+def test_tile_is_rendered_from_the_version_it_was_asked_for():
+    engine = _Engine()
+    service = TileService(engine)
+    v1 = service.refresh(_Conn, force=True)
+    engine.size, engine.generation = 3, 2              # new rows arrive concurrently
+    v2 = service.refresh(_Conn, force=True)
+    assert v1 != v2
+
+    version, geojson = service.cluster_tile(0, 0, 0, v1)
+    assert version == v1 == geojson["version"] and _count(geojson) == 1
+    version, geojson = service.cluster_tile(0, 0, 0, v2)
+    assert version == v2 == geojson["version"] and _count(geojson) == 3
+    # cached per version, not mixed up
+    assert _count(service.cluster_tile(0, 0, 0, v1)[1]) == 1
+
+    version, png = service.heat_tile(0, 0, 0, v2)
+    assert version == v2 and png.startswith(b"\x89PNG")
+
+
+def test_rows_changed_in_place_get_a_new_version():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY, latitude REAL, longitude REAL, urgency TEXT, timestamp TEXT)")
+    db.executemany("INSERT INTO reports (latitude, longitude, urgency, timestamp) VALUES (19.8, 85.8, 'Low', ?)",
+                   [("2025-09-01T00:00:00",)] * 4)
+
+    class Conn:   # TileService closes what get_db returns; keep the in-memory DB open
+        def __getattr__(self, name):
+            return getattr(db, name)
+
+        def close(self):
+            pass
+
+    engine = HotspotEngine(half_life_hours=0, reload_seconds=60)
+    service = TileService(engine)
+    v1 = service.refresh(Conn, force=True)
+    db.execute("UPDATE reports SET urgency = 'High'")
+    engine.loader.loaded_at -= 61   # reload due: same size, new weights
+    v2 = service.refresh(Conn, force=True)
+    assert v1 != v2 and v1.startswith(tiles._NONCE)
+    [feature] = service.cluster_tile(0, 0, 0, v2)[1]["features"]
+    assert feature["properties"]["weight"] == 12.0
@@ -0,0 +1,16 @@
+import numpy as np
+
+import visualize_hotspot
+
+
+def test_layer_data_one_array_per_zoom():
+    rng = np.random.default_rng(0)
+    lat = 19.8 + rng.normal(0, 0.01, 500)
+    lon = 85.8 + rng.normal(0, 0.01, 500)
+    levels = visualize_hotspot.build_levels(lat, lon, np.ones(500), 3, 10)
+    data = visualize_hotspot.layer_data(levels)
+    assert sorted(data) == list(range(3, 11))
+    assert len(data[3]) <= len(data[10])
+    for rows in data.values():
+        assert sum(r[2] for r in rows) == 500   # every point counted once per zoom
+        assert abs(sum(r[3] for r in rows) - 500) < 1
@@ -0,0 +1,244 @@
+# text_classifier.py
+# Learned hazard / urgency classifier: hashed word n-grams + softmax regression.
+#
+# Keyword rules tag "political waves" as High Wave and "tsunami de haine" as Tsunami;
+# a linear model over word uni/bi-grams learns the context instead.
+#
+#   python text_classifier.py train data/labelled_posts.jsonl   # -> models/text_classifier.npz
+#   python text_classifier.py bench data/labelled_posts.jsonl   # posts/sec + accuracy vs rules
+#
+# Inference is batched: a batch of posts becomes one CSR-style (indices, offsets)
+# array and scores are a gather + np.add.reduceat over the weight matrix.
+# The model is loaded lazily, once per process. `train` stores the holdout accuracy of
+# the model and of the keyword rules in the model file; a head (hazard / urgency) is only
+# used if it beat the rules there. If the file is missing, the head did not beat the rules
+# or the model is not confident, callers fall back to the keyword rules.
+import os, re, sys, json, time, zlib, threading
+import numpy as np
+
+MODEL_PATH = os.getenv("TEXT_MODEL_PATH", os.path.join(os.path.dirname(__file__), "models", "text_classifier.npz"))
+N_FEATURES = 1 << 18
+MIN_CONFIDENCE = float(os.getenv("TEXT_MODEL_MIN_CONFIDENCE", "0.55"))
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_URL_RE = re.compile(r"https?://\S+")
+
+
+# ================== Features ==================
+def _h(feature: str) -> int:
+    # crc32, not hash(): must be stable across processes
+    return zlib.crc32(feature.encode("utf-8")) % (N_FEATURES - 1) + 1   # 0 is the bias feature
+
+
+def features(text: str) -> list:
+    tokens = _TOKEN_RE.findall(_URL_RE.sub(" ", (text or "").lower()))
+    idx = [0]
+    idx += [_h(t) for t in tokens]
+    idx += [_h(a + " " + b) for a, b in zip(tokens, tokens[1:])]
+    idx += [_h("p:" + t[:5]) for t in tokens if len(t) > 5]   # cheap stemming: floods/flooding -> flood
+    return idx
+
+
+def featurize(texts):
+    """CSR-style batch: indices of all docs concatenated + start offset of each doc."""
+    rows = [features(t) for t in texts]
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in rows], out=offsets[1:])
+    indices = np.fromiter((i for r in rows for i in r), dtype=np.int64, count=int(offsets[-1]))
+    return indices, offsets
+
+
+# ================== Model ==================
+class _Head:
+    """One softmax-regression output (hazard or urgency)."""
+
+    def __init__(self, labels, weights=None):
+        self.labels = list(labels)
+        self.W = weights if weights is not None else np.zeros((N_FEATURES, len(self.labels)), dtype=np.float32)
+
+    def scores(self, indices, offsets):
+        # sparse X @ W without scipy: gather the rows of W and sum them per doc
+        return np.add.reduceat(self.W[indices], offsets[:-1], axis=0)
+
+    def proba(self, indices, offsets):
+        s = self.scores(indices, offsets)
+        s -= s.max(axis=1, keepdims=True)
+        np.exp(s, out=s)
+        return s / s.sum(axis=1, keepdims=True)
+
+    def fit(self, indices, offsets, y, epochs=30, lr=0.5, l2=1e-5, batch=32, seed=0):
+        """Mini-batch adagrad on cross entropy; only the features present in a batch are touched."""
+        rng = np.random.default_rng(seed)
+        n = len(offsets) - 1
+        lengths = np.diff(offsets)
+        G2 = np.zeros(N_FEATURES, dtype=np.float32)   # adagrad accumulator per feature
+        for _ in range(epochs):
+            order = rng.permutation(n)
+            for start in range(0, n, batch):
+                docs = order[start:start + batch]
+                idx = np.concatenate([indices[offsets[d]:offsets[d + 1]] for d in docs])
+                sub_off = np.zeros(len(docs) + 1, dtype=np.int64)
+                np.cumsum(lengths[docs], out=sub_off[1:])
+                p = self.proba(idx, sub_off)
+                p[np.arange(len(docs)), y[docs]] -= 1.0          # d(loss)/d(scores)
+                uniq, inv = np.unique(idx, return_inverse=True)
+                gw = np.zeros((len(uniq), len(self.labels)), dtype=np.float32)
+                np.add.at(gw, inv, np.repeat(p, lengths[docs], axis=0))
+                gw /= len(docs)
+                gw += l2 * self.W[uniq]
+                G2[uniq] += (gw ** 2).sum(axis=1)
+                self.W[uniq] -= lr * gw / (np.sqrt(G2[uniq])[:, None] + 1e-8)
+        return self
+
+
+class TextClassifier:
+    HEADS = ("hazard", "urgency")
+
+    def __init__(self, hazard: _Head, urgency: _Head, holdout: dict = None):
+        self.hazard = hazard
+        self.urgency = urgency
+        self.holdout = holdout or {}   # head -> (model acc, rules acc) on the training holdout
+
+    def beats_rules(self, head: str) -> bool:
+        model_acc, rules_acc = self.holdout.get(head, (0.0, 1.0))
+        return model_acc > rules_acc
+
+    def predict(self, texts):
+        """[(hazard, hazard_conf, urgency, urgency_conf)] for a batch of texts."""
+        if not texts:
+            return []
+        indices, offsets = featurize(texts)
+        ph = self.hazard.proba(indices, offsets)
+        pu = self.urgency.proba(indices, offsets)
+        hi, ui = ph.argmax(axis=1), pu.argmax(axis=1)
+        rows = np.arange(len(texts))
+        return list(zip([self.hazard.labels[i] for i in hi], ph[rows, hi].tolist(),
+                        [self.urgency.labels[i] for i in ui], pu[rows, ui].tolist()))
+
+    @classmethod
+    def train(cls, examples, **kw):
+        texts = [e["text"] for e in examples]
+        indices, offsets = featurize(texts)
+        heads = []
+        for field in cls.HEADS:
+            labels = sorted({e[field] for e in examples})
+            y = np.array([labels.index(e[field]) for e in examples])
+            heads.append(_Head(labels).fit(indices, offsets, y, **kw))
+        return cls(*heads)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # only non-zero rows are stored: hashed space is large, training data is not
+        out = {}
+        for name, head in (("hazard", self.hazard), ("urgency", self.urgency)):
+            rows = np.nonzero(np.any(head.W != 0, axis=1))[0]
+            out[f"{name}_rows"] = rows.astype(np.int64)
+            out[f"{name}_w"] = head.W[rows]
+            out[f"{name}_labels"] = np.array(head.labels)
+            if name in self.holdout:
+                out[f"{name}_holdout"] = np.array(self.holdout[name], dtype=np.float64)
+        np.savez_compressed(path, n_features=N_FEATURES, **out)
+
+    @classmethod
+    def load(cls, path: str):
+        z = np.load(path)
+        if int(z["n_features"]) != N_FEATURES:
+            raise ValueError(f"model built for {int(z['n_features'])} features, expected {N_FEATURES}")
+        heads, holdout = [], {}
+        for name in cls.HEADS:
+            labels = [str(l) for l in z[f"{name}_labels"]]
+            W = np.zeros((N_FEATURES, len(labels)), dtype=np.float32)
+            W[z[f"{name}_rows"]] = z[f"{name}_w"]
+            heads.append(_Head(labels, W))
+            if f"{name}_holdout" in z:   # files from before holdout scores were stored have none
+                holdout[name] = tuple(float(v) for v in z[f"{name}_holdout"])
+        return cls(*heads, holdout=holdout)
+
+
+# ================== Lazy, process-wide model ==================
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Load the model on first use; None if there is no (valid) model file."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                try:
+                    _model = TextClassifier.load(MODEL_PATH)
+                except (OSError, ValueError, KeyError) as e:
+                    if not isinstance(e, FileNotFoundError):
+                        print("text model load error:", e)
+                    _model = False   # don't retry on every call
+    return _model or None
+
+
+def classify_batch(texts, min_confidence: float = MIN_CONFIDENCE, labels: dict = None):
+    """[(hazard or None, urgency or None)]; None = no model / head did not beat the rules on
+    its holdout / not confident -> use rules. `labels` maps model hazard labels to the caller's."""
+    model = get_model()
+    if model is None:
+        return [(None, None)] * len(texts)
+    use_h, use_u = model.beats_rules("hazard"), model.beats_rules("urgency")
+    if not (use_h or use_u):
+        return [(None, None)] * len(texts)
+    labels = labels or {}
+    return [
+        (labels.get(h, h) if use_h and hc >= min_confidence else None,
+         u if use_u and uc >= min_confidence else None)
+        for h, hc, u, uc in model.predict([t or "" for t in texts])
+    ]
+
+
+# ================== CLI ==================
+def load_examples(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def _report(name, preds, examples, seconds):
+    n = len(examples)
+    hz = sum(p[0] == e["hazard"] for p, e in zip(preds, examples)) / n
+    ug = sum(p[1] == e["urgency"] for p, e in zip(preds, examples)) / n
+    print(f"{name:<8} hazard acc {hz:6.1%}   urgency acc {ug:6.1%}   {n / seconds:12,.0f} posts/sec")
+    return hz, ug
+
+
+def bench(model, examples, repeat: int = 200):
+    """{head: (model acc, rules acc)}"""
+    from social_fetcher import classify_hazard, classify_urgency   # the keyword rules
+    texts = [e["text"] for e in examples] * repeat
+    t0 = time.perf_counter(); rule_preds = [(classify_hazard(t), classify_urgency(t)) for t in texts]; t1 = time.perf_counter()
+    model_preds = [(h, u) for h, _, u, _ in model.predict(texts)]; t2 = time.perf_counter()
+    rules = _report("rules", rule_preds, examples * repeat, t1 - t0)
+    acc = _report("model", model_preds, examples * repeat, t2 - t1)
+    return dict(zip(TextClassifier.HEADS, zip(acc, rules)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("train", "bench"):
+        print("usage: python text_classifier.py train|bench <labelled.jsonl> [model.npz]")
+        sys.exit(1)
+    cmd, data_path = sys.argv[1], sys.argv[2]
+    model_path = sys.argv[3] if len(sys.argv) > 3 else MODEL_PATH
+    examples = load_examples(data_path)
+
+    if cmd == "train":
+        # hold out every 5th example to report accuracy, then train on everything
+        held = examples[::5]
+        fit = [e for i, e in enumerate(examples) if i % 5]
+        print(f"holdout ({len(held)} of {len(examples)} examples):")
+        holdout = bench(TextClassifier.train(fit), held, repeat=1)
+        model = TextClassifier.train(examples)
+        model.holdout = holdout
+        model.save(model_path)
+        print(f"✅ model saved to {model_path}")
+        for head in TextClassifier.HEADS:
+            if not model.beats_rules(head):
+                print(f"   {head}: did not beat the rules on the holdout, keyword rules stay in use")
+    else:
+        bench(TextClassifier.load(model_path), examples)
@@ -0,0 +1,261 @@
+# tiles.py
+# XYZ tile service for the hotspot map (replaces the folium / leaflet.heat HTML files
+# that embedded every point in the page).
+#
+#   /tiles/heat/{z}/{x}/{y}.png        heatmap raster tile (256x256 RGBA PNG)
+#   /tiles/clusters/{z}/{x}/{y}.json   GeoJSON cluster markers for that tile
+#
+# Points come from the hotspot engine's columnar arrays. For every zoom level the
+# points are pre-aggregated once per data version into sparse pixel (or 64px cell)
+# bins sorted by tile, so a tile is a searchsorted slice + a tiny render. Rendered
+# tiles sit in an LRU keyed by data version; a new version simply stops matching.
+import os, math, struct, threading, time, zlib
+from collections import OrderedDict
+import numpy as np
+
+TILE_SIZE = 256
+MAX_ZOOM = 18
+HEAT_RADIUS = 12          # blur radius in pixels
+CLUSTER_CELL_PX = 64      # one cluster marker per 64x64 px at most
+TILE_CACHE_SIZE = 2048
+REFRESH_SECONDS = 5.0
+MAX_LAT = 85.05112878
+# versions are "<nonce>-<engine generation>": a restarted process never reuses an old version
+# string, which browsers may still hold as immutable
+_NONCE = os.urandom(4).hex()
+
+
+# ================== helpers ==================
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal RGBA PNG encoder (no Pillow needed)."""
+    h, w, _ = rgba.shape
+    raw = np.zeros((h, w * 4 + 1), dtype=np.uint8)   # first byte of each row = filter type 0
+    raw[:, 1:] = rgba.reshape(h, w * 4)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def _heat_palette() -> np.ndarray:
+    # same ramp as leaflet.heat: blue -> cyan -> lime -> yellow -> red, alpha rising with intensity
+    stops = [(0.0, (0, 0, 255)), (0.4, (0, 255, 255)), (0.6, (0, 255, 0)), (0.8, (255, 255, 0)), (1.0, (255, 0, 0))]
+    t = np.linspace(0, 1, 256)
+    pos = [s[0] for s in stops]
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    for c in range(3):
+        lut[:, c] = np.interp(t, pos, [s[1][c] for s in stops]).astype(np.uint8)
+    lut[:, 3] = np.clip(t * 2.0, 0, 0.85) * 255
+    lut[0, 3] = 0
+    return lut
+
+
+PALETTE = _heat_palette()
+EMPTY_PNG = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+def _box_blur(grid: np.ndarray, r: int, axis: int) -> np.ndarray:
+    c = np.cumsum(np.pad(grid, [(r + 1, r) if a == axis else (0, 0) for a in range(2)]), axis=axis)
+    n = grid.shape[axis]
+    hi = np.take(c, np.arange(2 * r + 1, 2 * r + 1 + n), axis=axis)
+    lo = np.take(c, np.arange(0, n), axis=axis)
+    return (hi - lo) / (2 * r + 1)
+
+
+def gaussian_blur(grid: np.ndarray, radius: int) -> np.ndarray:
+    # three box passes per axis ~ gaussian
+    r = max(1, radius // 3)
+    for axis in (0, 1):
+        for _ in range(3):
+            grid = _box_blur(grid, r, axis)
+    return grid
+
+
+def project(lat: np.ndarray, lon: np.ndarray):
+    """Web-mercator world coordinates in [0, 1)."""
+    lat = np.radians(np.clip(lat, -MAX_LAT, MAX_LAT))
+    fx = (lon + 180.0) / 360.0
+    fy = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return np.clip(fx, 0, 1 - 1e-12), np.clip(fy, 0, 1 - 1e-12)
+
+
+# ================== per-zoom pre-aggregation ==================
+class _ZoomIndex:
+    """Sparse bins for one zoom, sorted by tile id; bins[tile] is a contiguous slice."""
+
+    def __init__(self, z: int, bx: np.ndarray, by: np.ndarray, cols: dict, bin_px: int):
+        self.z = z
+        n_tiles = 1 << z
+        per_tile = TILE_SIZE // bin_px
+        tile = (bx // per_tile) * n_tiles + (by // per_tile)
+        order = np.argsort(tile, kind="stable")
+        self.tile = tile[order]
+        self.bx, self.by = bx[order], by[order]
+        self.cols = {k: v[order] for k, v in cols.items()}
+        # densest kernel-sized block at this zoom: the colour scale reference for heat tiles
+        self.peak = 0.0
+        if len(self.tile) and bin_px == 1:
+            b = 2 * max(1, HEAT_RADIUS // 3) + 1
+            _, block = np.unique((self.bx // b) * ((TILE_SIZE << z) // b + 1) + self.by // b, return_inverse=True)
+            self.peak = float(np.bincount(block, weights=self.cols["weight"]).max()) / (b * b)
+
+    def slice(self, x: int, y: int) -> slice:
+        tid = x * (1 << self.z) + y
+        return slice(np.searchsorted(self.tile, tid, "left"), np.searchsorted(self.tile, tid, "right"))
+
+
+def _aggregate(fx, fy, lat, lon, weight, z: int, bin_px: int) -> _ZoomIndex:
+    world = (TILE_SIZE << z) // bin_px
+    bx = (fx * world).astype(np.int64)
+    by = (fy * world).astype(np.int64)
+    keys, inv = np.unique(bx * world + by, return_inverse=True)
+    cols = {
+        "weight": np.bincount(inv, weights=weight),
+        "count": np.bincount(inv),
+        "lat": np.bincount(inv, weights=weight * lat),
+        "lon": np.bincount(inv, weights=weight * lon),
+    }
+    return _ZoomIndex(z, keys // world, keys % world, cols, bin_px)
+
+
+# ================== service ==================
+class _Snapshot:
+    """Points of one data version plus the zoom indexes built from them (never mutated)."""
+
+    def __init__(self, version: str, points):
+        self.version = version
+        self.points = points
+        self.zooms = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def zoom(self, kind: str, z: int) -> _ZoomIndex:
+        key = (kind, z)
+        idx = self.zooms.get(key)
+        if idx is not None:
+            return idx
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        # one aggregation per (kind, zoom); other zooms and cached tiles are not held up
+        with lock:
+            idx = self.zooms.get(key)
+            if idx is None:
+                idx = _aggregate(*self.points, z, 1 if kind == "heat" else CLUSTER_CELL_PX)
+                self.zooms[key] = idx
+        return idx
+
+
+class TileService:
+    KEEP_SNAPSHOTS = 2   # a request that refreshed just before a newer version still renders its own
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.version = None
+        self._snapshots = OrderedDict()   # version -> _Snapshot, newest last
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+
+    def refresh(self, get_db, force: bool = False) -> str:
+        """Pull new rows into the engine (at most every REFRESH_SECONDS) and return the data version."""
+        now = time.monotonic()
+        if force or now - self._last_refresh >= REFRESH_SECONDS:
+            self._last_refresh = now
+            conn = get_db()
+            try:
+                self.engine.refresh_from_db(conn)
+            finally:
+                conn.close()
+        with self._lock:
+            if f"{_NONCE}-{self.engine.generation}" != self.version:
+                # new data -> new snapshot; tiles of older versions just stop being asked for
+                generation, lat, lon, w = self.engine.points()
+                version = f"{_NONCE}-{generation}"
+                fx, fy = project(lat, lon)
+                self._snapshots[version] = _Snapshot(version, (fx, fy, lat, lon, w))
+                while len(self._snapshots) > self.KEEP_SNAPSHOTS:
+                    self._snapshots.popitem(last=False)
+                self._cache.clear()
+                self.version = version
+            return self.version
+
+    def _snapshot(self, version: str = None) -> _Snapshot:
+        with self._lock:
+            snap = self._snapshots.get(version)
+            return snap if snap is not None else self._snapshots[self.version]
+
+    def _cached(self, key, build):
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                return hit
+        value = build()   # outside the lock: a slow render doesn't block other tiles
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > TILE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return value
+
+    # ---------- heat PNG ----------
+    def heat_tile(self, z: int, x: int, y: int, version: str = None):
+        """(version, PNG bytes), rendered from the snapshot of `version` (as returned by refresh())."""
+        snap = self._snapshot(version)
+        return snap.version, self._cached((snap.version, "heat", z, x, y), lambda: self._render_heat(snap, z, x, y))
+
+    def _render_heat(self, snap: _Snapshot, z: int, x: int, y: int) -> bytes:
+        idx = snap.zoom("heat", z)
+        n_tiles = 1 << z
+        r = HEAT_RADIUS
+        size = TILE_SIZE + 2 * r
+        grid = np.zeros(size * size, dtype=np.float64)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                ty = y + dy
+                if not 0 <= ty < n_tiles:
+                    continue
+                tx = (x + dx) % n_tiles   # wrap around the antimeridian
+                s = idx.slice(tx, ty)
+                if s.start == s.stop:
+                    continue
+                px = idx.bx[s] - tx * TILE_SIZE + dx * TILE_SIZE + r
+                py = idx.by[s] - ty * TILE_SIZE + dy * TILE_SIZE + r
+                keep = (px >= 0) & (px < size) & (py >= 0) & (py < size)
+                grid += np.bincount(py[keep] * size + px[keep], weights=idx.cols["weight"][s][keep], minlength=size * size)
+        if not grid.any():
+            return EMPTY_PNG
+        heat = gaussian_blur(grid.reshape(size, size), r)[r:-r, r:-r]
+        # log scale against the densest pixel of this zoom so neighbouring tiles match
+        ref = math.log1p(idx.peak)
+        level = np.clip(np.log1p(heat) / ref, 0, 1) if ref > 0 else heat * 0
+        return encode_png(PALETTE[(level * 255).astype(np.uint8)])
+
+    # ---------- cluster GeoJSON ----------
+    def cluster_tile(self, z: int, x: int, y: int, version: str = None):
+        """(version, GeoJSON dict), rendered from the snapshot of `version` (as returned by refresh())."""
+        snap = self._snapshot(version)
+        return snap.version, self._cached((snap.version, "clusters", z, x, y), lambda: self._render_clusters(snap, z, x, y))
+
+    def _render_clusters(self, snap: _Snapshot, z: int, x: int, y: int) -> dict:
+        idx = snap.zoom("clusters", z)
+        s = idx.slice(x, y)
+        w = idx.cols["weight"][s]
+        lat = idx.cols["lat"][s] / w
+        lon = idx.cols["lon"][s] / w
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(float(lon[i]), 5), round(float(lat[i]), 5)]},
+                "properties": {"count": int(idx.cols["count"][s][i]), "weight": round(float(w[i]), 3)},
+            }
+            for i in range(len(w))
+        ]
+        return {"type": "FeatureCollection", "version": snap.version, "features": features}
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
@@ -1,6 +1,8 @@
 import sqlite3
+from text_classifier import classify_batch
 
 DATABASE = "coastal.db"
+BATCH_SIZE = 5000
 
 def classify_post(text: str):
     if not text:
@@ -21,10 +23,14 @@ def update_urgency():
     cur.execute("SELECT id, text FROM social_media")
     rows = cur.fetchall()
 
-    for row in rows:
-        record_id, text = row
-        urgency = classify_post(text)
-        cur.execute("UPDATE social_media SET urgency = ? WHERE id = ?", (urgency, record_id))
+    # learned model in batches, keyword rules where it is unsure / not trained
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        preds = classify_batch([text for _, text in batch])
+        cur.executemany(
+            "UPDATE social_media SET urgency = ? WHERE id = ?",
+            [(urgency or classify_post(text), record_id) for (record_id, text), (_, urgency) in zip(batch, preds)]
+        )
 
     conn.commit()
     conn.close()
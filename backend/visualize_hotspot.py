@@ -1,30 +1,241 @@
-import folium
-
-# === API se mila hua sample response ===
-hotspots = [
-    {"cell_lat": 25.1, "cell_lon": 78.06, "count": 2},
-    {"cell_lat": 25.12, "cell_lon": 79.22, "count": 2}
-]
-
-# === Map center (average lat/lon se) ===
-center_lat = sum(h["cell_lat"] for h in hotspots) / len(hotspots)
-center_lon = sum(h["cell_lon"] for h in hotspots) / len(hotspots)
-
-# === Folium map banaya ===
-m = folium.Map(location=[center_lat, center_lon], zoom_start=8)
-
-# === Har hotspot ko marker add karna ===
-for h in hotspots:
-    folium.CircleMarker(
-        location=[h["cell_lat"], h["cell_lon"]],
-        radius=5 + h["count"]*2,   # count ke hisaab se size
-        popup=f"Count: {h['count']}",
-        color="red",
-        fill=True,
-        fill_color="red"
-    ).add_to(m)
-
-# === Map save to HTML file ===
-m.save("hotspots_map.html")
-print("✅ Map saved as hotspots_map.html. Open it in browser!")
+# visualize_hotspot.py
+# Hotspot map generator (folium).
+#
+# Rows are streamed from coastal.db (or pulled from the /hotspots API), filtered,
+# and pre-clustered per zoom level (supercluster-style) before the map is written,
+# so even 500k reports become a few hundred markers per zoom. The HTML carries each
+# zoom's clusters as a compact array; markers are only built for the zoom on screen.
+#
+#   python visualize_hotspot.py --hazard Flood,Cyclone --since 24 --bbox 8,68,23,90
+#   python visualize_hotspot.py --api http://127.0.0.1:8000 --token <jwt> --since 6
+import argparse, json, math, os, time
+import numpy as np
 
+import partitions
+from hotspot_engine import urgency_weights
+from tiles import TILE_SIZE, project
+
+DATABASE = "coastal.db"
+CHUNK_ROWS = 50_000
+
+
+# === Data sources ===
+def stream_db(db_path, hazards=None, urgencies=None, since_hours=None, bbox=None):
+    """Yield (lat, lon, weight) numpy chunks from reports + social_media with filters pushed into SQL.
+
+    Archived months of partitioned tables are read through partitions.py; with --since
+    only the monthly files overlapping the window are attached."""
+    since_ts = time.time() - since_hours * 3600 if since_hours else None
+    since_day = time.strftime("%Y-%m-%d", time.gmtime(since_ts)) if since_ts else None
+    for i, conn in enumerate(partitions.iter_connections(db_path, since=since_day)):
+        cur = conn.cursor()
+        parts, params = [], []
+        for table, hazard_col in (("reports", "hazard_type"), ("social_media", "hazard")):
+            if table in partitions.PARTITIONED_TABLES:
+                source = f"{table}_all"
+            elif i == 0:
+                source = table   # not partitioned: only in the hot file, read it once
+            else:
+                continue
+            cur.execute(f"PRAGMA table_info({source})")
+            cols = {r[1] for r in cur.fetchall()}
+            if not cols:
+                continue
+            urgency = "urgency" if "urgency" in cols else "NULL"
+            where = ["latitude IS NOT NULL", "longitude IS NOT NULL"]
+            if hazards:
+                where.append(f"{hazard_col} IN ({','.join('?' * len(hazards))})")
+                params += hazards
+            if urgencies:
+                where.append(f"{urgency} IN ({','.join('?' * len(urgencies))})")
+                params += urgencies
+            if since_ts:
+                where.append("CAST(strftime('%s', timestamp) AS REAL) >= ?")
+                params.append(since_ts)
+            if bbox:
+                where.append("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?")
+                params += [bbox[0], bbox[2], bbox[1], bbox[3]]
+            parts.append(f"SELECT latitude, longitude, {urgency} FROM {source} WHERE {' AND '.join(where)}")
+        if not parts:
+            continue
+        cur.execute(" UNION ALL ".join(parts), params)
+        while True:
+            rows = cur.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            lat, lon, urg = zip(*rows)
+            yield np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64), urgency_weights(urg)
+
+
+def stream_api(base_url, token, since_hours=None, bbox=None):
+    """Pull clusters from /hotspots (already aggregated server-side; hazard/urgency filters not available)."""
+    import http_client
+    params = {"top": 100_000, "min_score": 0}
+    if since_hours:
+        # API only has fixed windows; pick the smallest one that covers the request
+        params["window"] = next((w for w, h in (("1h", 1), ("6h", 6), ("24h", 24)) if since_hours <= h), "24h")
+    r = http_client.get(f"{base_url.rstrip('/')}/hotspots", params=params,
+                     headers={"Authorization": f"Bearer {token}"}, timeout=(5, 60))
+    r.raise_for_status()
+    rows = [(h["latitude"], h["longitude"], h["weight"]) for h in r.json()]
+    if bbox:
+        rows = [x for x in rows if bbox[0] <= x[0] <= bbox[2] and bbox[1] <= x[1] <= bbox[3]]
+    if rows:
+        lat, lon, w = zip(*rows)
+        yield np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64), np.array(w, dtype=np.float64)
+
+
+# === Hierarchical clustering (supercluster-style) ===
+def unproject(fx, fy):
+    lon = fx * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * fy))))
+    return lat, lon
+
+
+def _cluster_level(x, y, w, n, radius):
+    """Greedy radius clustering of weighted points (heaviest first) using a grid index."""
+    # collapse points sharing a radius/2 cell first -> the Python loop runs over occupied cells only
+    half = radius / 2
+    keys, inv = np.unique(np.floor(x / half).astype(np.int64) * (1 << 31) + np.floor(y / half).astype(np.int64),
+                          return_inverse=True)
+    bw = np.bincount(inv, weights=w)
+    bx = np.bincount(inv, weights=w * x) / bw
+    by = np.bincount(inv, weights=w * y) / bw
+    bn = np.bincount(inv, weights=n)
+
+    gx = np.floor(bx / radius).astype(np.int64)
+    gy = np.floor(by / radius).astype(np.int64)
+    grid = {}
+    for i, key in enumerate(zip(gx.tolist(), gy.tolist())):
+        grid.setdefault(key, []).append(i)
+
+    label = np.full(len(bw), -1, dtype=np.int64)
+    r2 = radius * radius
+    k = 0
+    for i in np.argsort(-bw).tolist():
+        if label[i] >= 0:
+            continue
+        label[i] = k
+        cx, cy = gx[i], gy[i]
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in grid.get((cx + dx, cy + dy), ()):
+                    if label[j] < 0 and (bx[j] - bx[i]) ** 2 + (by[j] - by[i]) ** 2 <= r2:
+                        label[j] = k
+        k += 1
+
+    cw = np.bincount(label, weights=bw)
+    return (np.bincount(label, weights=bw * bx) / cw, np.bincount(label, weights=bw * by) / cw,
+            cw, np.bincount(label, weights=bn))
+
+
+def build_levels(lat, lon, weight, min_zoom, max_zoom, radius_px=60):
+    """{zoom: (lat, lon, weight, count)}; each level clusters the level below it."""
+    x, y = project(lat, lon)
+    n = np.ones(len(x))
+    w = weight
+    levels = {}
+    for z in range(max_zoom, min_zoom - 1, -1):
+        x, y, w, n = _cluster_level(x, y, w, n, radius_px / (TILE_SIZE << z))
+        clat, clon = unproject(x, y)
+        levels[z] = (clat, clon, w, n)
+    return levels
+
+
+# === Map output ===
+def layer_data(levels) -> dict:
+    """{zoom: [[lat, lon, count, weight], ...]}: what the page turns into markers on demand."""
+    return {
+        int(z): [[round(float(a), 5), round(float(b), 5), int(c), round(float(d), 1)]
+                 for a, b, d, c in zip(clat, clon, w, n)]
+        for z, (clat, clon, w, n) in levels.items()
+    }
+
+
+def write_map(levels, out_path, min_zoom, max_zoom):
+    import folium
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    lat0, lon0, w0, _ = levels[min_zoom]
+    start_zoom = min(max(min_zoom, 5), max_zoom)
+    m = folium.Map(location=[float(np.average(lat0, weights=w0)), float(np.average(lon0, weights=w0))],
+                   zoom_start=start_zoom, min_zoom=min_zoom, prefer_canvas=True)
+
+    # one marker layer at a time, built from the data of the zoom on screen
+    layers = MacroElement()
+    layers._template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var data = """ + json.dumps(layer_data(levels), separators=(",", ":")) + """;
+            var layer = null, shown = null;
+            function show() {
+                var z = Math.max(""" + str(min_zoom) + """, Math.min(""" + str(max_zoom) + """, map.getZoom()));
+                if (z === shown) { return; }
+                if (layer) { map.removeLayer(layer); }
+                layer = L.layerGroup((data[z] || []).map(function (c) {
+                    return L.circleMarker([c[0], c[1]], {
+                        radius: 4 + 3 * Math.log2(1 + c[2]),   // count ke hisaab se size
+                        color: "red", fill: true, fillColor: "red"
+                    }).bindPopup("Reports: " + c[2] + "<br>Weight: " + Math.round(c[3]));
+                })).addTo(map);
+                shown = z;
+            }
+            map.on("zoomend", show);
+            show();
+        })();
+        {% endmacro %}
+    """)
+    m.add_child(layers)
+    m.save(out_path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a clustered hotspot map (HTML).")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--db", default=DATABASE, help="SQLite database (default: coastal.db)")
+    src.add_argument("--api", help="Backend base URL; reads /hotspots instead of the DB")
+    ap.add_argument("--token", help="Access token for --api (OFFICIAL/ANALYST)")
+    ap.add_argument("--hazard", help="Comma separated hazards, e.g. Flood,Cyclone (DB only)")
+    ap.add_argument("--urgency", help="Comma separated urgencies, e.g. High,Medium (DB only)")
+    ap.add_argument("--since", type=float, help="Only rows from the last N hours")
+    ap.add_argument("--bbox", help="min_lat,min_lon,max_lat,max_lon")
+    ap.add_argument("--min-zoom", type=int, default=3)
+    ap.add_argument("--max-zoom", type=int, default=10)
+    ap.add_argument("--radius", type=int, default=60, help="Cluster radius in screen pixels")
+    ap.add_argument("--out", default="hotspots_map.html")
+    args = ap.parse_args()
+
+    split = lambda s: [v.strip() for v in s.split(",") if v.strip()] if s else None
+    bbox = [float(v) for v in args.bbox.split(",")] if args.bbox else None
+    if bbox and len(bbox) != 4:
+        ap.error("--bbox needs 4 numbers: min_lat,min_lon,max_lat,max_lon")
+
+    t0 = time.perf_counter()
+    if args.api:
+        if not args.token:
+            ap.error("--api needs --token")
+        chunks = list(stream_api(args.api, args.token, args.since, bbox))
+    else:
+        chunks = list(stream_db(args.db, split(args.hazard), split(args.urgency), args.since, bbox))
+    if not chunks:
+        print("No rows matched; map not written.")
+        return
+    lat, lon, w = (np.concatenate(c) for c in zip(*chunks))
+    t1 = time.perf_counter()
+
+    levels = build_levels(lat, lon, w, args.min_zoom, args.max_zoom, args.radius)
+    t2 = time.perf_counter()
+    write_map(levels, args.out, args.min_zoom, args.max_zoom)
+    t3 = time.perf_counter()
+
+    markers = sum(len(l[0]) for l in levels.values())
+    print(f"✅ {len(lat)} points -> {markers} markers over zoom {args.min_zoom}-{args.max_zoom} "
+          f"(zoom {args.min_zoom}: {len(levels[args.min_zoom][0])}, zoom {args.max_zoom}: {len(levels[args.max_zoom][0])})")
+    print(f"   load {t1 - t0:.2f}s, cluster {t2 - t1:.2f}s, write {t3 - t2:.2f}s")
+    print(f"   saved {args.out} ({os.path.getsize(args.out) / 1024:.0f} KB). Open it in browser!")
+
+
+if __name__ == "__main__":
+    main()